@@ -0,0 +1,103 @@
+"""
+Benchmark the ChromaDB and NumPy search backends: build time, query latency
+and recall of ChromaDB's approximate search against exact NumPy search.
+
+Vectors are synthetic (clustered unit vectors), so no model is needed:
+
+    uv run python benchmarks/bench_backends.py --docs 20000 --queries 500
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.backends import ChromaBackend, NumpyBackend  # noqa: E402
+
+
+def make_vectors(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Return n unit vectors scattered around random cluster centers, like topical text."""
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(backend, vectors: np.ndarray, batch_size: int) -> float:
+    """Add every vector in batches, returning the seconds taken."""
+    start = time.perf_counter()
+    for lo in range(0, len(vectors), batch_size):
+        batch = vectors[lo : lo + batch_size]
+        ids = [str(i) for i in range(lo, lo + len(batch))]
+        backend.add(ids, ids, [{"row": i} for i in range(lo, lo + len(batch))], batch)
+    return time.perf_counter() - start
+
+
+def time_queries(backend, queries: np.ndarray, k: int, batch_size: int) -> tuple[list, np.ndarray]:
+    """Run the queries in batches, returning the results and per-batch latencies (ms)."""
+    results, latencies = [], []
+    for lo in range(0, len(queries), batch_size):
+        start = time.perf_counter()
+        results.extend(backend.query(queries[lo : lo + batch_size], k))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+def recall(approx: list, exact: list) -> float:
+    """Mean fraction of the exact top-k ids that the approximate search also found."""
+    found = [
+        len({hit["id"] for hit in a} & {hit["id"] for hit in e}) / max(len(e), 1)
+        for a, e in zip(approx, exact)
+    ]
+    return float(np.mean(found))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=20000, help="vectors in the index")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="topics the vectors form")
+    parser.add_argument("--queries", type=int, default=500, help="queries to time")
+    parser.add_argument("-k", type=int, default=10, help="results per query")
+    parser.add_argument("--batch", type=int, default=32, help="queries per batched call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = make_vectors(args.docs, args.dim, args.clusters, rng)
+    queries = make_vectors(args.queries, args.dim, args.clusters, rng)
+
+    backends = {"numpy": NumpyBackend(), "chroma": ChromaBackend(collection_name="bench")}
+    print(f"{args.docs} docs x {args.dim} dims, {args.queries} queries, k={args.k}\n")
+    print(
+        f"{'backend':<8} {'build s':>8} {'1-query p50 ms':>15} {'p95 ms':>8} "
+        f"{'batch/query ms':>15} {'recall@k':>9}"
+    )
+
+    exact = None
+    for name, backend in backends.items():
+        build_s = build(backend, vectors, batch_size=1000)
+        single, latencies = time_queries(backend, queries, args.k, batch_size=1)
+        _, batched = time_queries(backend, queries, args.k, batch_size=args.batch)
+        exact = exact if exact is not None else single  # numpy runs first and is exact
+        print(
+            f"{name:<8} {build_s:>8.2f} {np.percentile(latencies, 50):>15.3f} "
+            f"{np.percentile(latencies, 95):>8.3f} {batched.sum() / args.queries:>15.3f} "
+            f"{recall(single, exact):>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compare the embedder's length-bucketed batching with plain model.encode
+calls, as the indexer made them before, on a corpus's chunks.
+
+The chunks are fed in file order, --pipeline-batch at a time, as the
+ingestion pipeline does. "plain" hands each group to model.encode with
+its default batch size (sentence-transformers sorts a call's texts by
+character length); "bucketed" is DocumentEmbedder's path, which batches
+by token length under a token budget. Padding is the share of computed
+token slots that were padding:
+
+    uv run python benchmarks/bench_batching.py documents --words 300 --max-batch-tokens 8192
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.embeddings import DocumentEmbedder, EncodeStats  # noqa: E402
+from retrieval.loader import DocumentChunker, DocumentLoader  # noqa: E402
+
+PLAIN_BATCH_SIZE = 32  # model.encode's default
+
+
+def plain_padding(lengths: list[int], char_lengths: list[int]) -> int:
+    """Token slots model.encode computes for one call: sorted by characters, cut every 32."""
+    order = sorted(range(len(lengths)), key=lambda i: -char_lengths[i])
+    slots = 0
+    for start in range(0, len(order), PLAIN_BATCH_SIZE):
+        batch = order[start : start + PLAIN_BATCH_SIZE]
+        slots += len(batch) * max(lengths[i] for i in batch)
+    return slots
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", help="directory of documents")
+    parser.add_argument("--words", type=int, default=300, help="words per chunk")
+    parser.add_argument("--pipeline-batch", type=int, default=64, help="chunks per encode call")
+    parser.add_argument("--batch-size", type=int, default=32, help="most texts per batch")
+    parser.add_argument("--max-batch-tokens", type=int, default=8192, help="token budget")
+    parser.add_argument("--repeats", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+
+    loader = DocumentLoader(chunker=DocumentChunker(args.words, args.words // 10))
+    texts = [chunk["text"] for chunk in loader.load_documents(args.directory)]
+    groups = [
+        texts[start : start + args.pipeline_batch]
+        for start in range(0, len(texts), args.pipeline_batch)
+    ]
+
+    embedder = DocumentEmbedder(
+        query_cache_size=0, batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens
+    )
+    lengths = [
+        len(ids)
+        for ids in embedder.tokenizer(
+            texts, truncation=True, max_length=embedder.model.max_seq_length
+        )["input_ids"]
+    ]
+    tokens = sum(lengths)
+    print(f"{len(texts)} chunks, {tokens} tokens, {np.std(lengths):.0f} std tokens per chunk")
+
+    slots, start = 0, 0
+    for group in groups:
+        group_lengths = lengths[start : start + len(group)]
+        slots += plain_padding(group_lengths, [len(text) for text in group])
+        start += len(group)
+
+    def plain() -> None:
+        for group in groups:
+            embedder.model.encode(group, show_progress_bar=False)
+
+    def bucketed() -> None:
+        for group in groups:
+            embedder._encode(group)
+
+    plain()  # warm up
+    for label, run in (("plain", plain), ("bucketed", bucketed)):
+        best = float("inf")
+        for _ in range(args.repeats):
+            embedder.encode_stats = EncodeStats()
+            began = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - began)
+        padding = (
+            1 - tokens / slots if label == "plain" else embedder.encode_stats.stats()["padding"]
+        )
+        print(
+            f"{label:<9} {best:>7.2f} s  {len(texts) / best:>7.1f} texts/s"
+            f"  {tokens / best:>8.0f} tokens/s  padding {padding:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
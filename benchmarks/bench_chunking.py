@@ -0,0 +1,82 @@
+"""
+Compare word-sized and token-sized chunking: chunks made, tokens the model
+truncates away, peak memory while chunking, and time to chunk and embed.
+
+Runs on the files in a documents directory with the embedding model:
+
+    uv run python benchmarks/bench_chunking.py --documents documents
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.embeddings import DocumentEmbedder  # noqa: E402
+from retrieval.loader import DocumentChunker, DocumentLoader  # noqa: E402
+
+
+def chunk_all(chunker: DocumentChunker, texts: dict[str, str]) -> tuple[list[str], float, float]:
+    """Chunk every text, returning the chunk texts, seconds taken and peak MB allocated."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = [c["text"] for doc_id, text in texts.items() for c in chunker.chunk_text(text, doc_id)]
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return chunks, seconds, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", default="documents", help="directory of documents")
+    parser.add_argument("--words", type=int, default=300, help="words per chunk in word mode")
+    parser.add_argument("--overlap", type=int, default=30, help="overlap, in words or tokens")
+    parser.add_argument("--embed", action="store_true", help="also time embedding the chunks")
+    args = parser.parse_args()
+
+    # load whole documents; each mode chunks them itself
+    texts = {doc["id"]: doc["text"] for doc in DocumentLoader().load_documents(args.documents)}
+    embedder = DocumentEmbedder()
+    tokenizer, limit = embedder.tokenizer, embedder.max_tokens
+
+    chunkers = {
+        "words": DocumentChunker(args.words, args.overlap),
+        "tokens": DocumentChunker(limit, args.overlap, tokenizer=tokenizer),
+    }
+    print(f"{len(texts)} documents, model reads {limit} tokens per text\n")
+    print(
+        f"{'mode':<7} {'chunks':>7} {'tokens':>9} {'truncated':>10} {'chunk s':>8} "
+        f"{'peak MB':>8} {'embed s':>8}"
+    )
+    for mode, chunker in chunkers.items():
+        chunks, seconds, peak = chunk_all(chunker, texts)
+        lengths = [
+            len(ids)
+            for ids in tokenizer(chunks, add_special_tokens=False, verbose=False)["input_ids"]
+        ]
+        truncated = sum(max(0, n - limit) for n in lengths)
+        embed = "-"
+        if args.embed:
+            start = time.perf_counter()
+            embedder.embed_documents(chunks)
+            embed = f"{time.perf_counter() - start:.1f}"
+        print(
+            f"{mode:<7} {len(chunks):>7} {sum(lengths):>9} {truncated / sum(lengths):>10.1%} "
+            f"{seconds:>8.2f} {peak:>8.1f} {embed:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure duplicate detection on a corpus: how many chunks are exact or near
+copies, what finding them costs per chunk, and (with --embed) the
+embedding time saved by embedding each distinct chunk once.
+
+Each directory is chunked as the indexer would, so a file present in two
+of them (e.g. documents/ and tests/data/) shows up as exact copies:
+
+    uv run python benchmarks/bench_dedup.py documents tests/data --embed
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.dedup import DuplicateIndex  # noqa: E402
+from retrieval.loader import DocumentChunker, DocumentLoader  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directories", nargs="+", help="directories of documents")
+    parser.add_argument("--words", type=int, default=300, help="words per chunk")
+    parser.add_argument("--overlap", type=int, default=30, help="words shared by neighbors")
+    parser.add_argument("--threshold", type=float, default=0.9, help="near-copy similarity")
+    parser.add_argument("--embed", action="store_true", help="also time embedding the chunks")
+    args = parser.parse_args()
+
+    loader = DocumentLoader(chunker=DocumentChunker(args.words, args.overlap))
+    chunks = []
+    for n, directory in enumerate(args.directories):
+        # the same file in two directories gets the same chunk ids; keep them apart
+        chunks.extend((f"{n}/{c['id']}", c["text"]) for c in loader.load_documents(directory))
+
+    index = DuplicateIndex(args.threshold)
+    start = time.perf_counter()
+    matches = [index.observe(doc_id, text) for doc_id, text in chunks]
+    seconds = time.perf_counter() - start
+
+    exact = sum(1 for m in matches if m is not None and m[1] == 1.0)
+    near = sum(1 for m in matches if m is not None and m[1] < 1.0)
+    print(f"{len(chunks)} chunks from {len(args.directories)} directories")
+    print(f"exact copies: {exact}, near copies (>= {args.threshold}): {near}")
+    print(f"distinct chunks to embed: {len(index)} ({len(index) / len(chunks):.0%})")
+    print(f"detection: {seconds:.2f} s ({seconds / len(chunks) * 1e6:.0f} us per chunk)")
+
+    if args.embed:
+        from retrieval.embeddings import DocumentEmbedder
+
+        embedder = DocumentEmbedder()
+        texts = [text for _, text in chunks]
+        unique = [text for (_, text), m in zip(chunks, matches) if m is None]
+        embedder.embed_documents(texts[:8])  # warm up
+        for label, batch in (("every chunk", texts), ("distinct only", unique)):
+            start = time.perf_counter()
+            embedder.embed_documents(batch)
+            print(f"embed {label:<14} {time.perf_counter() - start:>7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the embedding backends on a corpus: document throughput, single
+query latency, and how closely each reproduces the fp32 embeddings.
+
+The directory is chunked as the indexer would. Each backend embeds every
+chunk (after a warm-up batch), then answers --queries one-query calls,
+the search path's shape; agreement is the cosine similarity between each
+chunk's embedding and the fp32 "torch" one. A backend whose dependencies
+are missing (ONNX needs `uv sync --extra onnx`) is
+reported and skipped:
+
+    uv run python benchmarks/bench_embedding_backends.py documents --backends torch int8 onnx
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.embeddings import EMBEDDING_BACKENDS, DocumentEmbedder  # noqa: E402
+from retrieval.loader import DocumentChunker, DocumentLoader  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", help="directory of documents")
+    parser.add_argument("--backends", nargs="+", default=EMBEDDING_BACKENDS)
+    parser.add_argument("--words", type=int, default=300, help="words per chunk")
+    parser.add_argument("--limit", type=int, default=512, help="most chunks to embed")
+    parser.add_argument("--queries", type=int, default=50, help="single-query calls timed")
+    args = parser.parse_args()
+
+    loader = DocumentLoader(chunker=DocumentChunker(args.words, args.words // 10))
+    texts = [chunk["text"] for chunk in loader.load_documents(args.directory)][: args.limit]
+    queries = [" ".join(text.split()[:8]) for text in texts[: args.queries]]
+    print(f"{len(texts)} chunks, {len(queries)} queries")
+
+    reference = DocumentEmbedder(query_cache_size=0)
+    print(f"{'backend':<10} {'docs/s':>8} {'query p50 ms':>13} {'mean cos':>9} {'min cos':>8}")
+    for backend in args.backends:
+        try:
+            embedder = (
+                reference
+                if backend == "torch"
+                else DocumentEmbedder(backend=backend, query_cache_size=0)
+            )
+        except Exception as e:
+            print(f"{backend:<10} unavailable: {e}")
+            continue
+
+        embedder.embed_documents(texts[:8])  # warm up
+        start = time.perf_counter()
+        embedder.embed_documents(texts)
+        docs_per_second = len(texts) / (time.perf_counter() - start)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            embedder.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        agreement = embedder.agreement(texts, reference=reference)
+        print(
+            f"{backend:<10} {docs_per_second:>8.1f} {statistics.median(latencies):>13.2f}"
+            f" {agreement['mean_cosine']:>9.4f} {agreement['min_cosine']:>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measure how chunk embedding scales with the encoding pool's workers.
+
+The directory is chunked as the indexer would, then embedded in groups
+as the ingestion pipeline hands them over: --pipeline-batch chunks at a
+time in this process (torch using every CPU), and --pipeline-batch per
+worker at a time for each --workers count on an EmbeddingPool. Pool startup (spawning workers and loading a model
+replica each) is timed separately, since a sync pays it once:
+
+    uv run python benchmarks/bench_encode_pool.py documents --workers 2 4 8
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.embeddings import DocumentEmbedder  # noqa: E402
+from retrieval.loader import DocumentChunker, DocumentLoader  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", help="directory of documents")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--words", type=int, default=300, help="words per chunk")
+    parser.add_argument(
+        "--pipeline-batch", type=int, default=64, help="chunks per embed call (per worker)"
+    )
+    args = parser.parse_args()
+
+    loader = DocumentLoader(chunker=DocumentChunker(args.words, args.words // 10))
+    texts = [chunk["text"] for chunk in loader.load_documents(args.directory)]
+    print(f"{len(texts)} chunks, {os.cpu_count()} CPUs")
+
+    embedder = DocumentEmbedder(query_cache_size=0)
+    embedder.embed_documents(texts[:8])  # warm up
+    start = time.perf_counter()
+    for group in _groups(texts, args.pipeline_batch):
+        embedder.embed_documents(group)
+    baseline = time.perf_counter() - start
+    print(f"{'in-process':<12} {len(texts) / baseline:>7.1f} texts/s")
+
+    for workers in args.workers:
+        with embedder.pool(workers) as pool:
+            start = time.perf_counter()
+            embedder.embed_documents(texts[: 8 * workers], pool=pool)  # spawn and load
+            startup = time.perf_counter() - start
+
+            start = time.perf_counter()
+            # the retriever scales its pipeline batch with the workers
+            for group in _groups(texts, args.pipeline_batch * workers):
+                embedder.embed_documents(group, pool=pool)
+            seconds = time.perf_counter() - start
+
+        print(
+            f"{workers:>2} workers   {len(texts) / seconds:>7.1f} texts/s"
+            f"  {baseline / seconds:>5.2f}x  (startup {startup:.1f} s)"
+        )
+
+
+def _groups(texts: list[str], size: int) -> list[list[str]]:
+    """Cut texts into groups of size, as the ingestion pipeline batches them."""
+    return [texts[start : start + size] for start in range(0, len(texts), size)]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure how long importing the API and its modules takes in a fresh
+interpreter, and which heavy dependencies the import pulls in.
+
+ChromaDB, sentence-transformers (with torch) and pypdf are imported on
+first use, so a process that only imports the app, e.g. a pre-fork
+worker's parent, a CLI tool or test collection, shouldn't load them.
+Each module is imported in --runs fresh interpreters and the median time
+is reported; with --max-seconds the script fails when the app's import
+exceeds the budget or loads a heavy dependency, so it can track
+regressions in CI:
+
+    uv run python benchmarks/bench_import.py --runs 5 --max-seconds 3
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# imported lazily by the package; none should be loaded by importing the app
+HEAVY = ("chromadb", "sentence_transformers", "torch", "transformers", "pypdf")
+
+MODULES = (
+    "src.retrieval.main",
+    "retrieval.retriever",
+    "retrieval.store",
+    "retrieval.embeddings",
+    "retrieval.loader",
+)
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module: str) -> dict:
+    """Import a module in a fresh interpreter; return its time and heavy modules loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT / "src"), "HF_HUB_OFFLINE": "1"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--max-seconds", type=float, help="fail above this for the app")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to import")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<24} {'median s':>9}  heavy modules loaded")
+    for module in args.modules:
+        runs = [time_import(module) for _ in range(args.runs)]
+        seconds = statistics.median(run["seconds"] for run in runs)
+        heavy = runs[-1]["heavy"]
+        print(f"{module:<24} {seconds:>9.3f}  {', '.join(heavy) or '-'}")
+
+        if args.max_seconds is not None and module == MODULES[0]:
+            if seconds > args.max_seconds:
+                failures.append(f"{module} took {seconds:.2f} s > {args.max_seconds} s")
+            if heavy:
+                failures.append(f"{module} imported {', '.join(heavy)}")
+
+    if failures:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark the BM25 lexical index: build time, memory taken by the
+postings, and query latency as the corpus grows.
+
+Chunks are synthetic text drawn from a Zipf-distributed vocabulary, like
+natural language, so no documents are needed:
+
+    uv run python benchmarks/bench_lexical.py --docs 10000 100000 --words 200
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.lexical import LexicalIndex  # noqa: E402
+
+
+def make_texts(n: int, words: int, vocabulary: list[str], rng: np.random.Generator) -> list[str]:
+    """Return n texts of the given length with Zipf-distributed word frequencies."""
+    ranks = np.minimum(rng.zipf(1.2, size=(n, words)), len(vocabulary)) - 1
+    return [" ".join(vocabulary[r] for r in row) for row in ranks]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--docs", type=int, nargs="+", default=[1000, 10000, 100000], help="corpus sizes"
+    )
+    parser.add_argument("--words", type=int, default=200, help="words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=50000, help="distinct words")
+    parser.add_argument("--queries", type=int, default=500, help="queries to time")
+    parser.add_argument("--query-words", type=int, default=4, help="words per query")
+    parser.add_argument("-k", type=int, default=10, help="results per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    # queries favour rarer, more specific words, as people's searches do
+    queries = [
+        " ".join(vocabulary[r] for r in rng.integers(10, 5000, size=args.query_words))
+        for _ in range(args.queries)
+    ]
+
+    print(f"{args.words} words per chunk, {args.query_words} words per query, k={args.k}\n")
+    print(
+        f"{'docs':>8} {'build s':>8} {'postings MB':>12} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+    )
+    for n in args.docs:
+        texts = make_texts(n, args.words, vocabulary, rng)
+        index = LexicalIndex()
+        start = time.perf_counter()
+        index.add([str(i) for i in range(n)], texts)
+        build_seconds = time.perf_counter() - start
+        postings = sum(p.buffer_info()[1] * p.itemsize for p in index._postings + index._freqs)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        p50, p95, worst = np.percentile(latencies, [50, 95, 100])
+        print(
+            f"{n:>8} {build_seconds:>8.2f} {postings / 2**20:>12.1f} "
+            f"{p50:>8.3f} {p95:>8.3f} {worst:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
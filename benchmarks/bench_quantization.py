@@ -0,0 +1,89 @@
+"""
+Benchmark quantized storage in the NumPy backend: memory taken by the
+codes, query latency and recall@k against the unquantized index, for a few
+rescoring shortlist sizes. Each quantization runs twice: "mapped" persists
+and flushes, so the float32 rows are memory-mapped from the index files;
+"memory" has no persist directory, so they are spilled to a temporary file.
+
+Vectors are synthetic (clustered unit vectors), so no model is needed:
+
+    uv run python benchmarks/bench_quantization.py --docs 100000 -k 10
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from bench_backends import build, make_vectors, recall, time_queries  # noqa: E402
+
+from retrieval.backends import NumpyBackend  # noqa: E402
+from retrieval.quantization import QUANTIZATIONS  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=100000, help="vectors in the index")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="topics the vectors form")
+    parser.add_argument("--queries", type=int, default=256, help="queries to time")
+    parser.add_argument("-k", type=int, default=10, help="results per query")
+    parser.add_argument("--batch", type=int, default=32, help="queries per call")
+    parser.add_argument(
+        "--rescore", type=int, nargs="+", default=[4, 10, 40], help="rescore factors to try"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = make_vectors(args.docs, args.dim, args.clusters, rng)
+    queries = make_vectors(args.queries, args.dim, args.clusters, rng)
+
+    exact_backend = NumpyBackend()
+    build(exact_backend, vectors, batch_size=10000)
+    exact, latencies = time_queries(exact_backend, queries, args.k, batch_size=args.batch)
+    full_bytes = exact_backend.stats()["vector_bytes"]
+
+    print(f"{args.docs} docs x {args.dim} dims, {args.queries} queries, k={args.k}\n")
+    print(
+        f"{'storage':<8} {'mode':<7} {'rescore':>7} {'in-memory MB':>13} {'saved':>6} "
+        f"{'ms/query':>9} {'recall@k':>9}"
+    )
+    print(
+        f"{'float32':<8} {'memory':<7} {'-':>7} {full_bytes / 2**20:>13.1f} {0:>6.0%} "
+        f"{latencies.sum() / args.queries:>9.3f} {1:>9.3f}"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in QUANTIZATIONS:
+            for mode in ("mapped", "memory"):
+                persist_directory = Path(tmp) / name if mode == "mapped" else None
+                backend = NumpyBackend(persist_directory, quantization=name)
+                build(backend, vectors, batch_size=10000)
+                backend.flush()
+                code_bytes = backend.stats()["code_bytes"]
+
+                for factor in args.rescore:
+                    backend.rescore_factor = factor
+                    found, latencies = time_queries(backend, queries, args.k, batch_size=args.batch)
+                    print(
+                        f"{name:<8} {mode:<7} {factor:>7} {code_bytes / 2**20:>13.1f} "
+                        f"{1 - code_bytes / full_bytes:>6.0%} {latencies.sum() / args.queries:>9.3f} "
+                        f"{recall(found, exact):>9.3f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Measure how indexing and search scale with the corpus: ingestion time,
+peak memory, index size on disk and query latency from 1x to 1000x the
+bundled documents.
+
+A corpus of scale k holds k copies of every source document: the first
+is the original file, the others are its text with --perturb of the
+words swapped for random words of the corpus's vocabulary, so the copies
+aren't collapsed as (near-)duplicates. Each scale is indexed into a fresh
+on-disk index by a fresh process, so its peak RSS is its own; tracemalloc
+adds the peak of Python's own allocations. Tracing slows ingestion
+severalfold, so pass --no-tracemalloc for clean timings. Queries are
+random snippets of the source documents, run through
+DocumentRetriever.search with the caches off, i.e. /search without HTTP.
+
+--stub swaps the model for a hashed bag-of-words embedder, to isolate the
+loader's and store's scaling from the model's; the model would take
+hours to embed the large scales on a CPU. The report ends with each
+metric's scaling exponent, the slope of log(metric) over log(scale): 1 is
+linear:
+
+    uv run python benchmarks/bench_scaling.py documents --scales 1 10 100 1000 --stub \\
+        --output scaling.json
+
+Scale 1000 of documents writes about 1.3 GB of text to --work-dir.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from retrieval.embeddings import EncodeStats  # noqa: E402
+from retrieval.loader import DocumentLoader  # noqa: E402
+from retrieval.retriever import DocumentRetriever  # noqa: E402
+
+MB = 1024 * 1024
+# ru_maxrss is in KiB on Linux, bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+METRICS = ("ingest_seconds", "peak_rss_mb", "peak_traced_mb", "index_mb", "p99_ms")
+
+
+class StubEmbedder:
+    """
+    Hashed bag-of-words embeddings: each word adds one to a hashed slot.
+
+    Cheap and deterministic, with DocumentEmbedder's interface, so the
+    loader's and store's costs can be measured without the model's.
+    Texts sharing words get similar vectors, so search still ranks.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model_name = f"stub-hash-{dimensions}"
+        self.cache = None
+        self.query_cache = None
+        self.encode_stats = EncodeStats()
+
+    def embed_documents(self, texts: List[str], pool=None) -> np.ndarray:
+        if not texts:
+            return np.array([])
+        start = time.perf_counter()
+        embeddings = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        tokens = 0
+        for row, text in enumerate(texts):
+            words = text.lower().split()
+            slots = [zlib.crc32(word.encode()) % self.dimensions for word in words]
+            embeddings[row] = np.bincount(slots, minlength=self.dimensions)
+            tokens += len(words)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms == 0, 1, norms)
+        self.encode_stats.record(len(texts), tokens, tokens, time.perf_counter() - start)
+        return embeddings
+
+    def embed_query(self, queries: Union[str, List[str]]) -> np.ndarray:
+        if isinstance(queries, str):
+            return self.embed_documents([queries])[0]
+        return self.embed_documents(queries)
+
+
+def read_sources(directory: str) -> dict[str, str]:
+    """Return the text of each loadable file in a directory by file name."""
+    loader = DocumentLoader()
+    sources = {}
+    for filepath in loader.list_files(directory):
+        if filepath.suffix == ".pdf":
+            import pypdf
+
+            pages = pypdf.PdfReader(filepath).pages
+            sources[filepath.name] = "\n".join(page.extract_text() or "" for page in pages)
+        else:
+            sources[filepath.name] = filepath.read_text(encoding="utf-8")
+    return sources
+
+
+def synthesize(
+    source_dir: str, sources: dict[str, str], target: Path, scale: int, perturb: float, seed: int
+) -> int:
+    """
+    Write a corpus of `scale` copies of each source document to target.
+
+    Copy 0 is the original file; copy i is its text with a `perturb`
+    fraction of the words replaced by random vocabulary words, seeded by
+    (seed, i) so every scale contains the smaller ones' copies.
+
+    Returns:
+        Bytes written
+    """
+    target.mkdir(parents=True)
+    words = {name: np.array(text.split(), dtype=object) for name, text in sources.items()}
+    vocabulary = np.unique(np.concatenate(list(words.values())))
+    written = 0
+    for name in sources:
+        shutil.copyfile(Path(source_dir) / name, target / name)
+        written += (target / name).stat().st_size
+    for copy in range(1, scale):
+        rng = np.random.default_rng([seed, copy])
+        for name, original in words.items():
+            perturbed = original.copy()
+            swapped = rng.random(len(perturbed)) < perturb
+            perturbed[swapped] = vocabulary[rng.integers(len(vocabulary), size=swapped.sum())]
+            path = target / f"{Path(name).stem}__copy{copy:04d}.txt"
+            path.write_text(" ".join(perturbed), encoding="utf-8")
+            written += path.stat().st_size
+    return written
+
+
+def directory_size(path: Path) -> int:
+    """Total size of the files under a directory, in bytes."""
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def measure_scale(corpus: str, index: str, queries: list[str], options: dict) -> dict:
+    """
+    Index a corpus and query it; runs in a fresh process per scale.
+
+    Returns:
+        Dict of the scale's measurements
+    """
+    embedder = StubEmbedder() if options["stub"] else None
+    retriever = DocumentRetriever(
+        chunk_size=options["chunk_size"],
+        overlap=options["chunk_size"] // 10,
+        persist_directory=index,
+        backend=options["backend"],
+        query_cache_size=0,
+        result_cache_size=0,
+        encode_workers=options["encode_workers"],
+        embedder=embedder,
+    )
+    retriever.embedder.embed_query("warm up")
+    rss_ready = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / MB
+
+    if options["tracemalloc"]:
+        tracemalloc.start()
+    start = time.perf_counter()
+    indexed = retriever.index_documents(corpus)
+    ingest_seconds = time.perf_counter() - start
+    traced = tracemalloc.get_traced_memory()[1] / MB if tracemalloc.is_tracing() else None
+    tracemalloc.stop()
+
+    for query in queries[:5]:  # warm up
+        retriever.search(query, n_results=options["n_results"])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.search(query, n_results=options["n_results"])
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / MB
+    retriever.shutdown()
+    return {
+        "chunks": indexed,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "chunks_per_second": round(indexed / ingest_seconds, 1) if ingest_seconds else 0.0,
+        "rss_ready_mb": round(rss_ready, 1),
+        "peak_rss_mb": round(rss_peak, 1),
+        "peak_traced_mb": round(traced, 1) if traced is not None else None,
+        "index_mb": round(directory_size(Path(index)) / MB, 2),
+        "queries": len(latencies),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def exponents(results: list[dict]) -> dict[str, float]:
+    """Fit each metric's slope of log(metric) over log(scale)."""
+    fitted = {}
+    scales = np.log([result["scale"] for result in results])
+    for metric in METRICS:
+        values = [result[metric] for result in results]
+        if len(values) < 2 or any(value is None or value <= 0 for value in values):
+            continue
+        fitted[metric] = round(float(np.polyfit(scales, np.log(values), 1)[0]), 3)
+    return fitted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", help="directory of source documents")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--stub", action="store_true", help="hashed embeddings, no model")
+    parser.add_argument("--perturb", type=float, default=0.1, help="fraction of words swapped")
+    parser.add_argument("--chunk-size", type=int, default=300, help="words per chunk")
+    parser.add_argument("--backend", default="chroma", help="vector store backend")
+    parser.add_argument("--encode-workers", type=int, default=1, help="embedding processes")
+    parser.add_argument("--queries", type=int, default=200, help="searches timed per scale")
+    parser.add_argument("--n-results", type=int, default=5, help="results per search")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="where corpora and indexes go (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the corpora and indexes")
+    parser.add_argument("--output", help="write the results here as JSON")
+    args = parser.parse_args()
+
+    sources = read_sources(args.directory)
+    rng = np.random.default_rng(args.seed)
+    snippets = [text.split() for text in sources.values()]
+    queries = []
+    for _ in range(args.queries):
+        words = snippets[rng.integers(len(snippets))]
+        start = int(rng.integers(max(len(words) - 8, 1)))
+        queries.append(" ".join(words[start : start + 8]))
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="bench-scaling-"))
+    options = {
+        key: getattr(args, key)
+        for key in ("stub", "chunk_size", "backend", "encode_workers", "n_results", "tracemalloc")
+    }
+    print(f"{len(sources)} source documents, working in {work_dir}")
+    print(
+        f"{'scale':>6} {'corpus MB':>10} {'chunks':>8} {'ingest s':>9} {'chunks/s':>9}"
+        f" {'RSS MB':>8} {'traced MB':>10} {'index MB':>9} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for scale in sorted(args.scales):
+        corpus, index = work_dir / f"corpus-{scale}", work_dir / f"index-{scale}"
+        for path in (corpus, index):
+            shutil.rmtree(path, ignore_errors=True)
+        corpus_bytes = synthesize(args.directory, sources, corpus, scale, args.perturb, args.seed)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(measure_scale, str(corpus), str(index), queries, options).result()
+        result = {"scale": scale, "corpus_mb": round(corpus_bytes / MB, 2), **result}
+        results.append(result)
+        traced = f"{result['peak_traced_mb']:>10.1f}" if result["peak_traced_mb"] else f"{'-':>10}"
+        print(
+            f"{scale:>6} {result['corpus_mb']:>10.1f} {result['chunks']:>8}"
+            f" {result['ingest_seconds']:>9.2f} {result['chunks_per_second']:>9.1f}"
+            f" {result['peak_rss_mb']:>8.0f} {traced} {result['index_mb']:>9.1f}"
+            f" {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+        if not args.keep:
+            for path in (corpus, index):
+                shutil.rmtree(path, ignore_errors=True)
+
+    fitted = exponents(results)
+    if fitted:
+        print("\nscaling exponents (1 = linear in corpus size)")
+        for metric, exponent in fitted.items():
+            print(f"  {metric:<15} {exponent:>6.2f}")
+    if not args.keep and not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        report = {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "settings": {**options, "perturb": args.perturb, "queries": args.queries},
+            "scales": results,
+            "exponents": fitted,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
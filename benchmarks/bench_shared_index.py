@@ -0,0 +1,110 @@
+"""
+Measure per-process memory when several workers serve one NumPy index.
+
+Builds a synthetic index in a temporary directory, then starts N worker
+processes that each open it (memory-mapped, as the API does) and run
+queries. For comparison, the same workers are run again with a private
+in-memory copy of the index each. On Linux, PSS (proportional set size)
+splits shared pages between the processes that map them, so it shows what
+each worker really costs:
+
+    uv run python benchmarks/bench_shared_index.py --docs 200000 --workers 8
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from bench_backends import make_vectors  # noqa: E402
+
+from retrieval.backends import NumpyBackend  # noqa: E402
+
+
+def memory_mb() -> tuple[float, float]:
+    """Return this process's (RSS, PSS) in MB, from /proc (Linux only)."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values["Rss:"], values["Pss:"]
+
+
+def worker(directory: str, private: bool, queries: np.ndarray, ready, done, results) -> None:
+    """Open the index, query it, report memory, then wait so all workers overlap."""
+    backend = NumpyBackend(directory)
+    if private:
+        backend._materialize()  # an in-memory copy, as a non-shared index would hold
+    backend.query(queries, n_results=10)
+    ready.wait()
+    results.put(memory_mb())
+    done.wait()
+
+
+def run(directory: str, workers: int, private: bool, queries: np.ndarray) -> list:
+    """Run the workers together and collect each one's memory."""
+    ctx = multiprocessing.get_context("spawn")
+    ready, done, results = ctx.Barrier(workers + 1), ctx.Event(), ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(directory, private, queries, ready, done, results))
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    ready.wait()
+    memory = [results.get() for _ in procs]
+    done.set()
+    for proc in procs:
+        proc.join()
+    return memory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=200000, help="vectors in the index")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension")
+    parser.add_argument("--workers", type=int, default=4, help="processes serving the index")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.docs, args.dim, 200, rng)
+    queries = make_vectors(32, args.dim, 200, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = NumpyBackend(tmp)
+        ids = [str(i) for i in range(args.docs)]
+        backend.add(
+            ids, [f"chunk {i}" for i in ids], [{"row": i} for i in range(args.docs)], vectors
+        )
+        backend.flush()
+        del backend
+
+        print(
+            f"{args.docs} docs x {args.dim} dims ({vectors.nbytes / 2**20:.0f} MB of vectors), "
+            f"{args.workers} workers\n"
+        )
+        print(f"{'index':<14} {'RSS MB/worker':>14} {'PSS MB/worker':>14} {'PSS MB total':>13}")
+        for label, private in (("private copy", True), ("memory-mapped", False)):
+            memory = run(tmp, args.workers, private, queries)
+            rss = np.mean([m[0] for m in memory])
+            pss = [m[1] for m in memory]
+            print(f"{label:<14} {rss:>14.0f} {np.mean(pss):>14.0f} {np.sum(pss):>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Per-stage micro-benchmarks with regression checks: chunking, PDF loading,
+embedding, adding to the vector store and searching it.
+
+Everything runs offline against the test corpus (tests/data): Dracula for
+chunking and embedding, MSAI-courses.pdf for PDF loading. Each stage is
+timed over several operations and reported as throughput (items per
+second) and latency percentiles per operation. Caches are disabled so
+each operation does the real work.
+
+Results go to --output as JSON. With --baseline, each stage's median
+latency is compared with the baseline's, and the script exits non-zero
+when one got slower by more than --threshold (a fraction; per-stage
+overrides with --stage-threshold). --save-baseline writes this run as the
+new baseline:
+
+    HF_HUB_OFFLINE=1 uv run python benchmarks/bench_stages.py --save-baseline baseline.json
+    HF_HUB_OFFLINE=1 uv run python benchmarks/bench_stages.py --baseline baseline.json \\
+        --threshold 0.2 --stage-threshold embed=0.3 --output results.json
+
+Baselines only compare meaningfully on the same machine.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from retrieval.embeddings import DocumentEmbedder  # noqa: E402
+from retrieval.loader import DocumentChunker, DocumentLoader  # noqa: E402
+from retrieval.store import VectorStore  # noqa: E402
+
+TEXT_FILE = ROOT / "tests" / "data" / "dracula_by_bram_stoker.txt"
+PDF_FILE = ROOT / "tests" / "data" / "MSAI-courses.pdf"
+STAGES = ("chunk", "load_pdf", "embed", "store_add", "search")
+
+QUERIES = (
+    "vampire hunting at night",
+    "letters from Transylvania",
+    "the count's castle",
+    "blood transfusion",
+    "ship wrecked at Whitby",
+    "professor Van Helsing's plan",
+    "garlic flowers in the bedroom",
+    "a journey by train",
+)
+
+
+def measure(unit: str, operations: list[Callable[[], int]]) -> dict:
+    """
+    Run operations one after another, timing each.
+
+    Args:
+        unit: What the operations process, e.g. "chunks"
+        operations: Callables returning how many units they processed
+
+    Returns:
+        Dict with 'unit', 'operations', 'items', 'seconds',
+        'items_per_second' and p50/p90/p99 latency in ms per operation
+    """
+    latencies, items = [], 0
+    for operation in operations:
+        start = time.perf_counter()
+        items += operation()
+        latencies.append(time.perf_counter() - start)
+    seconds = sum(latencies)
+    p50, p90, p99 = np.percentile(np.array(latencies) * 1000, [50, 90, 99])
+    return {
+        "unit": unit,
+        "operations": len(latencies),
+        "items": items,
+        "seconds": round(seconds, 4),
+        "items_per_second": round(items / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def run_stages(args: argparse.Namespace) -> dict:
+    """Run the selected stages and return their measurements by name."""
+    chunker = DocumentChunker(args.chunk_size, args.chunk_size // 10)
+    text = TEXT_FILE.read_text(encoding="utf-8")
+    chunks = chunker.chunk_text(text, TEXT_FILE.stem)[: args.chunks]
+    texts = [chunk["text"] for chunk in chunks]
+    results = {}
+
+    if "chunk" in args.stages:
+        words = len(text.split())
+
+        def chunk() -> int:
+            chunker.chunk_text(text, TEXT_FILE.stem)
+            return words
+
+        chunk()  # warm up
+        results["chunk"] = measure("words", [chunk] * args.repeats)
+
+    if "load_pdf" in args.stages:
+        loader = DocumentLoader(chunker=chunker)
+
+        def load_pdf() -> int:
+            documents = loader._load_pdf_file(PDF_FILE)
+            return documents[0]["metadata"]["num_pages"] if documents else 0
+
+        load_pdf()  # warm up, and import pypdf
+        results["load_pdf"] = measure("pages", [load_pdf] * args.repeats)
+
+    needs_model = {"embed", "store_add", "search"} & set(args.stages)
+    if not needs_model:
+        return results
+
+    embedder = DocumentEmbedder(query_cache_size=0)
+    embedder.embed_documents(texts[:8])  # warm up
+    batches = [texts[i : i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+
+    if "embed" in args.stages:
+        results["embed"] = measure(
+            "chunks",
+            [lambda batch=batch: len(embedder.embed_documents(batch)) for batch in batches],
+        )
+
+    embeddings = embedder.embed_documents(texts)
+    store = VectorStore(embedder, backend=args.backend, result_cache_size=0)
+
+    def add(lo: int) -> int:
+        batch = chunks[lo : lo + args.batch_size]
+        store.add_documents(batch, embeddings[lo : lo + len(batch)])
+        return len(batch)
+
+    adds = [lambda lo=lo: add(lo) for lo in range(0, len(chunks), args.batch_size)]
+    if "store_add" in args.stages:
+        results["store_add"] = measure("chunks", adds)
+    else:
+        for operation in adds:
+            operation()
+
+    if "search" in args.stages:
+
+        def search(query: str) -> int:
+            store.search(query, n_results=5)
+            return 1
+
+        queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+        results["search"] = measure("queries", [lambda q=q: search(q) for q in queries])
+
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float, overrides: dict) -> list[str]:
+    """
+    Compare each stage's median latency with the baseline's.
+
+    Returns:
+        A message for each stage slower than its threshold allows
+    """
+    regressions = []
+    print(f"\n{'stage':<10} {'baseline p50':>13} {'now p50':>10} {'change':>8}  limit")
+    for name, stage in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = stage["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        limit = overrides.get(name, threshold)
+        flag = "  REGRESSED" if change > limit else ""
+        print(
+            f"{name:<10} {before['p50_ms']:>10.2f} ms {stage['p50_ms']:>7.2f} ms"
+            f" {change:>+8.1%}  {limit:.0%}{flag}"
+        )
+        if change > limit:
+            regressions.append(f"{name}: p50 {change:+.1%} vs baseline (limit {limit:.0%})")
+    return regressions
+
+
+def parse_overrides(values: list[str]) -> dict[str, float]:
+    """Parse stage=fraction pairs."""
+    overrides = {}
+    for value in values:
+        name, _, fraction = value.partition("=")
+        if name not in STAGES or not fraction:
+            raise SystemExit(f"--stage-threshold wants stage=fraction with a stage of {STAGES}")
+        overrides[name] = float(fraction)
+    return overrides
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeats", type=int, default=5, help="runs of chunk and load_pdf")
+    parser.add_argument("--chunks", type=int, default=256, help="chunks embedded and stored")
+    parser.add_argument("--chunk-size", type=int, default=300, help="words per chunk")
+    parser.add_argument("--batch-size", type=int, default=32, help="chunks per embed/add call")
+    parser.add_argument("--queries", type=int, default=100, help="searches timed")
+    parser.add_argument("--backend", default="chroma", help="vector store backend")
+    parser.add_argument("--output", help="write the results here as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--save-baseline", help="write the results here as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p50 slowdown")
+    parser.add_argument("--stage-threshold", action="append", default=[], metavar="STAGE=F")
+    args = parser.parse_args()
+    overrides = parse_overrides(args.stage_threshold)
+
+    stages = run_stages(args)
+    print(f"{'stage':<10} {'items/s':>10} {'unit':<8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for name, stage in stages.items():
+        print(
+            f"{name:<10} {stage['items_per_second']:>10.1f} {stage['unit']:<8}"
+            f" {stage['p50_ms']:>9.2f} {stage['p90_ms']:>9.2f} {stage['p99_ms']:>9.2f}"
+        )
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "settings": {
+            key: getattr(args, key)
+            for key in ("repeats", "chunks", "chunk_size", "batch_size", "queries", "backend")
+        },
+        "stages": stages,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("settings") != results["settings"]:
+            print("Warning: the baseline was measured with different settings")
+        regressions = compare(stages, baseline["stages"], args.threshold, overrides)
+        if regressions:
+            sys.exit("Regressions:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,892 @@
+"""
+Search backends behind VectorStore: ChromaDB and exact NumPy search.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import cache
+from pathlib import Path
+
+import numpy as np
+
+from retrieval.filters import MetadataIndex
+from retrieval.metrics import SEARCH_STAGE_SECONDS
+from retrieval.quantization import BLOCK_ROWS, QUANTIZATIONS, Quantizer, make_quantizer
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBackend(ABC):
+    """
+    Where VectorStore keeps its vectors and how it finds nearest neighbors.
+
+    Backends are handed precomputed embeddings; embedding text is the
+    store's job. Search results are lists of dicts with 'id', 'text',
+    'distance' and 'metadata', where distance is the squared L2 distance
+    between unit vectors (lower is closer).
+    """
+
+    @abstractmethod
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict], embeddings) -> None:
+        """Add documents, leaving any whose id is already present untouched."""
+
+    @abstractmethod
+    def upsert(self, ids: list[str], texts: list[str], metadatas: list[dict], embeddings) -> None:
+        """Add documents, replacing any with the same id."""
+
+    @abstractmethod
+    def delete(self, ids: list[str]) -> None:
+        """Remove documents by id; unknown ids are ignored."""
+
+    @abstractmethod
+    def query(self, embeddings, n_results: int, where: dict | None = None) -> list[list[dict]]:
+        """Return the n_results nearest documents for each query embedding."""
+
+    @abstractmethod
+    def get(self, ids: list[str]) -> list[dict]:
+        """
+        Look documents up by id.
+
+        Returns:
+            Dicts with 'id', 'text' and 'metadata', in the order of ids;
+            unknown ids are skipped
+        """
+
+    @abstractmethod
+    def embeddings(self, ids: list[str]) -> dict[str, np.ndarray]:
+        """Return the stored embedding of each known id, keyed by id."""
+
+    @abstractmethod
+    def documents(self) -> list[tuple[str, str, dict]]:
+        """Return (id, text, metadata) for every document stored."""
+
+    @abstractmethod
+    def matching_ids(self, where: dict) -> list[str]:
+        """Return the ids of every document matching a where clause."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of documents stored."""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Drop every document."""
+
+    def flush(self) -> None:
+        """Make pending writes durable (a no-op for backends that write through)."""
+
+    def refresh(self) -> bool:
+        """
+        Pick up changes another process made to a shared index.
+
+        Returns:
+            True if what this backend serves changed
+        """
+        return False
+
+
+@cache
+def _chroma_function_class() -> type:
+    """
+    Build the ChromaDB embedding function class on first use, so chromadb
+    is only imported by processes that search with it.
+    """
+    from chromadb.api.types import EmbeddingFunction
+
+    class ChromaEmbeddingFunction(EmbeddingFunction):
+        """Adapts a callable embedder to ChromaDB's embedding function."""
+
+        def __init__(self, embedder):
+            self.embedder = embedder
+
+        def is_legacy(self) -> bool:
+            """Return True since we don't support build from config, etc."""
+            return True
+
+        def __call__(self, input) -> list[list[float]]:
+            return self.embedder(input)
+
+    return ChromaEmbeddingFunction
+
+
+class ChromaBackend(SearchBackend):
+    """
+    Approximate (HNSW) search in a ChromaDB collection.
+
+    Args:
+        embedding_function: Callable embedding a list of texts as a list of
+            vectors, wrapped as the collection's ChromaDB embedding function
+        collection_name: Name for the ChromaDB collection
+        persist_directory: Directory to keep the collection in between runs.
+            If None, an ephemeral in-memory collection is used.
+    """
+
+    PAGE_SIZE = 1000  # documents fetched per call by documents()
+
+    def __init__(
+        self,
+        embedding_function=None,
+        collection_name: str = "documents",
+        persist_directory: str | None = None,
+    ):
+        import chromadb
+        from chromadb import Settings
+
+        if embedding_function is not None:
+            embedding_function = _chroma_function_class()(embedding_function)
+        self.embedding_function = embedding_function
+        self.collection_name = collection_name
+        settings = Settings(anonymized_telemetry=False)
+
+        if persist_directory is not None:
+            #  reopen whatever was indexed on a previous run
+            self.client = chromadb.PersistentClient(path=persist_directory, settings=settings)
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=embedding_function,
+            )
+            return
+
+        #  use ChromaDB client
+        self.client = chromadb.Client(settings)
+
+        # Delete any existing collection if present
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop every document by recreating an empty collection."""
+        try:
+            self.client.delete_collection(self.collection_name)
+        except Exception:
+            pass
+
+        self.collection = self.client.create_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_function,
+        )
+
+    def add(self, ids, texts, metadatas, embeddings) -> None:
+        self.collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+
+    def upsert(self, ids, texts, metadatas, embeddings) -> None:
+        # Chroma merges a replaced document's metadata into the old one;
+        # a None value drops a key, so old keys the new metadata lacks go
+        old = self.collection.get(ids=list(ids), include=["metadatas"])
+        old = {
+            doc_id: metadata for doc_id, metadata in zip(old["ids"], old["metadatas"]) if metadata
+        }
+        metadatas = [
+            {**dict.fromkeys(old[doc_id]), **(metadata or {})} if doc_id in old else metadata
+            for doc_id, metadata in zip(ids, metadatas)
+        ]
+        self.collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=list(ids))
+
+    def query(self, embeddings, n_results: int, where: dict | None = None) -> list[list[dict]]:
+        #  use ChromaDB's query interface
+        with SEARCH_STAGE_SECONDS.time("collection"):
+            results = self.collection.query(
+                query_embeddings=embeddings, n_results=n_results, where=where
+            )
+
+        formatted = []
+        #  Format results
+        with SEARCH_STAGE_SECONDS.time("format"):
+            for q in range(len(embeddings)):
+                hits = []
+                if q < len(results["ids"]):
+                    for i in range(len(results["ids"][q])):
+                        hits.append(
+                            {
+                                "id": results["ids"][q][i],
+                                "text": results["documents"][q][i],
+                                "distance": results["distances"][q][i],
+                                "metadata": results["metadatas"][q][i],
+                            }
+                        )
+                formatted.append(hits)
+
+        return formatted
+
+    def get(self, ids) -> list[dict]:
+        results = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        found = {
+            doc_id: {"id": doc_id, "text": text, "metadata": metadata}
+            for doc_id, text, metadata in zip(
+                results["ids"], results["documents"], results["metadatas"]
+            )
+        }
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+
+    def embeddings(self, ids) -> dict[str, np.ndarray]:
+        results = self.collection.get(ids=list(ids), include=["embeddings"])
+        return {
+            doc_id: np.asarray(vector, dtype=np.float32)
+            for doc_id, vector in zip(results["ids"], results["embeddings"])
+        }
+
+    def matching_ids(self, where: dict) -> list[str]:
+        return self.collection.get(where=where, include=[])["ids"]
+
+    def documents(self) -> list[tuple[str, str, dict]]:
+        documents = []
+        #  page through the collection so one call never loads it twice over
+        while True:
+            page = self.collection.get(
+                limit=self.PAGE_SIZE, offset=len(documents), include=["documents", "metadatas"]
+            )
+            documents.extend(zip(page["ids"], page["documents"], page["metadatas"]))
+            if len(page["ids"]) < self.PAGE_SIZE:
+                return documents
+
+    def count(self) -> int:
+        #  ask the collection for its size
+        return self.collection.count()
+
+
+class NumpyBackend(SearchBackend):
+    """
+    Exact search over a contiguous, L2-normalized float32 matrix.
+
+    A batch of queries is answered with one matrix multiply and an
+    ``argpartition`` top-k per row, so there is no graph to build or
+    maintain and no list conversion on the way in. For tens of thousands
+    of chunks this is both faster than HNSW and exact.
+
+    With ``quantization`` set, a compact copy of every vector (float16,
+    int8 or 1-bit binary codes) is scored first, and only the best
+    ``n_results * rescore_factor`` candidates are rescored against the
+    float32 vectors. Those stay on disk: memory-mapped from the persist
+    directory, or without one spilled to a memory map over an unlinked
+    temporary file (in ``TMPDIR``, which should not be a tmpfs), so only
+    the codes and the rescored rows take memory.
+
+    Rows are kept packed: the matrix grows by doubling, and a delete moves
+    the last row into the hole. Reads and writes share a lock, so a sync
+    can run while the API is serving.
+
+    With a persist directory, flush() writes the index as a new version
+    (see IndexFiles) and switches a ``CURRENT`` pointer to it atomically.
+    Between writes the index is served straight from those files through
+    read-only memory maps, so every process serving the same directory
+    (e.g. uvicorn workers) shares one copy in the OS page cache. Each
+    query stats the pointer, reads it only when the stat changed, and
+    re-maps when another process has flushed a newer version. The first
+    write after that copies the index into memory until the next flush.
+
+    Args:
+        persist_directory: Directory to keep the index in between runs, or
+            None to keep it in memory only
+        quantization: None for float32 only, or "float16", "int8" or "binary"
+        rescore_factor: Candidates per requested result taken from the
+            coarse pass for exact rescoring
+    """
+
+    CURRENT_FILENAME = "CURRENT"
+    KEEP_VERSIONS = 2  # the current version and the one before, for late readers
+
+    def __init__(
+        self,
+        persist_directory: str | None = None,
+        quantization: str | None = None,
+        rescore_factor: int = 10,
+    ):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}"
+            )
+        if rescore_factor < 1:
+            raise ValueError("rescore_factor must be >= 1")
+
+        self.persist_directory = Path(persist_directory) if persist_directory else None
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        # memory-only and quantized: keep the float32 vectors in a temporary file
+        self._spill = quantization is not None and self.persist_directory is None
+        self.version: str | None = None  # name of the mapped version, if any
+        self._current_stat: tuple | None = None  # CURRENT's stat when last read
+        self._lock = threading.RLock()
+        self.reset()
+        self._dirty = False
+
+        if self.persist_directory is not None:
+            self.refresh()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._matrix = np.empty((0, 0), dtype=np.float32)  # rows beyond _size are spare
+            self._quantizer: Quantizer | None = None
+            self._codes: np.ndarray | None = None  # same rows as _matrix, when quantized
+            self._size = 0
+            self._files: IndexFiles | None = None  # the mapped version, while unchanged
+            self._ids: list[str] | None = []  # None while served from _files
+            self._texts: list[str] | None = []
+            self._metadatas: list[dict] | None = []
+            self._rows: dict[str, int] = {}
+            self._filter_index: MetadataIndex | None = None  # built on the first filtered query
+            self._dirty = True
+
+    def add(self, ids, texts, metadatas, embeddings) -> None:
+        self._write(ids, texts, metadatas, embeddings, replace=False)
+
+    def upsert(self, ids, texts, metadatas, embeddings) -> None:
+        self._write(ids, texts, metadatas, embeddings, replace=True)
+
+    def _write(self, ids, texts, metadatas, embeddings, replace: bool) -> None:
+        """Insert new rows and, if replace, overwrite existing ones."""
+        vectors = _normalize(embeddings)
+        if len(vectors) != len(ids):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(ids)} documents")
+
+        with self._lock:
+            self._materialize()
+            if self._size == 0:
+                self._start(vectors.shape[1])
+            elif vectors.shape[1] != self._matrix.shape[1]:
+                raise ValueError(
+                    f"Expected {self._matrix.shape[1]}-dimensional embeddings, "
+                    f"got {vectors.shape[1]}"
+                )
+
+            rows, keep = [], []
+            for i, doc_id in enumerate(ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._rows[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._texts.append(texts[i])
+                    self._metadatas.append(metadatas[i])
+                elif replace:
+                    self._texts[row] = texts[i]
+                    self._metadatas[row] = metadatas[i]
+                else:
+                    continue
+                rows.append(row)
+                keep.append(i)
+
+            self._reserve(len(self._ids))
+            self._matrix[rows] = vectors[keep]
+            if self._quantizer is not None:
+                if self._quantizer.refit(vectors[keep]):
+                    self._encode_rows(self._size)  # calibration widened: redo old codes
+                self._codes[rows] = self._quantizer.encode(vectors[keep])
+            self._size = len(self._ids)
+            self._dirty = True
+            self._filter_index = None
+
+    def _start(self, dim: int) -> None:
+        """Set up empty storage for dim-dimensional vectors."""
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._codes = None
+        self._quantizer = None
+        if self.quantization is not None:
+            self._quantizer = make_quantizer(self.quantization, dim)
+            self._codes = np.empty((0, self._quantizer.width), dtype=self._quantizer.dtype)
+
+    def _encode_rows(self, stop: int) -> None:
+        """(Re-)encode the codes of rows [0, stop) from the float32 vectors."""
+        for lo in range(0, stop, BLOCK_ROWS):
+            hi = min(lo + BLOCK_ROWS, stop)
+            self._codes[lo:hi] = self._quantizer.encode(np.asarray(self._matrix[lo:hi]))
+
+    def _reserve(self, rows: int) -> None:
+        """Grow the matrix (by doubling) so it holds at least this many rows."""
+        capacity = self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity, 256)
+        grow = _grow_on_disk if self._spill else _grow
+        self._matrix = grow(self._matrix, capacity, self._size)
+        if self._codes is not None:
+            self._codes = _grow(self._codes, capacity, self._size)
+
+    def _materialize(self) -> None:
+        """Copy a mapped (read-only) index into memory so it can be changed."""
+        if self._files is None:
+            return
+        files = self._files
+        self._ids, self._texts, self._metadatas = [], [], []
+        for row in range(files.count):
+            doc_id, text, metadata = files.record(row)
+            self._ids.append(doc_id)
+            self._texts.append(text)
+            self._metadatas.append(metadata)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._matrix = np.array(self._matrix)
+        if self._codes is not None:
+            self._codes = np.array(self._codes)
+        self._files = None
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            self._materialize()
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    # keep rows packed: move the last one into the hole
+                    self._matrix[row] = self._matrix[last]
+                    if self._codes is not None:
+                        self._codes[row] = self._codes[last]
+                    self._ids[row] = self._ids[last]
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size = last
+                self._dirty = True
+                self._filter_index = None
+
+    def query(self, embeddings, n_results: int, where: dict | None = None) -> list[list[dict]]:
+        queries = _normalize(embeddings)
+
+        with self._lock:
+            start = time.perf_counter()
+            # a filter picks the candidate rows up front, so only those are scored
+            candidates = self._select(where) if where is not None else None
+
+            available = self._size if candidates is None else len(candidates)
+            k = min(n_results, available)
+            if k < 1:
+                return [[] for _ in range(len(queries))]
+
+            shortlist = k * self.rescore_factor
+            if self._quantizer is None or shortlist >= available:
+                # cosine similarity of every query with every row, in one multiply
+                matrix = self._matrix[: self._size]
+                if candidates is not None:
+                    matrix = matrix[candidates]
+                top, top_scores = _top_k(queries @ matrix.T, k)
+            else:
+                # coarse pass over the codes, then exact rescoring of a shortlist
+                codes = self._codes[: self._size]
+                if candidates is not None:
+                    codes = codes[candidates]
+                short, _ = _top_k(self._quantizer.scores(queries, codes), shortlist)
+                picked = short if candidates is None else candidates[short]
+                exact = np.einsum("qd,qcd->qc", queries, self._matrix[picked])
+                best, top_scores = _top_k(exact, k)
+                top = np.take_along_axis(short, best, axis=1)
+
+            if candidates is not None:
+                top = candidates[top]
+            SEARCH_STAGE_SECONDS.observe(time.perf_counter() - start, "collection")
+
+            results = []
+            with SEARCH_STAGE_SECONDS.time("format"):
+                for rows, scores_row in zip(top.tolist(), top_scores.tolist()):
+                    hits = []
+                    for row, score in zip(rows, scores_row):
+                        doc_id, text, metadata = self._record(row)
+                        hits.append(
+                            {
+                                "id": doc_id,
+                                "text": text,
+                                # squared L2 between unit vectors, to match ChromaDB
+                                "distance": max(0.0, 2.0 - 2.0 * float(score)),
+                                "metadata": dict(metadata),
+                            }
+                        )
+                    results.append(hits)
+            return results
+
+    def _select(self, where: dict) -> np.ndarray:
+        """Return the rows matching a where clause, indexing the metadata if needed."""
+        if self._filter_index is None:
+            metadatas = self._metadatas if self._files is None else self._files.metadatas()
+            self._filter_index = MetadataIndex(metadatas[: self._size])
+        return self._filter_index.select(where)
+
+    def matching_ids(self, where: dict) -> list[str]:
+        with self._lock:
+            rows = self._select(where).tolist()
+            if self._files is not None:
+                return [self._files.id(row) for row in rows]
+            return [self._ids[row] for row in rows]
+
+    def _record(self, row: int) -> tuple[str, str, dict]:
+        """Return the id, text and metadata stored for a row."""
+        if self._files is not None:
+            return self._files.record(row)
+        return self._ids[row], self._texts[row], self._metadatas[row]
+
+    def _row(self, doc_id: str) -> int | None:
+        """Return the row holding an id, or None."""
+        if self._files is not None:
+            return self._files.row(doc_id)
+        return self._rows.get(doc_id)
+
+    def get(self, ids) -> list[dict]:
+        with self._lock:
+            found = []
+            for doc_id in ids:
+                row = self._row(doc_id)
+                if row is not None:
+                    _, text, metadata = self._record(row)
+                    found.append({"id": doc_id, "text": text, "metadata": dict(metadata)})
+            return found
+
+    def embeddings(self, ids) -> dict[str, np.ndarray]:
+        with self._lock:
+            rows = {doc_id: self._row(doc_id) for doc_id in ids}
+            return {
+                doc_id: np.array(self._matrix[row])
+                for doc_id, row in rows.items()
+                if row is not None
+            }
+
+    def documents(self) -> list[tuple[str, str, dict]]:
+        with self._lock:
+            return [self._record(row) for row in range(self._size)]
+
+    def count(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        """Return how many bytes the vectors take, and whether they're in memory."""
+        dim = self._matrix.shape[1]
+        return {
+            "quantization": self.quantization or "float32",
+            "vectors": self._size,
+            "vector_bytes": self._size * dim * 4,
+            "code_bytes": self._size * self._codes.shape[1] * self._codes.itemsize
+            if self._codes is not None
+            else 0,
+            "vectors_in_memory": not isinstance(self._matrix, np.memmap),
+        }
+
+    def flush(self) -> None:
+        """Write changes as a new version on disk, then serve from its memory maps."""
+        if self.persist_directory is None:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+            self._materialize()  # a reset() followed by nothing still needs writing
+            version = IndexFiles.write(
+                self.persist_directory,
+                ids=self._ids,
+                texts=self._texts,
+                metadatas=self._metadatas,
+                vectors=self._matrix[: self._size],
+                codes=self._codes[: self._size] if self._codes is not None else None,
+                quantizer=self._quantizer,
+            )
+            _replace_file(
+                self.persist_directory / self.CURRENT_FILENAME,
+                lambda f: f.write(version.encode("utf-8")),
+            )
+            self._dirty = False
+            self._open(version)
+            IndexFiles.prune(self.persist_directory, keep=self.KEEP_VERSIONS)
+
+    def refresh(self) -> bool:
+        """
+        Switch to the newest flushed version, if another process wrote one.
+
+        Skipped while this process holds unflushed changes.
+
+        Returns:
+            True if a different version is now being served
+        """
+        if self.persist_directory is None:
+            return False
+
+        with self._lock:
+            if self._dirty:
+                return False
+            path = self.persist_directory / self.CURRENT_FILENAME
+            try:
+                # flushes replace the file, so an unchanged stat means an unchanged pointer
+                stat = path.stat()
+                key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if key == self._current_stat:
+                    return False
+                current = path.read_text().strip()
+            except OSError:
+                return False
+            self._current_stat = key
+            if current == self.version:
+                return False
+            try:
+                self._open(current)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(
+                    f"Warning: Ignoring unreadable index {current} in {self.persist_directory}: {e}"
+                )
+                return False
+            return True
+
+    def _open(self, version: str) -> None:
+        """Serve a flushed version through read-only memory maps."""
+        files = IndexFiles(self.persist_directory / version)
+
+        quantizer = codes = None
+        if self.quantization is not None and files.count:
+            quantizer = make_quantizer(self.quantization, files.dim)
+            if files.quantization == self.quantization and files.codes is not None:
+                quantizer.load_state(files.quantizer_state)
+                codes = files.codes
+            else:
+                # saved with other (or no) codes: build ours in memory
+                for lo in range(0, files.count, BLOCK_ROWS):
+                    quantizer.refit(np.asarray(files.vectors[lo : lo + BLOCK_ROWS]))
+                codes = np.concatenate(
+                    [
+                        quantizer.encode(np.asarray(files.vectors[lo : lo + BLOCK_ROWS]))
+                        for lo in range(0, files.count, BLOCK_ROWS)
+                    ]
+                )
+
+        self.reset()
+        self._files = files
+        self._matrix = files.vectors
+        self._quantizer = quantizer
+        self._codes = codes
+        self._size = files.count
+        self._ids = self._texts = self._metadatas = None
+        self._rows = {}
+        self._dirty = False
+        self.version = version
+
+
+class IndexFiles:
+    """
+    One flushed version of a NumpyBackend index, opened read-only.
+
+    A version is a directory ``index-<n>`` holding:
+
+    - ``header.json``: row count, dimension and quantizer settings
+    - ``vectors.npy``: the float32 (rows, dim) matrix
+    - ``ids``, ``texts`` and ``metadata`` tables: each row's id, text and
+      metadata (as JSON), UTF-8 encoded back to back in ``<table>.bin``,
+      with int64 (rows + 1) byte offsets in ``<table>_offsets.npy``
+    - ``id_order.npy``: the rows sorted by id, so an id is found by binary
+      search instead of a map built from every record
+    - ``codes.npy``: the quantized codes, if any
+
+    Every array is opened with a read-only memory map, so nothing is read
+    until it's used and the pages are shared between processes. Looking up
+    ids or indexing the metadata for a filter never touches the texts.
+
+    Args:
+        directory: The version's directory
+    """
+
+    FORMAT = 2
+    PREFIX = "index-"
+    TABLES = ("ids", "texts", "metadata")
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / "header.json", "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("format") != self.FORMAT:
+            raise ValueError(f"unsupported index format {header.get('format')}")
+
+        self.count = header["count"]
+        self.dim = header["dim"]
+        self.quantization = header.get("quantization")
+        self.quantizer_state = header.get("quantizer") or {}
+
+        self.vectors = np.load(self.directory / "vectors.npy", mmap_mode="r")
+        self.ids, self.texts, self.metadata = (
+            _StringTable(self.directory, name) for name in self.TABLES
+        )
+        self.id_order = np.load(self.directory / "id_order.npy", mmap_mode="r")
+        codes_path = self.directory / "codes.npy"
+        self.codes = np.load(codes_path, mmap_mode="r") if codes_path.exists() else None
+
+        if self.vectors.shape != (self.count, self.dim) or len(self.id_order) != self.count:
+            raise ValueError(f"{self.directory} doesn't match its header")
+        if any(len(table) != self.count for table in (self.ids, self.texts, self.metadata)):
+            raise ValueError(f"{self.directory} doesn't match its header")
+        self._metadatas: list[dict] | None = None
+
+    def record(self, row: int) -> tuple[str, str, dict]:
+        """Decode one row's id, text and metadata."""
+        return (
+            self.id(row),
+            self.texts[row].decode("utf-8"),
+            json.loads(self.metadata[row]),
+        )
+
+    def id(self, row: int) -> str:
+        """Decode one row's id."""
+        return self.ids[row].decode("utf-8")
+
+    def row(self, doc_id: str) -> int | None:
+        """Return the row holding an id, or None, by binary search over id_order."""
+        key = doc_id.encode("utf-8")
+        i = bisect.bisect_left(self.id_order, key, key=lambda row: self.ids[row])
+        if i < self.count and self.ids[self.id_order[i]] == key:
+            return int(self.id_order[i])
+        return None
+
+    def metadatas(self) -> list[dict]:
+        """Return every row's metadata, decoded once and kept for filtering."""
+        if self._metadatas is None:
+            self._metadatas = [json.loads(self.metadata[row]) for row in range(self.count)]
+        return self._metadatas
+
+    @classmethod
+    def write(
+        cls,
+        parent: Path,
+        ids: list[str],
+        texts: list[str],
+        metadatas: list[dict],
+        vectors: np.ndarray,
+        codes: np.ndarray | None = None,
+        quantizer: Quantizer | None = None,
+    ) -> str:
+        """
+        Write a new version under parent, returning its directory name.
+
+        The version is complete on disk before its name is returned, so it
+        can be published by pointing CURRENT at it.
+        """
+        parent = Path(parent)
+        parent.mkdir(parents=True, exist_ok=True)
+        numbers = [int(p.name[len(cls.PREFIX) :]) for p in cls._versions(parent)]
+        name = f"{cls.PREFIX}{max(numbers, default=0) + 1:08d}"
+        tmp = parent / f".{name}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)  # left over from a crashed flush
+        tmp.mkdir()
+
+        encoded_ids = [doc_id.encode("utf-8") for doc_id in ids]
+        _StringTable.write(tmp, "ids", encoded_ids)
+        _StringTable.write(tmp, "texts", (text.encode("utf-8") for text in texts))
+        _StringTable.write(
+            tmp,
+            "metadata",
+            (json.dumps(metadata, ensure_ascii=False).encode("utf-8") for metadata in metadatas),
+        )
+        id_order = sorted(range(len(ids)), key=encoded_ids.__getitem__)
+        np.save(tmp / "id_order.npy", np.array(id_order, dtype=np.int64))
+        np.save(tmp / "vectors.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+        if codes is not None:
+            np.save(tmp / "codes.npy", np.ascontiguousarray(codes))
+
+        header = {
+            "format": cls.FORMAT,
+            "count": len(ids),
+            "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "quantization": quantizer.name if quantizer is not None else None,
+            "quantizer": quantizer.state() if quantizer is not None else None,
+        }
+        with open(tmp / "header.json", "w", encoding="utf-8") as f:
+            json.dump(header, f)
+
+        os.replace(tmp, parent / name)
+        return name
+
+    @classmethod
+    def prune(cls, parent: Path, keep: int) -> None:
+        """Delete all but the newest keep versions (processes still mapping them are unaffected)."""
+        for old in cls._versions(parent)[:-keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def _versions(cls, parent: Path) -> list[Path]:
+        """Return the version directories under parent, oldest first."""
+        return sorted(
+            p
+            for p in Path(parent).glob(f"{cls.PREFIX}*")
+            if p.is_dir() and p.name[len(cls.PREFIX) :].isdigit()
+        )
+
+
+class _StringTable:
+    """Byte strings back to back in ``<name>.bin``, with ``<name>_offsets.npy``, memory-mapped."""
+
+    def __init__(self, directory: Path, name: str):
+        self.offsets = np.load(directory / f"{name}_offsets.npy", mmap_mode="r")
+        self.data = (
+            np.memmap(directory / f"{name}.bin", dtype=np.uint8, mode="r")
+            if self.offsets[-1] > 0
+            else np.empty(0, dtype=np.uint8)
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> bytes:
+        return self.data[self.offsets[row] : self.offsets[row + 1]].tobytes()
+
+    @staticmethod
+    def write(directory: Path, name: str, items) -> None:
+        """Write the byte strings items as table name in directory."""
+        offsets = [0]
+        with open(directory / f"{name}.bin", "wb") as f:
+            for data in items:
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        np.save(directory / f"{name}_offsets.npy", np.array(offsets, dtype=np.int64))
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the column indices and values of each row's k highest scores, best first."""
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _grow(array: np.ndarray, capacity: int, used: int) -> np.ndarray:
+    """Return an in-memory copy of array with room for capacity rows."""
+    grown = np.empty((capacity, array.shape[1]), dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+def _grow_on_disk(array: np.ndarray, capacity: int, used: int) -> np.memmap:
+    """Like _grow, but into a memory map over an unlinked temporary file."""
+    with tempfile.TemporaryFile() as f:
+        # the map keeps the file alive after it's closed
+        grown = np.memmap(f, dtype=array.dtype, mode="w+", shape=(capacity, array.shape[1]))
+    grown[:used] = array[:used]
+    return grown
+
+
+def _normalize(embeddings) -> np.ndarray:
+    """Return embeddings as a 2D float32 array of unit-length rows."""
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _replace_file(path: Path, write) -> None:
+    """Write a file via a temporary sibling and an atomic rename."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
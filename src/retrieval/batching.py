@@ -0,0 +1,192 @@
+"""
+Dynamic micro-batching of concurrent search requests.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from retrieval.metrics import current_request_times, request_times
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """
+    Collects search requests that arrive close together and runs them as
+    one batch.
+
+    The first request to arrive opens a batch; it is closed once it holds
+    ``max_batch_size`` queries or ``max_wait_ms`` has passed. The whole
+    batch is then answered with one ``search_many`` call (one encode, one
+    multi-query lookup) on a worker thread, so the event loop is never
+    blocked. Requests that arrive while a batch is running queue up for the
+    next one, so batches grow with load.
+
+    Requests asking for different numbers of results share a batch: it
+    fetches the largest n_results and each caller gets its own prefix.
+    Requests with different search options (e.g. mode) also share a batch,
+    which makes one search_many call per distinct set of options.
+
+    A request collecting stage times (see metrics.request_times) gets its
+    batch's, plus a "wait" stage: how long it queued before its batch ran.
+
+    Args:
+        search_many: Function taking (queries, n_results, **options) and
+            returning one result list per query
+        max_batch_size: Most queries answered by one call
+        max_wait_ms: Longest a request waits for others to join its batch
+    """
+
+    def __init__(
+        self,
+        search_many: Callable[[list[str], int], list[list[dict]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+
+        self.search_many = search_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.queries = 0
+
+        self._queue: asyncio.Queue | None = None
+        self._arrived: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+        self._current: list[tuple] = []  # the batch being formed or run
+
+    async def start(self) -> None:
+        """Start the background task that forms and runs batches."""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task, failing any requests still waiting."""
+        if self._worker is None:
+            return
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        waiting = self._current
+        self._current = []
+        while not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for *_request, future in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError("Query batcher stopped"))
+
+    async def search(self, query: str, n_results: int = 5, **options) -> list[dict]:
+        """
+        Queue a query for the next batch and wait for its results.
+
+        Args:
+            query: Search query text
+            n_results: Number of results to return
+            **options: Passed through to search_many (e.g. mode)
+        """
+        if self._worker is None:
+            raise RuntimeError("Query batcher not started")
+
+        future = asyncio.get_running_loop().create_future()
+        # the batch runs in another context, so its stage times are handed back
+        timing = (current_request_times(), time.perf_counter())
+        self._queue.put_nowait((query, n_results, options, timing, future))
+        self._arrived.set()
+        return await future
+
+    async def _run(self) -> None:
+        """Form batches from the queue and run them, one at a time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            self._current = batch
+
+            while len(batch) < self.max_batch_size:
+                # clear before looking, so an arrival in between still wakes us
+                self._arrived.clear()
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._dispatch(batch)
+            self._current = []
+
+    async def _dispatch(self, batch: list[tuple]) -> None:
+        """Run one batch and hand each caller its results."""
+        # callers that gave up (e.g. disconnected) don't need answering
+        batch = [item for item in batch if not item[-1].done()]
+        if not batch:
+            return
+
+        self.batches += 1
+        self.queries += len(batch)
+
+        groups: dict[str, list[tuple]] = {}
+        for item in batch:
+            groups.setdefault(json.dumps(item[2], sort_keys=True), []).append(item)
+
+        for group in groups.values():
+            queries = [query for query, _n, _options, _timing, _future in group]
+            n_results = max(n for _query, n, _options, _timing, _future in group)
+            started = time.perf_counter()
+            try:
+                with request_times() as times:
+                    results = await run_in_threadpool(
+                        self.search_many, queries, n_results, **group[0][2]
+                    )
+            except Exception as e:
+                for *_request, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_query, n, _options, (caller_times, queued), future), hits in zip(group, results):
+                if caller_times is not None:
+                    caller_times["wait"] = started - queued
+                    caller_times.update(times)
+                if not future.done():
+                    future.set_result(hits[:n])
+
+    def stats(self) -> dict:
+        """Return how many batches and queries have been run."""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,373 @@
+"""
+Caches that let us skip repeated embedding work.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so one process should write the cache at a time
+    fcntl = None
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, disk-backed cache of document embeddings.
+
+    Entries are keyed by a 16-byte BLAKE2b digest of the model name and the
+    text, so the same chunk is only ever encoded once per model no matter
+    which file (or which run) it comes from. Per model, three files live in
+    the cache directory:
+
+    - ``<model>.keys``: the digests, 16 bytes each, in row order
+    - ``<model>.f32``: the vectors as a raw float32 matrix, read via memmap
+    - ``<model>.json``: the embedding dimension
+    - ``<model>.lock``: held while the files are trimmed or appended to
+
+    Both data files are append-only. On open, a torn append from a crash is
+    trimmed so keys and rows always line up. The cache is safe to share
+    between threads and between processes (e.g. several workers): under
+    the lock, an append first reads the rows other processes have added,
+    so its rows go after theirs.
+
+    Args:
+        directory: Directory to keep the cache files in
+        model_name: Name of the model whose embeddings are cached
+    """
+
+    KEY_BYTES = 16
+
+    def __init__(self, directory: str | Path, model_name: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self._keys_path = self.directory / f"{slug}.keys"
+        self._vectors_path = self.directory / f"{slug}.f32"
+        self._meta_path = self.directory / f"{slug}.json"
+        self._lock_path = self.directory / f"{slug}.lock"
+
+        self.dim: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self._rows: dict[bytes, int] = {}
+        self._matrix: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+        self._open()
+
+    def _open(self) -> None:
+        """Load the key index and map the vectors, trimming any torn append."""
+        with self._file_lock():
+            if not self._read_meta():
+                return
+
+            keys = self._keys_path.read_bytes() if self._keys_path.exists() else b""
+            row_bytes = self.dim * 4
+            vector_bytes = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+            count = min(len(keys) // self.KEY_BYTES, vector_bytes // row_bytes)
+
+            if len(keys) != count * self.KEY_BYTES or vector_bytes != count * row_bytes:
+                logger.warning(
+                    f"Warning: Trimming embedding cache {self._vectors_path} to {count} rows"
+                )
+                with open(self._keys_path, "ab") as f:
+                    f.truncate(count * self.KEY_BYTES)
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(count * row_bytes)
+
+            self._add_keys(keys[: count * self.KEY_BYTES])
+        self._remap()
+
+    def _read_meta(self) -> bool:
+        """Read the embedding dimension, if any embeddings were cached yet."""
+        if self.dim is None and self._meta_path.exists():
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self.dim = int(json.load(f)["dim"])
+        return self.dim is not None
+
+    def _add_keys(self, keys: bytes) -> None:
+        """Index keys read from the keys file, which continue after the known rows."""
+        start = len(self._rows)
+        for i in range(len(keys) // self.KEY_BYTES):
+            self._rows[keys[i * self.KEY_BYTES : (i + 1) * self.KEY_BYTES]] = start + i
+
+    def _refresh(self) -> bool:
+        """
+        Pick up rows appended by other processes since the keys were read.
+
+        Keys are appended after their vectors, so every key on disk has its
+        row.
+
+        Returns:
+            True if rows were added
+        """
+        if not self._read_meta():
+            return False
+        known = len(self._rows) * self.KEY_BYTES
+        try:
+            if self._keys_path.stat().st_size <= known:
+                return False
+        except FileNotFoundError:
+            return False
+        with open(self._keys_path, "rb") as f:
+            f.seek(known)
+            keys = f.read()
+        self._add_keys(keys[: len(keys) - len(keys) % self.KEY_BYTES])
+        return True
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold the cache's lock file, so one process at a time trims or appends."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _remap(self) -> None:
+        """Re-open the read-only memmap so it covers every row on disk."""
+        count = len(self._rows)
+        if count == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim)
+        )
+
+    def key(self, text: str) -> bytes:
+        """Return the cache key for a text under this cache's model."""
+        data = f"{self.model_name}\0{text}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=self.KEY_BYTES).digest()
+
+    def get_many(self, texts: list[str]) -> tuple[np.ndarray | None, list[int]]:
+        """
+        Look up embeddings for a list of texts.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            (embeddings, missing): a (len(texts), dim) float32 array with the
+            cached rows filled in (None if nothing has been cached yet), and
+            the indices of the texts that still need encoding
+        """
+        with self._lock:
+            if self._refresh():
+                self._remap()
+            if self._matrix is None:
+                self.misses += len(texts)
+                return None, list(range(len(texts)))
+
+            found, rows, missing = [], [], []
+            for i, text in enumerate(texts):
+                row = self._rows.get(self.key(text))
+                if row is None:
+                    missing.append(i)
+                else:
+                    found.append(i)
+                    rows.append(row)
+
+            embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+            if rows:
+                embeddings[found] = self._matrix[rows]
+
+            self.hits += len(found)
+            self.misses += len(missing)
+            return embeddings, missing
+
+    def put_many(self, texts: list[str], embeddings: np.ndarray) -> None:
+        """
+        Add embeddings for texts that aren't cached yet.
+
+        Args:
+            texts: Texts that were encoded
+            embeddings: Their embeddings, one row per text
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not texts:
+            return
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(
+                    f"Expected {self.dim}-dimensional embeddings, got {embeddings.shape[1]}"
+                )
+
+            new_keys, new_rows = {}, []
+            for text, vector in zip(texts, embeddings):
+                key = self.key(text)
+                if key not in self._rows and key not in new_keys:
+                    new_keys[key] = len(self._rows) + len(new_keys)
+                    new_rows.append(vector)
+
+            if new_keys:
+                # vectors first: a crash between the two writes leaves extra
+                # rows, which the next append (or _open) trims, rather than keys
+                # pointing past the end
+                count = len(self._rows)
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(count * self.dim * 4)
+                    f.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.truncate(count * self.KEY_BYTES)
+                    f.write(b"".join(new_keys))
+                self._rows.update(new_keys)
+            self._remap()
+
+    def stats(self) -> dict:
+        """Return hit/miss counts and the hit rate since this cache was opened."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups: collapse whitespace and casefold."""
+    return " ".join(query.split()).casefold()
+
+
+class QueryCache:
+    """
+    Bounded in-process LRU cache with an optional time-to-live.
+
+    Used for query embeddings, where a few popular questions make up most
+    of the traffic. Keys are normalized with normalize_query(), so
+    "VPN setup" and " vpn  SETUP" share an entry.
+
+    Args:
+        maxsize: Most entries kept; the least recently used is evicted
+        ttl: Seconds an entry stays valid, or None to keep it until evicted
+        clock: Time source (seconds), swappable for tests
+        sizeof: Function estimating a value's size in bytes, used to report
+            memory usage (defaults to approx_sizeof)
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sizeof: Callable[[object], int] | None = None,
+    ):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be > 0")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.sizeof = sizeof or approx_sizeof
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[Hashable, tuple[float, object, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        """Return the value for a normalized key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and self.clock() - entry[0] > self.ttl:
+                self._pop(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value) -> None:
+        """Store a value under a normalized key, evicting the LRU entry if full."""
+        nbytes = self.sizeof(value)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (self.clock(), value, nbytes)
+            self.nbytes += nbytes
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: Hashable) -> None:
+        """Remove an entry (if present), keeping the byte count in step."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        """Return size, estimated memory, hit/miss counts and hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def approx_sizeof(value) -> int:
+    """
+    Roughly estimate the memory held by a value, following lists, tuples
+    and dicts (e.g. a list of search result dicts). Arrays count their data.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes + sys.getsizeof(value)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_sizeof(k) + approx_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_sizeof(item) for item in value)
+    return size
@@ -0,0 +1,265 @@
+"""
+Duplicate detection for chunks: exact copies by content hash, and near
+copies by MinHash signatures bucketed with locality-sensitive hashing.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import zlib
+
+import numpy as np
+
+_SHIFT = np.uint64(32)
+
+
+def content_hash(text: str) -> str:
+    """Hash a chunk's text, ignoring differences in whitespace."""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class MinHasher:
+    """
+    MinHash signatures of texts' word shingles.
+
+    A text becomes the set of its overlapping ``shingle_words``-word
+    sequences (lowercased, split on whitespace). Each of ``num_perm``
+    random hash functions keeps the smallest hash over that set, and the
+    fraction of positions two signatures agree on estimates the Jaccard
+    similarity of their shingle sets. The hash functions are
+    multiply-shift hashes, ``(a * x + b) >> 32`` in wrapping 64-bit
+    arithmetic, so a signature is one vectorized multiply-add and a min.
+
+    Args:
+        num_perm: Hash functions per signature
+        shingle_words: Words per shingle
+        seed: Seed for the hash functions, so signatures are reproducible
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_words: int = 5, seed: int = 0):
+        if num_perm < 1 or shingle_words < 1:
+            raise ValueError("num_perm and shingle_words must be >= 1")
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**63, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Return the shingle hashes of a text, one per position (a repeated
+        shingle repeats its hash, which doesn't change any minimum).
+        """
+        words = text.lower().split()
+        if not words:
+            return np.zeros(0, dtype=np.uint64)
+        hashes = np.array([zlib.crc32(word.encode("utf-8")) for word in words], dtype=np.uint64)
+        width = min(self.shingle_words, len(hashes))
+        count = len(hashes) - width + 1
+        shingles = hashes[:count].copy()
+        for offset in range(1, width):
+            shingles = shingles * np.uint64(1000003) ^ hashes[offset : offset + count]
+        return shingles
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """Return a text's signature, or None if it has no words to compare."""
+        shingles = self.shingles(text)
+        if len(shingles) == 0:
+            return None
+        return ((self._a * shingles + self._b) >> _SHIFT).min(axis=1).astype(np.uint32)
+
+
+class DuplicateIndex:
+    """
+    Registry of the distinct chunks in an index, for spotting copies.
+
+    Every registered chunk is indexed by its content hash, which finds
+    exact copies, and by its MinHash signature cut into ``bands`` bands:
+    chunks sharing any band are candidates, and a candidate counts as a
+    near copy when its estimated Jaccard similarity reaches
+    ``threshold``. Banding keeps a lookup to a few dictionary probes
+    instead of a comparison with every chunk; with the defaults, chunks
+    at 0.9 similarity collide in some band with probability above 0.999
+    and ones at 0.5 rarely do.
+
+    Only distinct chunks are registered; copies point at them.
+
+    Args:
+        threshold: Estimated Jaccard similarity from which a chunk is a
+            near copy, or None to detect exact copies only
+        num_perm: MinHash hash functions per signature
+        bands: LSH bands the signature is cut into (must divide num_perm)
+        shingle_words: Words per shingle
+    """
+
+    def __init__(
+        self,
+        threshold: float | None = 0.9,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_words: int = 5,
+    ):
+        if threshold is not None and not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle_words) if threshold is not None else None
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget every chunk."""
+        with self._lock:
+            self._by_hash: dict[str, str] = {}  # content hash -> chunk id
+            self._hashes: dict[str, str] = {}  # chunk id -> content hash
+            self._signatures: dict[str, np.ndarray] = {}  # chunk id -> MinHash signature
+            self._buckets: list[dict[bytes, set[str]]] = [{} for _ in range(self.bands)]
+
+    def find(self, text: str, exclude: str | None = None) -> tuple[str, float] | None:
+        """
+        Look for a registered copy of a text.
+
+        Args:
+            text: Chunk text
+            exclude: Chunk id to ignore, e.g. the chunk's own
+
+        Returns:
+            (id of the copy, estimated similarity), 1.0 for an exact copy,
+            or None
+        """
+        digest = content_hash(text)
+        with self._lock:
+            exact = self._by_hash.get(digest)
+        if exact is not None and exact != exclude:
+            return exact, 1.0
+        signature = self._signature(text)
+        with self._lock:
+            return self._find(digest, signature, exclude)
+
+    def observe(self, doc_id: str, text: str) -> tuple[str, float] | None:
+        """
+        Register a chunk unless it copies one already registered.
+
+        A chunk registered earlier under the same id is replaced, so a
+        changed chunk is never taken for a copy of its old self.
+
+        Returns:
+            (id of the copy, estimated similarity) if the chunk is a
+            duplicate, else None
+        """
+        digest = content_hash(text)
+        with self._lock:
+            self._remove(doc_id)
+            exact = self._by_hash.get(digest)
+            if exact is not None:
+                return exact, 1.0  # no need for a signature
+        signature = self._signature(text)
+        with self._lock:
+            match = self._find(digest, signature, doc_id)
+            if match is None:
+                self._insert(doc_id, digest, signature)
+            return match
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Register a chunk as distinct, without looking for copies."""
+        digest, signature = content_hash(text), self._signature(text)
+        with self._lock:
+            self._remove(doc_id)
+            self._insert(doc_id, digest, signature)
+
+    def remove(self, ids: list[str]) -> None:
+        """Forget chunks; unknown ids are ignored."""
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _signature(self, text: str) -> np.ndarray | None:
+        return self.hasher.signature(text) if self.hasher is not None else None
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+
+    def _find(
+        self, digest: str, signature: np.ndarray | None, exclude: str | None
+    ) -> tuple[str, float] | None:
+        exact = self._by_hash.get(digest)
+        if exact is not None and exact != exclude:
+            return exact, 1.0
+        if signature is None:
+            return None
+
+        candidates: set[str] = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        candidates.discard(exclude)
+        best = None
+        for doc_id in sorted(candidates):
+            similarity = float(np.mean(self._signatures[doc_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = doc_id, similarity
+        return best
+
+    def _insert(self, doc_id: str, digest: str, signature: np.ndarray | None) -> None:
+        self._hashes[doc_id] = digest
+        self._by_hash.setdefault(digest, doc_id)
+        if signature is not None:
+            self._signatures[doc_id] = signature
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                bucket.setdefault(key, set()).add(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        digest = self._hashes.pop(doc_id, None)
+        if digest is None:
+            return
+        if self._by_hash.get(digest) == doc_id:
+            del self._by_hash[digest]
+        signature = self._signatures.pop(doc_id, None)
+        if signature is not None:
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                ids = bucket.get(key)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del bucket[key]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._hashes
+
+
+def collapse_duplicates(hits: list[dict], n_results: int) -> list[dict]:
+    """
+    Keep the best-ranked hit of each group of copies.
+
+    Hits whose metadata has the same 'duplicate_of' (or whose id another
+    hit's 'duplicate_of' names) are copies of one chunk. The first of
+    them stays, listing the ids of the others under 'duplicates'.
+
+    Args:
+        hits: Result dicts, best first
+        n_results: Most hits to keep
+
+    Returns:
+        At most n_results hits, best first
+    """
+    kept: dict[str, dict] = {}
+    for hit in hits:
+        group = (hit["metadata"] or {}).get("duplicate_of") or hit["id"]
+        first = kept.get(group)
+        if first is None:
+            if len(kept) < n_results:
+                kept[group] = {**hit, "duplicates": []}
+        else:
+            first["duplicates"].append(hit["id"])
+    return list(kept.values())
@@ -10,10 +10,128 @@ Seattle University, ARIN 5360
 
 from __future__ import annotations
 
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import List, Union
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from retrieval.cache import EmbeddingCache, QueryCache, normalize_query
+from retrieval.metrics import MODEL_LOAD_SECONDS
+
+# how the model runs: "torch" in fp32 with PyTorch, "int8" with PyTorch after
+# quantizing its linear layers to int8 (dynamic quantization), "onnx" with
+# ONNX Runtime, and "onnx-int8" with ONNX Runtime on an int8-quantized export
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+# the model repo's dynamically int8-quantized ONNX export (AVX2 runs on any recent x86 CPU)
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def length_buckets(lengths: List[int], batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+    """
+    Group texts into model batches of similar length.
+
+    A batch is padded to its longest text, so texts are sorted by length,
+    longest first, and cut into runs. A run ends at ``batch_size`` texts
+    or when padding it to its longest text would exceed
+    ``max_batch_tokens``, so short texts go in large batches and long ones
+    in small batches. A single text longer than the budget gets a batch
+    of its own.
+
+    Args:
+        lengths: Token count of each text
+        batch_size: Most texts per batch
+        max_batch_tokens: Most token slots per batch, padding included
+
+    Returns:
+        Batches of indices into lengths, longest texts first
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        # sorted longest first, so the batch's first text sets its padded length
+        if batch and (
+            len(batch) == batch_size or (len(batch) + 1) * lengths[batch[0]] > max_batch_tokens
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class EncodeStats:
+    """Running totals of the model's work, for texts/s and tokens/s."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.texts = 0
+        self.tokens = 0
+        self.padded_tokens = 0  # token slots computed, padding included
+        self.batches = 0
+        self.seconds = 0.0
+
+    def record(
+        self, texts: int, tokens: int, padded_tokens: int, seconds: float, batches: int = 1
+    ) -> None:
+        """Add one model batch (or several, e.g. a pool worker's)."""
+        with self._lock:
+            self.texts += texts
+            self.tokens += tokens
+            self.padded_tokens += padded_tokens
+            self.batches += batches
+            self.seconds += seconds
+
+    def stats(self) -> dict:
+        """
+        Return totals and throughput since the embedder was created.
+
+        Returns:
+            Dict with 'texts', 'tokens', 'batches', 'seconds' (in the
+            model), 'texts_per_second', 'tokens_per_second' and 'padding'
+            (the fraction of computed token slots that were padding)
+        """
+        with self._lock:
+            seconds = self.seconds
+            return {
+                "texts": self.texts,
+                "tokens": self.tokens,
+                "batches": self.batches,
+                "seconds": round(seconds, 3),
+                "texts_per_second": self.texts / seconds if seconds else 0.0,
+                "tokens_per_second": self.tokens / seconds if seconds else 0.0,
+                "padding": 1 - self.tokens / self.padded_tokens if self.padded_tokens else 0.0,
+            }
+
+
+def _load_model(model_name: str, backend: str):
+    """Load a SentenceTransformer to run on one of EMBEDDING_BACKENDS."""
+    # imported here: it pulls in torch, which takes seconds
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    if backend == "int8":
+        import torch
+
+        model = SentenceTransformer(model_name, device="cpu")  # int8 kernels are CPU-only
+        torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        return model
+
+    # needs Optimum and ONNX Runtime (uv sync --extra onnx);
+    # a model without an ONNX export is exported from its PyTorch weights
+    model_kwargs = {"file_name": ONNX_INT8_FILE} if backend == "onnx-int8" else None
+    return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
 
 
 class DocumentEmbedder:
@@ -24,22 +142,83 @@ class DocumentEmbedder:
     Args:
         model_name (str): Hugging Face model name for embeddings.
             Defaults to "all-MiniLM-L6-v2".
+        cache_dir (str | None): Directory for a disk-backed cache of
+            document embeddings. If None, nothing is cached.
+        query_cache_size (int): Most query embeddings kept in memory
+            (0 disables the query cache)
+        query_cache_ttl (float | None): Seconds a cached query embedding
+            stays valid, or None for no expiry
+        backend (str): How the model runs, one of EMBEDDING_BACKENDS;
+            "torch" (fp32) by default. The others are faster on CPU and
+            agree closely with it; see agreement().
+        batch_size (int): Most texts per model batch
+        max_batch_tokens (int): Most token slots per model batch, padding
+            included; texts are bucketed by length (see length_buckets)
 
     Attributes:
         model (SentenceTransformer): Loaded embedding model
+        cache (EmbeddingCache | None): Cache consulted by embed_documents
+        query_cache (QueryCache | None): Cache consulted by embed_query
+        encode_stats (EncodeStats): Texts, tokens and time spent encoding
     """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_dir: str | None = None,
+        query_cache_size: int = 1024,
+        query_cache_ttl: float | None = None,
+        backend: str = "torch",
+        batch_size: int = 32,
+        max_batch_tokens: int = 8192,
+    ) -> None:
         """Initialize the embedding model."""
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(
+                f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}"
+            )
+        if batch_size < 1 or max_batch_tokens < 1:
+            raise ValueError("batch_size and max_batch_tokens must be >= 1")
+
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.backend = backend
+        start = time.perf_counter()
+        self.model = _load_model(model_name, backend)
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, model_name, backend)
+        # another backend's embeddings differ slightly, so they're cached apart
+        cache_name = model_name if backend == "torch" else f"{model_name}-{backend}"
+        self.cache = EmbeddingCache(cache_dir, cache_name) if cache_dir is not None else None
+        self.query_cache = (
+            QueryCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+            if query_cache_size > 0
+            else None
+        )
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.encode_stats = EncodeStats()
+
+    @property
+    def tokenizer(self):
+        """The model's tokenizer."""
+        return self.model.tokenizer
+
+    @property
+    def max_tokens(self) -> int:
+        """Most tokens of a text the model reads; anything past them is cut off."""
+        special = len(self.tokenizer("")["input_ids"])  # e.g. [CLS] and [SEP]
+        return self.model.max_seq_length - special
 
-    def embed_documents(self, texts: List[str]) -> np.ndarray:
+    def embed_documents(self, texts: List[str], pool: EmbeddingPool | None = None) -> np.ndarray:
         """
         Generate embeddings for a list of documents.
 
+        With a cache, only texts that haven't been embedded before are
+        encoded (each distinct text once), and their embeddings are stored.
+
         Args:
             texts (list[str]): List of document strings
+            pool (EmbeddingPool | None): Pool of model replicas to encode
+                on, for bulk indexing; None encodes in this process
 
         Returns:
             np.ndarray: 2D array of shape (num_docs, embedding_dim)
@@ -47,12 +226,115 @@ class DocumentEmbedder:
         if not texts:
             return np.array([])
 
-        return np.array(self.model.encode(texts, show_progress_bar=False))
+        encode = self._encode if pool is None else partial(pool.encode, stats=self.encode_stats)
+        if self.cache is None:
+            return encode(texts)
+
+        embeddings, missing = self.cache.get_many(texts)
+        if not missing:
+            return embeddings
+
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        encoded = encode(unique)
+        self.cache.put_many(unique, encoded)
+
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+        row = {text: i for i, text in enumerate(unique)}
+        embeddings[missing] = encoded[[row[texts[i]] for i in missing]]
+        return embeddings
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Run the model on a list of texts, in length-bucketed batches.
+
+        Each bucket is one call to the model's public encode(), with the
+        bucket as its only batch, so it is padded to its own longest text
+        and the default prompt is applied as usual.
+        """
+        lengths = self._token_lengths(texts)
+
+        embeddings = None
+        for batch in length_buckets(lengths, self.batch_size, self.max_batch_tokens):
+            start = time.perf_counter()
+            encoded = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            self.encode_stats.record(
+                texts=len(batch),
+                tokens=sum(lengths[i] for i in batch),
+                padded_tokens=len(batch) * lengths[batch[0]],
+                seconds=time.perf_counter() - start,
+            )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+            embeddings[batch] = encoded  # back in input order
+        return embeddings
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Tokens the model reads of each text: special tokens and default prompt included."""
+        model = self.model
+        prompt = model.prompts.get(model.default_prompt_name) if model.default_prompt_name else ""
+        prompt_tokens = (
+            len(self.tokenizer(prompt, add_special_tokens=False)["input_ids"]) if prompt else 0
+        )
+        ids = self.tokenizer(
+            texts, truncation=True, max_length=model.max_seq_length, verbose=False
+        )["input_ids"]
+        return [min(len(row) + prompt_tokens, model.max_seq_length) for row in ids]
+
+    def pool(self, workers: int | None = None) -> EmbeddingPool:
+        """Return a pool of replicas of this embedder's model, for embed_documents."""
+        return EmbeddingPool(
+            workers,
+            model_name=self.model_name,
+            backend=self.backend,
+            batch_size=self.batch_size,
+            max_batch_tokens=self.max_batch_tokens,
+        )
+
+    def agreement(self, texts: List[str], reference: DocumentEmbedder | None = None) -> dict:
+        """
+        Check how closely this embedder's backend reproduces the fp32 model.
+
+        Args:
+            texts (list[str]): Sample of texts, e.g. chunks of the corpus
+            reference (DocumentEmbedder | None): Embedder to compare with;
+                by default the same model on the "torch" backend, loaded
+                for the check
+
+        Returns:
+            dict: 'backend', 'samples', and the 'mean_cosine' and
+            'min_cosine' similarity between each text's two embeddings
+        """
+        if not texts:
+            raise ValueError("Need at least one text to compare")
+        if reference is None:
+            reference = DocumentEmbedder(self.model_name, query_cache_size=0)
+
+        ours, theirs = self._encode(texts), reference._encode(texts)
+        cosines = np.sum(ours * theirs, axis=1) / (
+            np.linalg.norm(ours, axis=1) * np.linalg.norm(theirs, axis=1)
+        )
+        return {
+            "backend": self.backend,
+            "samples": len(texts),
+            "mean_cosine": float(cosines.mean()),
+            "min_cosine": float(cosines.min()),
+        }
 
     def embed_query(self, queries: Union[str, List[str]]) -> np.ndarray:
         """
         Generate embedding(s) for query text.
 
+        Queries are looked up in the query cache first, keyed by their
+        normalized form (whitespace collapsed, casefolded); only misses are
+        encoded, in one call. The query text itself is encoded, so the
+        vectors are the same with or without the cache.
+
         Args:
             queries (str | list[str]): A single query string or list of queries
 
@@ -61,8 +343,135 @@ class DocumentEmbedder:
                 - 1D vector if single string input
                 - 2D array if list input
         """
+        # queries skip the document cache; they'd fill it with one-offs
         if isinstance(queries, str):
-            embedding = self.embed_documents([queries])
+            embedding = self.embed_query([queries])
             return embedding[0]
 
-        return self.embed_documents(queries)
+        if not queries:
+            return np.array([])
+
+        if self.query_cache is None:
+            return self._encode(queries)
+
+        keys = [normalize_query(query) for query in queries]
+        cached = [self.query_cache.get(key) for key in keys]
+        # the first query text seen for each missing key
+        missing = {}
+        for query, key, vector in zip(queries, keys, cached):
+            if vector is None:
+                missing.setdefault(key, query)
+
+        if missing:
+            encoded = dict(zip(missing, self._encode(list(missing.values()))))
+            for key, vector in encoded.items():
+                self.query_cache.put(key, vector)
+            cached = [
+                encoded[key] if vector is None else vector for key, vector in zip(keys, cached)
+            ]
+
+        return np.stack(cached)
+
+
+# the embedder of a pool worker process, loaded by _start_worker
+_worker_embedder: DocumentEmbedder | None = None
+
+
+def _start_worker(options: dict, threads: int) -> None:
+    """Load a pool worker's model replica (runs once in each worker process)."""
+    global _worker_embedder
+    import torch
+
+    torch.set_num_threads(threads)
+    _worker_embedder = DocumentEmbedder(query_cache_size=0, **options)
+
+
+def _encode_in_worker(texts: List[str]) -> tuple[np.ndarray, tuple]:
+    """Encode texts in a pool worker; returns the vectors and the work done."""
+    stats = _worker_embedder.encode_stats = EncodeStats()
+    embeddings = _worker_embedder._encode(texts)
+    return embeddings, (
+        stats.texts,
+        stats.tokens,
+        stats.padded_tokens,
+        stats.seconds,
+        stats.batches,
+    )
+
+
+class EmbeddingPool:
+    """
+    Encodes texts on several processes, each with its own replica of the
+    model, for bulk indexing.
+
+    A call's texts are split into one contiguous share per worker (at
+    least MIN_TEXTS_PER_TASK each), encoded in parallel and reassembled in
+    order. Each worker runs torch on its share of the CPUs: a small model
+    like MiniLM scales poorly across threads but well across processes.
+    The processes are started, and their models loaded, on the first
+    encode; close() stops them.
+
+    Args:
+        workers: Processes to encode with (None for one per CPU)
+        **options: DocumentEmbedder arguments for the replicas, e.g.
+            model_name and backend
+    """
+
+    MIN_TEXTS_PER_TASK = 8
+
+    def __init__(self, workers: int | None = None, **options):
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.options = options
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def encode(self, texts: List[str], stats: EncodeStats | None = None) -> np.ndarray:
+        """
+        Encode texts on the workers.
+
+        Args:
+            texts: Texts to encode
+            stats: Totals to add the workers' work to
+
+        Returns:
+            2D array with a row per text, in input order
+        """
+        executor = self._start()
+        share = max(self.MIN_TEXTS_PER_TASK, math.ceil(len(texts) / self.workers))
+        futures = [
+            executor.submit(_encode_in_worker, texts[start : start + share])
+            for start in range(0, len(texts), share)
+        ]
+        results = [future.result() for future in futures]
+        if stats is not None:
+            for _, work in results:
+                stats.record(*work)
+        return np.concatenate([embeddings for embeddings, _ in results])
+
+    def _start(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                # spawn, not fork: the parent may hold model threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_start_worker,
+                    initargs=(self.options, threads),
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """Stop the worker processes; a later encode starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> EmbeddingPool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
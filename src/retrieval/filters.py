@@ -0,0 +1,198 @@
+"""
+Metadata filters: building ChromaDB-style "where" clauses and evaluating
+them against an index of row sets instead of scanning every row.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+from functools import reduce
+
+import numpy as np
+
+_COMPARISONS = ("$gt", "$gte", "$lt", "$lte")
+
+
+def where_clause(
+    type: str | list[str] | None = None,
+    filename: str | list[str] | None = None,
+    doc_id: str | list[str] | None = None,
+    min_pages: int | None = None,
+    max_pages: int | None = None,
+) -> dict | None:
+    """
+    Build a "where" clause from the metadata DocumentLoader records.
+
+    Args:
+        type: File type(s) to keep, e.g. "pdf"
+        filename: File name(s) to keep
+        doc_id: Document id(s) (file stems) to keep
+        min_pages: Keep documents with at least this many pages
+        max_pages: Keep documents with at most this many pages; like
+            min_pages, this only matches PDFs
+
+    Returns:
+        The clause, or None when nothing is filtered
+    """
+    clauses = []
+    for field, value in (("type", type), ("filename", filename), ("doc_id", doc_id)):
+        if isinstance(value, list):
+            clauses.append({field: {"$in": value}})
+        elif value is not None:
+            clauses.append({field: value})
+    if min_pages is not None:
+        clauses.append({"num_pages": {"$gte": min_pages}})
+    if max_pages is not None:
+        clauses.append({"num_pages": {"$lte": max_pages}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class MetadataIndex:
+    """
+    Per-field index of which rows hold which metadata values.
+
+    For every field, each distinct value maps to the sorted array of rows
+    holding it (an ID set), and numeric values are also kept sorted so
+    range conditions are a binary search. A where clause is answered by
+    combining those sets, so a selective filter costs time in proportion
+    to the rows it keeps rather than to the whole index.
+
+    Supports the ChromaDB operators $eq, $ne, $in, $nin, $gt, $gte, $lt,
+    $lte, $and and $or.
+
+    Args:
+        metadatas: One metadata dict (or None) per row
+    """
+
+    def __init__(self, metadatas: list[dict | None]):
+        self.size = len(metadatas)
+        columns: dict[str, tuple[list, list[int]]] = {}  # field -> (values, rows holding them)
+        for row, metadata in enumerate(metadatas):
+            for field, value in (metadata or {}).items():
+                column = columns.get(field)
+                if column is None:
+                    column = columns[field] = ([], [])
+                column[0].append(value)
+                column[1].append(row)
+
+        self._spans: dict[str, dict[tuple, tuple[int, int]]] = {}
+        self._grouped: dict[str, np.ndarray] = {}
+        self._present: dict[str, np.ndarray] = {}
+        self._numbers: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for field, (values, rows) in columns.items():
+            self._index_column(field, values, np.array(rows, dtype=np.intp))
+
+    def _index_column(self, field: str, values: list, rows: np.ndarray) -> None:
+        """Group one field's rows by value, with np.unique doing the hashing."""
+        kinds = np.array([_KINDS.get(type(value), "") for value in values])
+        keys: list[tuple] = []
+        codes = np.full(len(values), -1, dtype=np.intp)
+        for kind in ("str", "number", "bool"):
+            where = np.flatnonzero(kinds == kind)
+            if len(where) == 0:
+                continue
+            column = np.array([values[i] for i in where.tolist()])
+            unique, inverse = np.unique(column, return_inverse=True)
+            codes[where] = inverse.reshape(-1) + len(keys)
+            keys.extend((kind, value) for value in unique.tolist())
+            if kind == "number":
+                order = np.argsort(column, kind="stable")
+                self._numbers[field] = (column[order], rows[where][order])
+
+        kept = codes >= 0
+        codes, rows = codes[kept], rows[kept]
+        # the rows holding a value are one slice of the grouped rows, sorted
+        # because rows arrive in order and the sort is stable
+        bounds = np.zeros(len(keys) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(codes, minlength=len(keys)), out=bounds[1:])
+        starts, ends = bounds[:-1].tolist(), bounds[1:].tolist()
+        self._spans[field] = {key: (starts[c], ends[c]) for c, key in enumerate(keys)}
+        self._grouped[field] = rows[np.argsort(codes, kind="stable")]
+        self._present[field] = rows
+
+    def select(self, where: dict) -> np.ndarray:
+        """
+        Return the rows matching a where clause.
+
+        Returns:
+            Sorted array of row numbers
+
+        Raises:
+            ValueError: For operators the index doesn't support
+        """
+        rows = [self._select_field(field, condition) for field, condition in where.items()]
+        return reduce(np.intersect1d, rows) if rows else np.arange(self.size)
+
+    def _select_field(self, field: str, condition) -> np.ndarray:
+        if field in ("$and", "$or"):
+            if not isinstance(condition, list) or not condition:
+                raise ValueError(f"{field} needs a non-empty list of clauses")
+            combine = np.intersect1d if field == "$and" else np.union1d
+            return reduce(combine, (self.select(clause) for clause in condition))
+        if field.startswith("$"):
+            raise ValueError(f"Unsupported filter operator {field!r}")
+
+        if not isinstance(condition, dict):
+            return self._equal(field, condition)
+        rows = [self._compare(field, op, value) for op, value in condition.items()]
+        return reduce(np.intersect1d, rows) if rows else self._present.get(field, _NONE)
+
+    def _compare(self, field: str, op: str, value) -> np.ndarray:
+        if op == "$eq":
+            return self._equal(field, value)
+        if op == "$ne":
+            return np.setdiff1d(self._present.get(field, _NONE), self._equal(field, value))
+        if op in ("$in", "$nin"):
+            if not isinstance(value, list):
+                raise ValueError(f"{op} needs a list of values")
+            rows = reduce(np.union1d, (self._equal(field, v) for v in value), _NONE)
+            if op == "$in":
+                return rows
+            return np.setdiff1d(self._present.get(field, _NONE), rows)
+        if op in _COMPARISONS:
+            if _key(value) is None or _key(value)[0] != "number":
+                raise ValueError(f"{op} needs a number")
+            keys, rows = self._numbers.get(field, (_NONE, _NONE))
+            if op in ("$gt", "$gte"):
+                lo = np.searchsorted(keys, value, side="right" if op == "$gt" else "left")
+                return np.sort(rows[lo:])
+            hi = np.searchsorted(keys, value, side="left" if op == "$lt" else "right")
+            return np.sort(rows[:hi])
+        raise ValueError(f"Unsupported filter operator {op!r}")
+
+    def _equal(self, field: str, value) -> np.ndarray:
+        key = _key(value)
+        if key is None:
+            raise ValueError(f"Unsupported filter value {value!r}")
+        span = self._spans.get(field, {}).get(key)
+        if span is None:
+            return _NONE
+        return self._grouped[field][span[0] : span[1]]
+
+
+_NONE = np.zeros(0, dtype=np.intp)
+
+# metadata value types filters can match, and the key kind each is indexed under
+_KINDS = {str: "str", int: "number", float: "number", bool: "bool"}
+
+
+def _key(value) -> tuple | None:
+    """
+    Hashable key for a metadata value, keeping True apart from 1 but 1
+    equal to 1.0; None for values filters can't match (e.g. lists).
+    """
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, (int, float)):
+        return ("number", value)
+    if isinstance(value, str):
+        return ("str", value)
+    return None
@@ -0,0 +1,224 @@
+"""
+Lexical (keyword) search: a BM25 inverted index and rank fusion.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+
+# words, numbers and identifiers such as ERR_429, api.v2 or ARIN-5360
+_TOKEN = re.compile(r"\w+(?:[.\-/]\w+)*")
+_SEPARATORS = re.compile(r"[._\-/]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase terms.
+
+    Compound identifiers are kept whole and also split into their parts,
+    so "rate_limit" matches both "rate_limit" and "limit".
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        parts = _SEPARATORS.split(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+class LexicalIndex:
+    """
+    In-memory inverted index scored with BM25.
+
+    Each term's postings are two flat ``array('I')`` columns, document
+    slots and term frequencies, so they cost 8 bytes per entry and are
+    scored with vectorized numpy operations over zero-copy views.
+    Documents are added incrementally. Deleting or replacing one leaves a
+    tombstone, and the postings are compacted once tombstones outnumber
+    live documents.
+
+    Args:
+        k1: BM25 term-frequency saturation
+        b: BM25 document-length normalization
+    """
+
+    COMPACT_MIN_DEAD = 1024  # don't bother compacting small indexes
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop every document."""
+        with self._lock:
+            self._terms: dict[str, int] = {}  # term -> term id
+            self._postings: list[array] = []  # term id -> document slots
+            self._freqs: list[array] = []  # term id -> term frequency per slot
+            self._ids: list[str | None] = []  # slot -> document id (None once deleted)
+            self._slots: dict[str, int] = {}  # document id -> live slot
+            self._lengths = np.zeros(0, dtype=np.float32)  # slot -> terms (0 once deleted)
+            self._live = 0
+            self._total_length = 0
+
+    def add(self, ids: list[str], texts: list[str]) -> None:
+        """Index documents, skipping ids that are already indexed."""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id not in self._slots:
+                    self._insert(doc_id, text)
+
+    def upsert(self, ids: list[str], texts: list[str]) -> None:
+        """Index documents, replacing any with the same id."""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                self._remove(doc_id)
+                self._insert(doc_id, text)
+            self._maybe_compact()
+
+    def delete(self, ids: list[str]) -> None:
+        """Remove documents; unknown ids are ignored."""
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+            self._maybe_compact()
+
+    def _insert(self, doc_id: str, text: str) -> None:
+        terms = tokenize(text)
+        slot = len(self._ids)
+        self._ids.append(doc_id)
+        self._slots[doc_id] = slot
+        if slot >= len(self._lengths):
+            self._lengths = np.resize(self._lengths, max(256, 2 * len(self._lengths)))
+        self._lengths[slot] = len(terms)
+        self._live += 1
+        self._total_length += len(terms)
+
+        for term, freq in Counter(terms).items():
+            term_id = self._terms.get(term)
+            if term_id is None:
+                term_id = self._terms[term] = len(self._postings)
+                self._postings.append(array("I"))
+                self._freqs.append(array("I"))
+            self._postings[term_id].append(slot)
+            self._freqs[term_id].append(freq)
+
+    def _remove(self, doc_id: str) -> None:
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return
+        self._ids[slot] = None
+        self._total_length -= int(self._lengths[slot])
+        self._lengths[slot] = 0
+        self._live -= 1
+
+    def _maybe_compact(self) -> None:
+        """Rewrite the postings without deleted slots once they dominate."""
+        dead = len(self._ids) - self._live
+        if dead < self.COMPACT_MIN_DEAD or dead < self._live:
+            return
+
+        alive = np.array([doc_id is not None for doc_id in self._ids], dtype=bool)
+        new_slot = np.cumsum(alive, dtype=np.int64) - 1
+        for term_id, (slots, freqs) in enumerate(zip(self._postings, self._freqs)):
+            slots_view = np.frombuffer(slots, dtype=np.uint32)
+            keep = alive[slots_view]
+            self._postings[term_id] = array("I", new_slot[slots_view[keep]].astype(np.uint32))
+            self._freqs[term_id] = array("I", np.frombuffer(freqs, dtype=np.uint32)[keep])
+            del slots_view
+
+        self._ids = [doc_id for doc_id in self._ids if doc_id is not None]
+        self._slots = {doc_id: slot for slot, doc_id in enumerate(self._ids)}
+        self._lengths = self._lengths[: len(alive)][alive].copy()
+
+    def search(
+        self, query: str, n_results: int = 5, only: Iterable[str] | None = None
+    ) -> list[tuple[str, float]]:
+        """
+        Rank documents for a query with BM25.
+
+        Args:
+            query: Search query text
+            n_results: Most results to return
+            only: If given, rank just these document ids (e.g. the ones a
+                metadata filter selected)
+
+        Returns:
+            (document id, BM25 score) pairs, best first; only documents
+            sharing at least one term with the query are returned
+        """
+        with self._lock:
+            term_ids = {self._terms[t] for t in tokenize(query) if t in self._terms}
+            if not term_ids or self._live == 0 or n_results < 1:
+                return []
+
+            lengths = self._lengths
+            avg_length = self._total_length / self._live
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term_id in term_ids:
+                slots = np.frombuffer(self._postings[term_id], dtype=np.uint32)
+                freqs = np.frombuffer(self._freqs[term_id], dtype=np.uint32).astype(np.float32)
+                doc_lengths = lengths[slots]
+                live = doc_lengths > 0
+                df = int(np.count_nonzero(live))
+                if df == 0:
+                    continue
+                idf = math.log(1 + (self._live - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths / avg_length)
+                # slots are unique within a term's postings, so += doesn't drop any
+                scores[slots] += np.where(live, idf * freqs * (self.k1 + 1) / (freqs + norm), 0)
+
+            if only is not None:
+                allowed = np.zeros(len(scores), dtype=bool)
+                allowed[[self._slots[i] for i in only if i in self._slots]] = True
+                scores[~allowed] = 0
+
+            matched = np.flatnonzero(scores > 0)
+            if len(matched) > n_results:
+                best = np.argpartition(-scores[matched], n_results - 1)[:n_results]
+                matched = matched[best]
+            order = matched[np.argsort(-scores[matched], kind="stable")]
+            return [(self._ids[slot], float(scores[slot])) for slot in order]
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._slots
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """
+    Merge ranked id lists by reciprocal rank fusion.
+
+    Each list contributes 1 / (k + rank) to every id it contains (rank
+    starting at 1), so ids ranked well by several lists rise to the top
+    without having to compare their raw scores.
+
+    Args:
+        rankings: Lists of ids, each best first
+        k: Damping constant; larger values flatten the rank differences
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    fused: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
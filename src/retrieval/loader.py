@@ -10,36 +10,69 @@ Seattle University, ARIN 5360
 
 from __future__ import annotations
 
+import functools
 import logging
+import multiprocessing
+import os
+import re
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-
-import pypdf
+from typing import Iterable, Iterator
 
 logger = logging.getLogger(__name__)
 
+_WHITESPACE = re.compile(r"\s")
 
-class DocumentChunker:
-    """Chunk documents into smaller pieces for better retrieval."""
 
-    def __init__(self, chunk_size: int = 300, overlap: int = 30):
+class DocumentChunker:
+    """
+    Chunk documents into smaller pieces for better retrieval.
+
+    By default chunk_size and overlap count words. Given a tokenizer (a fast
+    Hugging Face tokenizer, such as the embedding model's), they count model
+    tokens instead, so a chunk never runs past what the model reads. In that
+    mode the text is tokenized a few windows at a time, only the character
+    offsets of tokens not yet chunked are kept, and each chunk is a slice of
+    the original text with its "start" and "end" offsets in the metadata.
+    """
+
+    # token mode tokenizes text in windows, a batch of them per tokenizer call
+    WINDOW_CHARS = 4096
+    WINDOWS_PER_BATCH = 32
+
+    def __init__(self, chunk_size: int = 300, overlap: int = 30, tokenizer=None):
         if chunk_size <= 0:
             raise ValueError("chunk_size must be > 0")
         if overlap < 0:
             raise ValueError("overlap must be >= 0")
         if overlap >= chunk_size:
             raise ValueError("overlap must be < chunk_size")
+        if tokenizer is not None and not getattr(tokenizer, "is_fast", False):
+            raise ValueError("Token chunking needs a fast tokenizer (one that reports offsets)")
 
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.tokenizer = tokenizer
+
+    def chunk_text(self, text: str, doc_id: str, id_prefix: str | None = None) -> list[dict]:
+        """
+        Split the given text into overlapping chunks.
+
+        Chunk ids are "<id_prefix>_<n>", id_prefix defaulting to doc_id.
+        """
+        prefix = id_prefix or doc_id
+        if self.tokenizer is not None:
+            return list(self.iter_token_chunks(text, doc_id, prefix))
 
-    def chunk_text(self, text: str, doc_id: str) -> list[dict]:
-        """Split the given text into overlapping chunks."""
         words = text.split()
 
         if len(words) <= self.chunk_size:
             return [
                 {
-                    "id": f"{doc_id}_0",
+                    "id": f"{prefix}_0",
                     "text": text,
                     "metadata": {"chunk": 0, "doc_id": doc_id},
                 }
@@ -54,7 +87,7 @@ class DocumentChunker:
 
             chunks.append(
                 {
-                    "id": f"{doc_id}_{chunk_num}",
+                    "id": f"{prefix}_{chunk_num}",
                     "text": chunk,
                     "metadata": {"chunk": chunk_num, "doc_id": doc_id},
                 }
@@ -65,17 +98,119 @@ class DocumentChunker:
 
         return chunks
 
+    def iter_token_chunks(
+        self, text: str, doc_id: str, id_prefix: str | None = None
+    ) -> Iterator[dict]:
+        """
+        Yield chunks of at most chunk_size tokens, streaming through the text.
+
+        A chunk that would end inside a word is cut before that word
+        instead, as long as it keeps more than half its tokens.
+        """
+        prefix = id_prefix or doc_id
+        starts, ends = array("q"), array("q")  # offsets of tokens not yet chunked
+        chunk_num = 0
+
+        for window_starts, window_ends in self._token_offsets(text):
+            starts.extend(window_starts)
+            ends.extend(window_ends)
+            # wait for one token past the chunk, to see whether a word continues
+            while len(starts) > self.chunk_size:
+                end = self.chunk_size
+                while (
+                    end > max(self.chunk_size // 2, self.overlap + 1)
+                    and starts[end] == ends[end - 1]
+                ):
+                    end -= 1
+                yield self._token_chunk(text, doc_id, prefix, chunk_num, starts[0], ends[end - 1])
+                chunk_num += 1
+                del starts[: end - self.overlap]
+                del ends[: end - self.overlap]
+
+        # whatever is left, unless it's all overlap with the last chunk
+        if len(starts) > (self.overlap if chunk_num else 0):
+            yield self._token_chunk(text, doc_id, prefix, chunk_num, starts[0], ends[-1])
+
+    def _token_offsets(self, text: str) -> Iterator[tuple[list[int], list[int]]]:
+        """
+        Tokenize text a batch of windows at a time, yielding token
+        (starts, ends) in text; the tokenizer runs a batch's windows in parallel.
+        """
+        pos = 0
+        while pos < len(text):
+            windows = []  # (offset in text, window text)
+            while pos < len(text) and len(windows) < self.WINDOWS_PER_BATCH:
+                stop = pos + self.WINDOW_CHARS
+                if stop < len(text):
+                    # end the window at whitespace so no word is split between windows
+                    space = _WHITESPACE.search(text, stop)
+                    stop = space.start() if space else len(text)
+                windows.append((pos, text[pos:stop]))
+                pos = stop
+
+            encoding = self.tokenizer(
+                [window for _offset, window in windows],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                verbose=False,
+            )
+            for (offset, _window), offsets in zip(windows, encoding["offset_mapping"]):
+                offsets = [(start, end) for start, end in offsets if end > start]
+                yield [offset + start for start, _ in offsets], [offset + end for _, end in offsets]
+
+    @staticmethod
+    def _token_chunk(
+        text: str, doc_id: str, prefix: str, chunk_num: int, start: int, end: int
+    ) -> dict:
+        return {
+            "id": f"{prefix}_{chunk_num}",
+            "text": text[start:end],
+            "metadata": {"chunk": chunk_num, "doc_id": doc_id, "start": start, "end": end},
+        }
 
-class DocumentLoader:
-    """Load and parse documents from the file system."""
 
-    def __init__(self, chunker: DocumentChunker | None = None):
+class DocumentLoader:
+    """
+    Load and parse documents from the file system.
+
+    Args:
+        chunker: Optional chunker to split each document
+        workers: Number of processes to load files with. 1 loads everything
+            on the calling thread; None uses every CPU.
+        pdf_pages_per_task: With workers > 1, PDFs with more pages than this
+            have their text extracted in page ranges of this size, spread
+            across the workers.
+    """
+
+    def __init__(
+        self,
+        chunker: DocumentChunker | None = None,
+        workers: int | None = 1,
+        pdf_pages_per_task: int = 16,
+    ):
         """Initialize loader with optional chunker."""
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be >= 1")
+        if pdf_pages_per_task < 1:
+            raise ValueError("pdf_pages_per_task must be >= 1")
+
         self.chunker = chunker
+        self.workers = workers or os.cpu_count() or 1
+        self.pdf_pages_per_task = pdf_pages_per_task
 
     def load_documents(self, directory: str) -> list[dict]:
         """Load all text documents from a directory."""
-        documents: list[dict] = []
+        return list(self.iter_documents(directory))
+
+    def iter_documents(self, directory: str) -> Iterator[dict]:
+        """Yield the documents in a directory, loading one file at a time."""
+        for _filepath, docs in self.load_files(self.list_files(directory)):
+            yield from docs
+
+    def list_files(self, directory: str) -> list[Path]:
+        """List the loadable files in a directory: text files, then PDFs."""
         path = Path(directory)
 
         if not path.exists():
@@ -83,19 +218,116 @@ class DocumentLoader:
         if not path.is_dir():
             raise NotADirectoryError(f"Not a directory: {directory}")
 
-        # load text files
-        for filepath in path.glob("*.txt"):
-            logger.info(f"Loading document: {filepath}")
-            docs = self._load_text_file(filepath)
-            documents.extend(docs)
-
-        # load PDF files
-        for filepath in path.glob("*.pdf"):
-            logger.info(f"Loading document: {filepath}")
-            docs = self._load_pdf_file(filepath)
-            documents.extend(docs)
+        return sorted(path.glob("*.txt")) + sorted(path.glob("*.pdf"))
+
+    def load_file(self, filepath: Path) -> list[dict]:
+        """Load a single text or PDF file."""
+        filepath = Path(filepath)
+        logger.info(f"Loading document: {filepath}")
+
+        if filepath.suffix == ".pdf":
+            return self._load_pdf_file(filepath)
+        return self._load_text_file(filepath)
+
+    def load_files(self, filepaths: Iterable[Path]) -> Iterator[tuple[Path, list[dict]]]:
+        """
+        Load several files, yielding (filepath, documents) in input order.
+
+        With more than one worker, files are loaded in a process pool and
+        large PDFs are split into page ranges. Only a bounded number of files
+        are in flight at once, so results don't pile up ahead of the caller.
+        """
+        filepaths = [Path(filepath) for filepath in filepaths]
+        if self.workers == 1 or len(filepaths) == 0:
+            for filepath in filepaths:
+                yield filepath, self.load_file(filepath)
+            return
+
+        # spawn, not fork: the parent may hold model threads and locks
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            pending = deque()
+            for filepath in filepaths:
+                pending.append((filepath, self._submit(pool, filepath)))
+                if len(pending) > 2 * self.workers:
+                    done, collect = pending.popleft()
+                    yield done, collect()
+            while pending:
+                done, collect = pending.popleft()
+                yield done, collect()
+
+    def _submit(self, pool: ProcessPoolExecutor, filepath: Path):
+        """
+        Submit a file to the pool, returning a callable for its documents.
+
+        Workers get only the chunker's settings, never the loader itself.
+        A PDF's first task opens it and reports its page count; if there are
+        more pages than one task takes, the remaining ranges are submitted
+        as soon as it finishes.
+        """
+        settings = self._worker_settings()
+        if filepath.suffix != ".pdf":
+            return pool.submit(_load_file, str(filepath), settings).result
+
+        per_task = self.pdf_pages_per_task
+        head = pool.submit(_load_pdf_head, str(filepath), settings, per_task)
+        rest = []
+        submitted = threading.Event()
+
+        def submit_rest(future) -> None:
+            try:
+                num_pages, _pages = future.result()
+                for start in range(per_task, num_pages, per_task):
+                    rest.append(
+                        pool.submit(_extract_pdf_pages, str(filepath), start, start + per_task)
+                    )
+            except Exception:
+                pass  # collect() logs the failure
+            finally:
+                submitted.set()
+
+        head.add_done_callback(submit_rest)
+
+        def collect() -> list[dict]:
+            try:
+                num_pages, result = head.result()
+                if num_pages <= per_task:
+                    return result  # the first task loaded the whole PDF
+                submitted.wait()
+                pages = result + [text for future in rest for text in future.result()]
+                if len(pages) != num_pages:
+                    raise RuntimeError(f"extracted {len(pages)} of {num_pages} pages")
+                return self._pdf_documents(filepath, pages)
+            except Exception as e:
+                logger.warning(f"Warning: Failed to load {filepath}: {e}")
+                return []
 
-        return documents
+        return collect
+
+    def _worker_settings(self) -> tuple | None:
+        """Picklable (chunk_size, overlap, tokenizer name) to rebuild the chunker in a worker."""
+        if self.chunker is None:
+            return None
+        tokenizer = self.chunker.tokenizer
+        name = tokenizer.name_or_path if tokenizer is not None else None
+        return self.chunker.chunk_size, self.chunker.overlap, name
+
+    def _make_documents(self, text: str, filepath: Path, metadata: dict) -> list[dict]:
+        """
+        Turn a file's text into documents, chunking if a chunker exists.
+
+        Ids start with the file name, so files sharing a stem (a.txt and
+        a.pdf) never share an id; the 'doc_id' metadata is the stem.
+        """
+        if self.chunker:
+            chunks = self.chunker.chunk_text(text, filepath.stem, id_prefix=filepath.name)
+            # Add file metadata to each chunk's metadata
+            for chunk in chunks:
+                chunk["metadata"].update(metadata)
+            return chunks
+
+        # No chunking
+        return [{"id": filepath.name, "text": text, "metadata": metadata}]
 
     def _load_text_file(self, filepath: Path) -> list[dict]:
         """Load a single text file."""
@@ -106,19 +338,8 @@ class DocumentLoader:
             if not text:
                 return []
 
-            doc_id = filepath.stem
             metadata = {"filename": filepath.name, "type": "txt"}
-
-            # Chunk if chunker exists
-            if self.chunker:
-                chunks = self.chunker.chunk_text(text, doc_id)
-                # Add filename/type to each chunk's metadata
-                for chunk in chunks:
-                    chunk["metadata"].update(metadata)
-                return chunks
-
-            # No chunking
-            return [{"id": doc_id, "text": text, "metadata": metadata}]
+            return self._make_documents(text, filepath, metadata)
 
         except Exception as e:
             logger.warning(f"Warning: Failed to load {filepath}: {e}")
@@ -127,32 +348,74 @@ class DocumentLoader:
     def _load_pdf_file(self, filepath: Path) -> list[dict]:
         """Load a single PDF file."""
         try:
+            import pypdf  # only deployments with PDFs pay for importing it
+
             reader = pypdf.PdfReader(str(filepath))
 
             # Extract text from all pages
-            text_parts = []
-            for page in reader.pages:
-                text_parts.append(page.extract_text() or "")
+            pages = [page.extract_text() or "" for page in reader.pages]
+            return self._pdf_documents(filepath, pages)
 
-            text = "\n\n".join(text_parts).strip()
+        except Exception as e:
+            logger.warning(f"Warning: Failed to load {filepath}: {e}")
+            return []
 
-            if not text:
-                return []
+    def _pdf_documents(self, filepath: Path, pages: list[str]) -> list[dict]:
+        """Build documents from a PDF's extracted page texts."""
+        text = "\n\n".join(pages).strip()
 
-            doc_id = filepath.stem
-            metadata = {"filename": filepath.name, "type": "pdf", "num_pages": len(reader.pages)}
+        if not text:
+            return []
 
-            # Chunk if chunker exists
-            if self.chunker:
-                chunks = self.chunker.chunk_text(text, doc_id)
-                # Add pdf metadata to each chunk's metadata
-                for chunk in chunks:
-                    chunk["metadata"].update(metadata)
-                return chunks
-            else:
-                # No chunking
-                return [{"id": doc_id, "text": text, "metadata": metadata}]
+        metadata = {"filename": filepath.name, "type": "pdf", "num_pages": len(pages)}
+        return self._make_documents(text, filepath, metadata)
 
-        except Exception as e:
-            logger.warning(f"Warning: Failed to load {filepath}: {e}")
-            return []
+
+@functools.lru_cache(maxsize=None)
+def _worker_loader(settings: tuple | None) -> DocumentLoader:
+    """A serial loader with the given chunker settings, built once per worker."""
+    if settings is None:
+        return DocumentLoader()
+    chunk_size, overlap, tokenizer_name = settings
+    tokenizer = None
+    if tokenizer_name is not None:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    return DocumentLoader(chunker=DocumentChunker(chunk_size, overlap, tokenizer))
+
+
+def _load_file(filepath: str, settings: tuple | None) -> list[dict]:
+    """Load a file in a worker."""
+    return _worker_loader(settings).load_file(Path(filepath))
+
+
+def _load_pdf_head(filepath: str, settings: tuple | None, pages_per_task: int) -> tuple[int, list]:
+    """
+    Open a PDF in a worker, returning (page count, result).
+
+    A PDF of at most pages_per_task pages is loaded whole and the result is
+    its documents; for a longer one it is the text of its first
+    pages_per_task pages. A PDF that can't be read gives (0, []).
+    """
+    logger.info(f"Loading document: {filepath}")
+    try:
+        import pypdf
+
+        reader = pypdf.PdfReader(filepath)
+        num_pages = len(reader.pages)
+        pages = [page.extract_text() or "" for page in reader.pages[:pages_per_task]]
+        if num_pages <= pages_per_task:
+            return num_pages, _worker_loader(settings)._pdf_documents(Path(filepath), pages)
+        return num_pages, pages
+    except Exception as e:
+        logger.warning(f"Warning: Failed to load {filepath}: {e}")
+        return 0, []
+
+
+def _extract_pdf_pages(filepath: str, start: int, stop: int) -> list[str]:
+    """Extract the text of pages [start, stop) of a PDF (runs in a worker)."""
+    import pypdf
+
+    reader = pypdf.PdfReader(filepath)
+    return [page.extract_text() or "" for page in reader.pages[start:stop]]
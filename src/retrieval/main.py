@@ -8,16 +8,27 @@ Seattle University, ARIN 5360
 """
 
 import logging
+import os
+import secrets
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
-
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+
+# the package's modules record into retrieval.metrics (not src.retrieval.metrics),
+# so read the registry from there
+from retrieval.metrics import CONTENT_TYPE, REGISTRY
+from src.retrieval.batching import QueryBatcher
+from src.retrieval.filters import where_clause
+from src.retrieval.profiling import RequestCountdown, SamplingProfiler, ServerTimingMiddleware
 from src.retrieval.retriever import DocumentRetriever
+from src.retrieval.startup import BackgroundIndexer
+from src.retrieval.store import SEARCH_MODES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +37,84 @@ logger = logging.getLogger(__name__)
 # Global retriever instance
 retriever = None
 
+# Groups concurrent /search requests into one embedding + query call
+batcher = None
+
+# Builds the retriever and indexes the documents in the background at startup
+indexer = None
+
+# Where to keep the index between restarts; unset keeps it in memory only
+PERSIST_DIRECTORY = os.environ.get("RETRIEVAL_PERSIST_DIR") or None
+
+# Search backend: "chroma" (approximate, HNSW) or "numpy" (exact, one matrix multiply)
+BACKEND = os.environ.get("RETRIEVAL_BACKEND", "chroma")
+
+# Compact codes searched first by the numpy backend: "float16", "int8" or "binary"
+QUANTIZATION = os.environ.get("RETRIEVAL_QUANTIZATION") or None
+
+# How the embedding model runs: "torch" (fp32), "int8" (dynamically quantized
+# PyTorch), "onnx" or "onnx-int8" (ONNX Runtime); changing it rebuilds the index
+EMBEDDING_BACKEND = os.environ.get("RETRIEVAL_EMBEDDING_BACKEND", "torch")
+
+# Model batches: most texts per batch, and most token slots (padding included);
+# texts are bucketed by token length so a batch pads little
+ENCODE_BATCH_SIZE = int(os.environ.get("RETRIEVAL_ENCODE_BATCH_SIZE", "32"))
+ENCODE_MAX_BATCH_TOKENS = int(os.environ.get("RETRIEVAL_ENCODE_MAX_BATCH_TOKENS", "8192"))
+
+# Processes embedding chunks while indexing, each with its own model replica
+# ("0" for one per CPU); 1 embeds in the server process. Worth it for bulk indexing
+ENCODE_WORKERS = int(os.environ.get("RETRIEVAL_ENCODE_WORKERS", "1")) or None
+
+# Disk cache of chunk embeddings, reused across restarts and re-syncs
+EMBEDDING_CACHE_DIR = os.environ.get("RETRIEVAL_EMBEDDING_CACHE_DIR") or None
+
+# In-memory LRU cache of query embeddings: entries kept (0 disables) and TTL in seconds
+QUERY_CACHE_SIZE = int(os.environ.get("RETRIEVAL_QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.environ.get("RETRIEVAL_QUERY_CACHE_TTL", "0")) or None
+
+# In-memory LRU cache of search results, cleared whenever the index changes (0 disables)
+RESULT_CACHE_SIZE = int(os.environ.get("RETRIEVAL_RESULT_CACHE_SIZE", "1024"))
+
+# Chunk size unit: "words", or "tokens" to fit chunks to the embedding model's input limit
+CHUNK_UNIT = os.environ.get("RETRIEVAL_CHUNK_UNIT", "words")
+
+# embed each distinct chunk once ("0" embeds every copy), and the MinHash
+# similarity from which a chunk counts as a copy ("0" for exact copies only)
+DEDUP = os.environ.get("RETRIEVAL_DEDUP", "1") != "0"
+NEAR_DUPLICATE_THRESHOLD = (
+    float(os.environ.get("RETRIEVAL_NEAR_DUPLICATE_THRESHOLD", "0.9")) or None
+)
+
+# Processes used to load/extract documents while indexing ("0" = one per CPU)
+LOAD_WORKERS = int(os.environ.get("RETRIEVAL_LOAD_WORKERS", "1")) or None
+
+# Directory of source documents that is indexed (and re-synced by admins)
+DOCUMENTS_DIRECTORY = os.environ.get("RETRIEVAL_DOCUMENTS_DIR", "documents")
+
+# Query micro-batching: most queries per batch, and longest wait for a batch to fill
+BATCH_MAX_SIZE = int(os.environ.get("RETRIEVAL_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("RETRIEVAL_BATCH_MAX_WAIT_MS", "5"))
+
+# Most queries accepted by one /search/batch request
+MAX_BATCH_QUERIES = int(os.environ.get("RETRIEVAL_MAX_BATCH_QUERIES", "1000"))
+
+# Seconds before a failed startup (model load or indexing) is retried; doubles up to 5 minutes
+STARTUP_RETRY_SECONDS = float(os.environ.get("RETRIEVAL_STARTUP_RETRY_SECONDS", "5"))
+
+# Shared secret for /admin endpoints; unset disables them
+ADMIN_TOKEN = os.environ.get("RETRIEVAL_ADMIN_TOKEN") or None
+
+# Set to 1 to let admins take sampling profiles (/admin/profile); off by default
+PROFILING = os.environ.get("RETRIEVAL_PROFILING", "0") != "0"
+PROFILE_INTERVAL_MS = float(os.environ.get("RETRIEVAL_PROFILE_INTERVAL_MS", "5"))
+
+# Longest a profile of requests may wait for them
+MAX_PROFILE_SECONDS = 600
+
+# The profile being taken, if any, and the responses it waits for
+profiler = None
+profile_countdown = None
+
 
 class HealthResponse(BaseModel):
     """Response model for health check."""
@@ -33,6 +122,20 @@ class HealthResponse(BaseModel):
     status: str
     documents_indexed: int
     message: str
+    cache: dict | None = None  # per-cache entries, bytes and hit rate
+    encode: dict | None = None  # embedding throughput: texts/s, tokens/s, padding
+    ready: bool = False  # True once startup indexing has finished
+    startup: dict | None = None  # startup state, last error and indexing progress
+
+
+class SearchFilters(BaseModel):
+    """Metadata filters applied before ranking; a list matches any of its values."""
+
+    type: str | list[str] | None = None  # "txt" or "pdf"
+    filename: str | list[str] | None = None
+    doc_id: str | list[str] | None = None  # file name without its extension
+    min_pages: int | None = None  # page-count bounds; these match PDFs only
+    max_pages: int | None = None
 
 
 class SearchRequest(BaseModel):
@@ -40,6 +143,9 @@ class SearchRequest(BaseModel):
 
     query: str
     n_results: int = 5
+    mode: str = "semantic"  # "semantic", "lexical" (BM25 keywords) or "hybrid"
+    filters: SearchFilters | None = None
+    collapse_duplicates: bool = False  # one result per group of duplicate chunks
 
 
 class SearchResponse(BaseModel):
@@ -48,28 +154,95 @@ class SearchResponse(BaseModel):
     query: str
     results: list[dict]
     count: int
+    partial: bool = False  # True while startup indexing is still running
+
+
+class BatchSearchRequest(BaseModel):
+    """Request model for batch search."""
+
+    queries: list[str]
+    n_results: int = 5
+    mode: str = "semantic"  # "semantic", "lexical" (BM25 keywords) or "hybrid"
+    filters: SearchFilters | None = None  # applied to every query
+    collapse_duplicates: bool = False  # one result per group of duplicate chunks
+
+
+class BatchSearchResponse(BaseModel):
+    """Response model for batch search: one SearchResponse per query, in order."""
+
+    results: list[SearchResponse]
+    count: int
+    partial: bool = False  # True while startup indexing is still running
+
+
+class SyncResponse(BaseModel):
+    """Response model for an index sync."""
+
+    added: list[str]
+    updated: list[str]
+    deleted: list[str]
+    unchanged: list[str]
+    documents_indexed: int
+
+
+def create_retriever() -> DocumentRetriever:
+    """Build the retriever from the RETRIEVAL_* settings (this loads the model)."""
+    return DocumentRetriever(
+        persist_directory=PERSIST_DIRECTORY,
+        embedding_cache_dir=EMBEDDING_CACHE_DIR,
+        load_workers=LOAD_WORKERS,
+        query_cache_size=QUERY_CACHE_SIZE,
+        query_cache_ttl=QUERY_CACHE_TTL,
+        result_cache_size=RESULT_CACHE_SIZE,
+        backend=BACKEND,
+        quantization=QUANTIZATION,
+        chunk_unit=CHUNK_UNIT,
+        dedup=DEDUP,
+        near_duplicate_threshold=NEAR_DUPLICATE_THRESHOLD,
+        embedding_backend=EMBEDDING_BACKEND,
+        encode_batch_size=ENCODE_BATCH_SIZE,
+        max_batch_tokens=ENCODE_MAX_BATCH_TOKENS,
+        encode_workers=ENCODE_WORKERS,
+    )
+
+
+async def use_retriever(new_retriever) -> None:
+    """Start serving searches from a retriever, even before its indexing finishes."""
+    global retriever, batcher
+    retriever = new_retriever
+    batcher = QueryBatcher(
+        retriever.search_many, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS
+    )
+    await batcher.start()
 
 
 # Define lifespan function to load models on startup
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    # Code before the 'yield' is executed during application startup
-    try:
-        logger.info("Loading models...")
-
-        # Index documents from the documents/ directory
-        global retriever
-        retriever = DocumentRetriever()
-        num_docs = retriever.index_documents("documents")
-        logger.info(f"Indexed {num_docs} documents successfully!")
-    except Exception as e:
-        # Don't crash the server, but log the error
-        logger.error(f"Failed to load model: {str(e)}")
+    # Code before the 'yield' is executed during application startup.
+    # The model loads and documents are indexed in the background, so the
+    # server takes requests (and passes liveness checks) right away.
+    logger.info("Loading models and indexing documents in the background...")
+    global indexer, batcher
+    indexer = BackgroundIndexer(
+        create_retriever,
+        DOCUMENTS_DIRECTORY,
+        on_retriever=use_retriever,
+        retry_seconds=STARTUP_RETRY_SECONDS,
+    )
+    indexer.start()
+    REGISTRY.register(retriever_metrics)
 
     yield  # The application starts receiving requests after the yield
 
     # Code after the 'yield' is executed during application shutdown
     logger.info("Application shutting down (lifespan)...")
+    REGISTRY.unregister(retriever_metrics)
+    await indexer.stop()
+    indexer = None
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
 
 
 # Initialize FastAPI app
@@ -92,19 +265,29 @@ app.add_middleware(
 )
 
 
+def count_profiled_request() -> None:
+    """Count a search response towards the profile being taken, if any."""
+    if profile_countdown is not None:
+        profile_countdown.count()
+
+
+# Time each search's stages into a Server-Timing header
+app.add_middleware(ServerTimingMiddleware, paths=("/search",), on_response=count_profiled_request)
+
+
 @app.post("/search", response_model=SearchResponse)
 async def search(request: SearchRequest):
     """
     Search for documents relevant to the query.
 
     Args:
-        request: SearchRequest with query and optional n_results
+        request: SearchRequest with query, optional n_results, mode and filters
 
     Returns:
-        SearchResponse with results
+        SearchResponse with results, marked partial while startup indexing
+        is still running
     """
-    if retriever is None:
-        raise HTTPException(status_code=503, detail="Retriever not initialized")
+    partial = searchable()
 
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
@@ -112,31 +295,370 @@ async def search(request: SearchRequest):
     if request.n_results < 1 or request.n_results > 20:
         raise HTTPException(status_code=400, detail="n_results must be between 1 and 20")
 
+    if request.mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}"
+        )
+
+    where = filter_clause(request.filters)
+
     try:
-        results = retriever.search(request.query, request.n_results)
-        return SearchResponse(query=request.query, results=results, count=len(results))
+        if batcher is not None:
+            results = await batcher.search(
+                request.query,
+                request.n_results,
+                mode=request.mode,
+                where=where,
+                collapse_duplicates=request.collapse_duplicates,
+            )
+        else:
+            # encoding is CPU-bound; keep it off the event loop
+            results = await run_in_threadpool(
+                retriever.search,
+                request.query,
+                request.n_results,
+                mode=request.mode,
+                where=where,
+                collapse_duplicates=request.collapse_duplicates,
+            )
+        return SearchResponse(
+            query=request.query, results=results, count=len(results), partial=partial
+        )
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         raise HTTPException(status_code=500, detail="Search failed")
 
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchSearchRequest):
+    """
+    Search for many queries in one request.
+
+    All queries are embedded in one call and looked up in one vectorized
+    query, so bulk jobs avoid per-query HTTP, validation and encode setup.
+
+    Args:
+        request: BatchSearchRequest with queries, optional n_results, mode and filters
+
+    Returns:
+        BatchSearchResponse with one result set per query, in order
+    """
+    partial = searchable()
+
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Queries cannot be empty")
+
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch"
+        )
+
+    if any(not query.strip() for query in request.queries):
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    if request.n_results < 1 or request.n_results > 20:
+        raise HTTPException(status_code=400, detail="n_results must be between 1 and 20")
+
+    if request.mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}"
+        )
+
+    where = filter_clause(request.filters)
+
+    try:
+        # already a batch, so skip the micro-batcher and go straight to the store
+        batches = await run_in_threadpool(
+            retriever.search_many,
+            request.queries,
+            request.n_results,
+            mode=request.mode,
+            where=where,
+            collapse_duplicates=request.collapse_duplicates,
+        )
+    except Exception as e:
+        logger.error(f"Batch search error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Search failed")
+
+    results = [
+        SearchResponse(query=query, results=hits, count=len(hits), partial=partial)
+        for query, hits in zip(request.queries, batches)
+    ]
+    return BatchSearchResponse(results=results, count=len(results), partial=partial)
+
+
+def retry_after() -> str:
+    """Seconds a client should wait before retrying, as a Retry-After header value."""
+    if indexer is None:
+        return str(BackgroundIndexer.RETRY_AFTER_SECONDS)
+    return str(indexer.retry_after())
+
+
+def not_ready(detail: str) -> HTTPException:
+    """A 503 telling the client when to try again."""
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": retry_after()})
+
+
+def searchable() -> bool:
+    """
+    Check there is an index to search, and whether it is still being built.
+
+    Returns:
+        True if startup indexing is still running, so results may be partial
+
+    Raises:
+        HTTPException: 503 with Retry-After while there is nothing to search yet
+    """
+    if retriever is None:
+        raise not_ready("Retriever not initialized")
+    if indexer is None or indexer.ready:
+        return False
+    if retriever.document_count == 0:
+        raise not_ready("Documents are still being indexed")
+    return True
+
+
+def filter_clause(filters: SearchFilters | None) -> dict | None:
+    """Check a request's filters and turn them into a where clause for the store."""
+    if filters is None:
+        return None
+
+    for name in ("type", "filename", "doc_id"):
+        if getattr(filters, name) == []:
+            raise HTTPException(status_code=400, detail=f"filters.{name} cannot be an empty list")
+    if filters.min_pages is not None and filters.min_pages < 0:
+        raise HTTPException(status_code=400, detail="filters.min_pages must be >= 0")
+    if (
+        filters.min_pages is not None
+        and filters.max_pages is not None
+        and filters.min_pages > filters.max_pages
+    ):
+        raise HTTPException(status_code=400, detail="filters.min_pages must be <= max_pages")
+
+    return where_clause(**filters.model_dump())
+
+
+def require_admin(token: str | None) -> None:
+    """Reject the request unless it carries the configured admin token."""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if token is None or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/admin/sync", response_model=SyncResponse)
+async def sync_documents(x_admin_token: str | None = Header(default=None)):
+    """
+    Re-sync the index with the documents directory.
+
+    Only added, changed and deleted files are touched, so editing one file
+    doesn't re-embed the whole corpus.
+
+    Returns:
+        SyncResponse listing what changed
+    """
+    require_admin(x_admin_token)
+
+    if retriever is None:
+        raise not_ready("Retriever not initialized")
+
+    try:
+        # embedding is CPU-bound; keep it off the event loop
+        report = await run_in_threadpool(retriever.sync_documents, DOCUMENTS_DIRECTORY)
+    except Exception as e:
+        logger.error(f"Sync error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Sync failed")
+
+    return SyncResponse(**report, documents_indexed=retriever.document_count)
+
+
+@app.post("/admin/profile")
+async def profile(
+    requests: int = 0,
+    sync: bool = False,
+    timeout: float = 60.0,
+    x_admin_token: str | None = Header(default=None),
+):
+    """
+    Take a sampling profile of the next search requests, or of a sync.
+
+    Args:
+        requests: Profile until this many /search responses have been sent
+        sync: Profile a sync of the documents directory instead
+        timeout: Most seconds to wait for the requests; the profile so far
+            is returned when it passes
+
+    Returns:
+        The samples as folded stacks ("profile.folded"), for flamegraph.pl,
+        speedscope or other flame graph tools
+    """
+    global profiler, profile_countdown
+    require_admin(x_admin_token)
+
+    if not PROFILING:
+        raise HTTPException(status_code=403, detail="Profiling is disabled")
+    if sync == (requests > 0):
+        raise HTTPException(
+            status_code=400, detail="Profile either some requests (requests=N) or a sync"
+        )
+    if not 0 < timeout <= MAX_PROFILE_SECONDS:
+        raise HTTPException(
+            status_code=400, detail=f"timeout must be in (0, {MAX_PROFILE_SECONDS}] seconds"
+        )
+    if sync and retriever is None:
+        raise not_ready("Retriever not initialized")
+    if profiler is not None:
+        raise HTTPException(status_code=409, detail="A profile is already being taken")
+
+    taken = profiler = SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000)
+    headers = {"Content-Disposition": 'attachment; filename="profile.folded"'}
+    try:
+        with taken:
+            if sync:
+                await run_in_threadpool(retriever.sync_documents, DOCUMENTS_DIRECTORY)
+            else:
+                profile_countdown = RequestCountdown(requests)
+                await profile_countdown.wait(timeout)
+                headers["X-Profiled-Requests"] = str(profile_countdown.seen)
+    except Exception as e:
+        target = "sync" if sync else "requests"
+        logger.error(f"Profiling error ({target}): {str(e)}")
+        raise HTTPException(status_code=500, detail="Profiling failed")
+    finally:
+        profiler = profile_countdown = None
+
+    headers["X-Profile-Samples"] = str(taken.ticks)
+    return PlainTextResponse(taken.folded(), headers=headers)
+
+
+def is_ready() -> bool:
+    """Return True once there is a retriever and startup indexing has finished."""
+    return retriever is not None and (indexer is None or indexer.ready)
+
+
 # Implement health check endpoint
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
+    """
+    Report that the API is up, whether it is ready, and startup progress.
+
+    Always 200 while the process is serving; see /health/live and
+    /health/ready for probes.
+    """
+    startup = indexer.status() if indexer is not None else None
     if retriever is None:
+        state = startup["state"] if startup is not None else "not started"
         return HealthResponse(
             status="healthy",  # ← CHANGE HERE
-            message="API is running; retriever not initialized yet",
+            message=f"API is running; retriever not initialized yet ({state})",
             documents_indexed=0,
+            startup=startup,
         )
 
+    ready = is_ready()
     return HealthResponse(
         status="healthy",
-        message="API is running and ready",
+        message="API is running and ready" if ready else "API is running; indexing documents",
         documents_indexed=retriever.document_count,
+        cache=retriever.cache_stats(),
+        encode=retriever.encode_stats(),
+        ready=ready,
+        startup=startup,
     )
 
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: 200 whenever the event loop is responsive, even mid-indexing."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the documents are indexed, else 503 with
+    Retry-After and the startup state and progress.
+    """
+    startup = indexer.status() if indexer is not None else None
+    if not is_ready():
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "startup": startup},
+            headers={"Retry-After": retry_after()},
+        )
+    return {"ready": True, "startup": startup}
+
+
+def retriever_metrics() -> list:
+    """
+    Read the retriever's state for /metrics: index size, readiness, cache
+    hits and misses, and the embedding model's work so far.
+    """
+    metrics = [
+        ("retrieval_ready", "gauge", "1 once startup indexing has finished.", [({}, is_ready())]),
+    ]
+    if retriever is None:
+        return metrics
+
+    caches = retriever.cache_stats()
+    encode = retriever.encode_stats()
+    counts = [({"cache": name}, stats) for name, stats in caches.items() if stats is not None]
+    metrics += [
+        (
+            "retrieval_documents_indexed",
+            "gauge",
+            "Chunks in the index.",
+            [({}, retriever.document_count)],
+        ),
+        (
+            "retrieval_cache_hits_total",
+            "counter",
+            "Cache lookups answered from the cache.",
+            [(labels, stats["hits"]) for labels, stats in counts],
+        ),
+        (
+            "retrieval_cache_misses_total",
+            "counter",
+            "Cache lookups that missed.",
+            [(labels, stats["misses"]) for labels, stats in counts],
+        ),
+        (
+            "retrieval_cache_entries",
+            "gauge",
+            "Entries held by each cache.",
+            [(labels, stats["entries"]) for labels, stats in counts],
+        ),
+        (
+            "retrieval_encoded_texts_total",
+            "counter",
+            "Texts run through the embedding model.",
+            [({}, encode["texts"])],
+        ),
+        (
+            "retrieval_encoded_tokens_total",
+            "counter",
+            "Tokens run through the embedding model, padding excluded.",
+            [({}, encode["tokens"])],
+        ),
+        (
+            "retrieval_encode_seconds_total",
+            "counter",
+            "Seconds spent in the embedding model.",
+            [({}, encode["seconds"])],
+        ),
+    ]
+    return metrics
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage search and ingestion latency histograms,
+    ingestion counters, cache hits, index size and model load time.
+    """
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 # Add error handler for general exceptions
 @app.exception_handler(Exception)
 async def general_exception_handler(_request, exc):
@@ -0,0 +1,148 @@
+"""
+Manifest of indexed source files for the persistent vector store.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2  # 2: chunk ids start with the file name, not its stem
+
+
+def file_sha256(filepath: Path, block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """
+    Tracks which source files are in the index, and what they looked like
+    when they were embedded.
+
+    Each entry is keyed by the file's resolved path and records its size,
+    modification time (ns), SHA-256 of the contents and the ids of the chunks
+    it produced. Size + mtime is the cheap check; the hash is only computed
+    when those differ, so a touched-but-unchanged file is not re-embedded.
+
+    Args:
+        path: JSON file to persist to, or None to keep the manifest in memory
+        config: Settings the index was built with (model, chunking). A
+            persisted manifest built with different settings is discarded.
+    """
+
+    def __init__(self, path: str | Path | None = None, config: dict | None = None):
+        self.path = Path(path) if path is not None else None
+        self.config = dict(config or {})
+        self.files: dict[str, dict] = {}
+        self.stale = False  # True if a persisted index must be rebuilt
+
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        """Read the manifest from disk, discarding it if it doesn't match."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Warning: Ignoring unreadable manifest {self.path}: {e}")
+            self.stale = True
+            return
+
+        if data.get("version") != MANIFEST_VERSION or data.get("config") != self.config:
+            logger.info(f"Index settings changed; manifest {self.path} will be rebuilt")
+            self.stale = True
+            return
+
+        self.files = data.get("files", {})
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk (no-op when in memory)."""
+        if self.path is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        data = {"version": MANIFEST_VERSION, "config": self.config, "files": self.files}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.stale = False
+
+    def clear(self) -> None:
+        """Forget every file."""
+        self.files = {}
+
+    @staticmethod
+    def key(filepath: Path) -> str:
+        """Return the manifest key for a file."""
+        return str(Path(filepath).resolve())
+
+    def get(self, filepath: Path) -> dict | None:
+        """Return the entry for a file, or None if it isn't indexed."""
+        return self.files.get(self.key(filepath))
+
+    def is_current(self, filepath: Path) -> bool:
+        """
+        Check whether a file is unchanged since it was indexed.
+
+        Size and mtime are compared first; only if they differ is the file
+        hashed. A matching hash refreshes the stored stat so the next check
+        is cheap again.
+        """
+        entry = self.get(filepath)
+        if entry is None:
+            return False
+
+        stat = Path(filepath).stat()
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+
+        if entry["size"] != stat.st_size or entry["sha256"] != file_sha256(filepath):
+            return False
+
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    @staticmethod
+    def fingerprint(filepath: Path) -> dict:
+        """
+        Return the size, mtime and hash of a file. Take this *before* loading
+        the file so an edit made during indexing is picked up next time.
+        """
+        stat = Path(filepath).stat()
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(filepath),
+        }
+
+    def record(self, filepath: Path, fingerprint: dict, ids: list[str]) -> None:
+        """Record a file as indexed with the given fingerprint and chunk ids."""
+        self.files[self.key(filepath)] = {**fingerprint, "ids": list(ids)}
+
+    def remove(self, filepath: Path | str) -> dict | None:
+        """Forget a file, returning its old entry (if any)."""
+        return self.files.pop(self.key(filepath), None)
+
+    def __contains__(self, filepath) -> bool:
+        return self.key(filepath) in self.files
+
+    def __len__(self) -> int:
+        return len(self.files)
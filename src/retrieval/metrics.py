@@ -0,0 +1,354 @@
+"""
+Counters, gauges and latency histograms, exposed in the Prometheus text
+format at /metrics.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# upper bounds (seconds) of the latency buckets, from sub-millisecond
+# searches to syncs of a large corpus
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+# seconds per stage of the request being served, while request_times() is active
+_request_times: ContextVar[dict[str, float] | None] = ContextVar("request_times", default=None)
+
+
+@contextmanager
+def request_times() -> Iterator[dict[str, float]]:
+    """
+    Collect the seconds spent in each stage (of histograms made with
+    per_request=True) within this block, keyed by stage.
+
+    Threads started with run_in_threadpool copy the context, so stages run
+    there are collected too.
+    """
+    times: dict[str, float] = {}
+    token = _request_times.set(times)
+    try:
+        yield times
+    finally:
+        _request_times.reset(token)
+
+
+def current_request_times() -> dict[str, float] | None:
+    """Return the stage times being collected in this context, if any."""
+    return _request_times.get()
+
+
+class _Metric:
+    """A named metric with one value (or histogram) per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, values: tuple) -> tuple:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {values}")
+        return values
+
+    def value(self, *labels: str) -> float:
+        """Return the value for these label values (0 if never set)."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def lines(self) -> list[str]:
+        """Return the metric's sample lines."""
+        with self._lock:
+            values = dict(self._values)
+        return [
+            _sample(self.name, dict(zip(self.labels, key)), value) for key, value in values.items()
+        ]
+
+
+class Counter(_Metric):
+    """A count that only goes up, e.g. chunks ingested."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        if not labels:
+            self._values[()] = 0.0  # report 0 before the first increment
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Add amount (>= 0) to the count for these label values."""
+        if amount < 0:
+            raise ValueError("A counter can only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. seconds the model took to load."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the value for these label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Observations counted into cumulative buckets, for latency percentiles.
+
+    Each observation costs a bisect and a locked update, so histograms can
+    sit on the search path. With per_request, observations are also added
+    to the request's stage times (see request_times), under the first label
+    value.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        per_request: bool = False,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.per_request = per_request
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation for these label values."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [count per bucket, with a last one for +Inf], sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+        if self.per_request:
+            times = _request_times.get()
+            if times is not None:
+                stage = labels[0] if labels else self.name
+                times[stage] = times.get(stage, 0.0) + value
+
+    def value(self, *labels: str) -> float:
+        """Return how many observations were made for these label values."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state is not None else 0
+
+    def time(self, *labels: str) -> _Timer:
+        """Context manager observing how long its block takes, in seconds."""
+        return _Timer(self, labels)
+
+    def lines(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(_sample(f"{self.name}_bucket", {**labels, "le": le}, cumulative))
+            lines.append(_sample(f"{self.name}_sum", labels, total))
+            lines.append(_sample(f"{self.name}_count", labels, cumulative))
+        return lines
+
+
+class _Timer:
+    """Times a block into a histogram (see Histogram.time)."""
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    """
+    The metrics to expose, plus collectors that read values (e.g. cache hit
+    counts kept elsewhere) at scrape time instead of on the hot path.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable]] = []
+        self._lock = threading.Lock()
+
+    def add(self, metric: _Metric) -> _Metric:
+        """Register a metric; its name must be unused."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.add(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.add(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        per_request: bool = False,
+    ) -> Histogram:
+        return self.add(Histogram(name, documentation, labels, per_request=per_request))
+
+    def register(self, collect: Callable[[], Iterable]) -> None:
+        """
+        Add a collector, called on every render.
+
+        Args:
+            collect: Returns (name, kind, documentation, samples) tuples,
+                kind being "counter" or "gauge" and samples (labels, value)
+                pairs
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def unregister(self, collect: Callable[[], Iterable]) -> None:
+        """Remove a collector added by register()."""
+        with self._lock:
+            if collect in self._collectors:
+                self._collectors.remove(collect)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        blocks = [(m.name, m.kind, m.documentation, m.lines()) for m in metrics]
+        for collect in collectors:
+            for name, kind, documentation, samples in collect():
+                lines = [_sample(name, labels, value) for labels, value in samples]
+                blocks.append((name, kind, documentation, lines))
+
+        out = []
+        for name, kind, documentation, lines in blocks:
+            out.append(f"# HELP {name} {_escape_help(documentation)}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def _sample(name: str, labels: dict, value: float) -> str:
+    """Format one sample line."""
+    if labels:
+        pairs = ",".join(f'{key}="{_escape_label(str(v))}"' for key, v in labels.items())
+        name = f"{name}{{{pairs}}}"
+    return f"{name} {_number(value)}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+# the metrics the package records, rendered by /metrics
+REGISTRY = Registry()
+
+# search: one observation per store call, so a batch of queries counts once;
+# stages are "cache" (result cache lookups), "embed" (query embedding),
+# "collection" (the backend's nearest-neighbor query), "format" (turning
+# the backend's rows into result dicts) and "lexical" (BM25 ranking and
+# fusion, in lexical and hybrid mode)
+SEARCH_SECONDS = REGISTRY.histogram(
+    "retrieval_search_seconds", "Time to answer a search call, by mode.", ("mode",)
+)
+SEARCH_STAGE_SECONDS = REGISTRY.histogram(
+    "retrieval_search_stage_seconds",
+    "Time spent in each stage of a search call.",
+    ("stage",),
+    per_request=True,  # reported per /search response in its Server-Timing header
+)
+
+# ingestion: "load" is the wait for a file's chunks, "embed" and "store" are
+# per batch; the stages overlap, since the ingestion pipeline runs them
+# concurrently
+SYNC_SECONDS = REGISTRY.histogram("retrieval_sync_seconds", "Time to sync the index.")
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "retrieval_ingest_stage_seconds", "Time spent in each ingestion stage.", ("stage",)
+)
+INGESTED_FILES = REGISTRY.counter("retrieval_ingested_files_total", "Files (re)indexed.")
+INGESTED_CHUNKS = REGISTRY.counter("retrieval_ingested_chunks_total", "Chunks (re)indexed.")
+INGESTED_BYTES = REGISTRY.counter("retrieval_ingested_bytes_total", "Bytes of files (re)indexed.")
+DUPLICATE_CHUNKS = REGISTRY.counter(
+    "retrieval_duplicate_chunks_total", "Chunks indexed with a copy's embedding."
+)
+
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+    "retrieval_model_load_seconds",
+    "Seconds the embedding model took to load, by model and backend.",
+    ("model", "backend"),
+)
@@ -0,0 +1,307 @@
+"""
+Streaming ingestion: loader -> embedder -> store in bounded batches.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+from retrieval.dedup import DuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # end-of-stream marker passed between stages
+
+
+class IngestionCancelled(Exception):
+    """Raised by IngestionPipeline.run() when it is cancelled part way."""
+
+
+class _Batch:
+    """A batch of documents and the groups whose last document it holds."""
+
+    def __init__(self):
+        self.documents: list[dict] = []
+        self.finished: list[tuple[Any, list[str]]] = []  # (key, ids) of completed groups
+        self.embeddings = None
+
+
+class IngestionPipeline:
+    """
+    Runs loading, embedding and storing as three overlapping stages.
+
+    Documents arrive in groups (one group per source file) from an iterable
+    that is consumed on a loader thread. They are cut into fixed-size
+    batches, embedded on a second thread and written on the calling thread.
+    The stages are joined by bounded queues, so while batch N is being
+    embedded batch N+1 is being loaded, and at most ``queue_size`` batches
+    wait between any two stages. Memory stays proportional to the batch
+    size rather than the corpus.
+
+    With ``duplicates`` set, each document is checked against it as it is
+    loaded. A copy (exact or near) of a document seen before is not
+    embedded: it gets a ``duplicate_of`` metadata entry naming the
+    original and is stored with the original's embedding, taken from its
+    batch or, once stored, from ``lookup``.
+
+    Args:
+        embed: Function mapping a list of texts to an embedding matrix
+        write: Function storing a list of documents with their embeddings
+        batch_size: Documents per batch
+        queue_size: Batches allowed to wait between two stages
+        duplicates: Registry of the distinct documents indexed so far, or
+            None to embed every document
+        lookup: Function mapping stored ids to their embeddings (a dict,
+            skipping unknown ids); required with duplicates
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[str]], Any],
+        write: Callable[[list[dict], Any], None],
+        batch_size: int = 64,
+        queue_size: int = 2,
+        duplicates: DuplicateIndex | None = None,
+        lookup: Callable[[list[str]], dict] | None = None,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be >= 1")
+        if duplicates is not None and lookup is None:
+            raise ValueError("lookup is required to reuse the embeddings of duplicates")
+
+        self.embed = embed
+        self.write = write
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.duplicates = duplicates
+        self.lookup = lookup
+
+        self.documents_loaded = 0
+        self.documents_embedded = 0
+        self.duplicates_found = 0
+        self.documents_stored = 0
+        self.groups_loaded = 0
+        self.groups_done = 0
+
+    def run(
+        self,
+        groups: Iterable[tuple[Any, list[dict]]],
+        on_group_done: Callable[[Any, list[str]], None] | None = None,
+        cancel: threading.Event | None = None,
+    ) -> int:
+        """
+        Push every group's documents through the pipeline.
+
+        Args:
+            groups: Iterable of (key, documents), e.g. (filepath, chunks)
+            on_group_done: Called on this thread with (key, ids) once every
+                document of a group has been stored, in input order
+            cancel: Event that, once set, stops the run before its next
+                batch is stored; the batches stored so far are kept
+
+        Returns:
+            Number of documents stored
+
+        Raises:
+            IngestionCancelled: If cancel was set before the run finished
+        """
+        loaded: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embedded: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors: list[BaseException] = []
+
+        loader = threading.Thread(
+            target=self._stage,
+            args=(self._load, (groups, loaded, stop), stop, errors),
+            name="ingest-load",
+            daemon=True,
+        )
+        embedder = threading.Thread(
+            target=self._stage,
+            args=(self._embed, (loaded, embedded, stop), stop, errors),
+            name="ingest-embed",
+            daemon=True,
+        )
+        loader.start()
+        embedder.start()
+
+        try:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise IngestionCancelled(
+                        f"Cancelled after storing {self.documents_stored} documents"
+                    )
+                try:
+                    batch = embedded.get(timeout=0.1)
+                except queue.Empty:
+                    if embedder.is_alive():
+                        continue
+                    break  # the embed stage stopped without finishing: it failed
+                if batch is _DONE:
+                    break
+                if batch.documents:
+                    if self.duplicates is not None:
+                        batch.embeddings = self._with_duplicates(batch)
+                    self.write(batch.documents, batch.embeddings)
+                    self.documents_stored += len(batch.documents)
+                for key, ids in batch.finished:
+                    self.groups_done += 1
+                    if on_group_done is not None:
+                        on_group_done(key, ids)
+                logger.debug(
+                    f"Stored {self.documents_stored} documents from {self.groups_done} files"
+                )
+        finally:
+            # unblock and wind down the other stages if we stopped early
+            stop.set()
+            _drain(loaded)
+            _drain(embedded)
+            loader.join()
+            embedder.join()
+
+        if errors:
+            raise errors[0]
+        return self.documents_stored
+
+    @staticmethod
+    def _stage(work, args, stop: threading.Event, errors: list) -> None:
+        """Run a stage, recording its error and stopping the others on failure."""
+        try:
+            work(*args)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def _load(self, groups, loaded: queue.Queue, stop: threading.Event) -> None:
+        """Stage 1: cut the incoming groups into batches."""
+        groups = iter(groups)
+        try:
+            batch = _Batch()
+            for key, documents in groups:
+                ids = []
+                for doc in documents:
+                    if self.duplicates is not None:
+                        self._mark_duplicate(doc)
+                    batch.documents.append(doc)
+                    ids.append(doc["id"])
+                    self.documents_loaded += 1
+                    if len(batch.documents) == self.batch_size:
+                        if not _put(loaded, batch, stop):
+                            return
+                        batch = _Batch()
+                batch.finished.append((key, ids))
+                self.groups_loaded += 1
+
+            if batch.documents or batch.finished:
+                _put(loaded, batch, stop)
+            _put(loaded, _DONE, stop)
+        finally:
+            # release the source (e.g. the loader's process pool) if we quit early
+            close = getattr(groups, "close", None)
+            if close is not None:
+                close()
+
+    def _embed(self, loaded: queue.Queue, embedded: queue.Queue, stop: threading.Event) -> None:
+        """Stage 2: embed each batch's texts."""
+        while True:
+            batch = _get(loaded, stop)
+            if batch is _DONE:
+                _put(embedded, _DONE, stop)
+                return
+            texts = [
+                doc["text"]
+                for doc in batch.documents
+                if self.duplicates is None or not _duplicate_of(doc)
+            ]
+            if texts:
+                batch.embeddings = self.embed(texts)
+                self.documents_embedded += len(texts)
+            if not _put(embedded, batch, stop):
+                return
+
+    def _mark_duplicate(self, doc: dict) -> None:
+        """Register a document, or point it at the one it copies."""
+        match = self.duplicates.observe(doc["id"], doc["text"])
+        if match is None:
+            return
+        original, similarity = match
+        doc["metadata"] = {
+            **(doc.get("metadata") or {}),
+            "duplicate_of": original,
+            "duplicate_similarity": round(similarity, 4),
+        }
+        self.duplicates_found += 1
+
+    def _with_duplicates(self, batch: _Batch):
+        """Return one embedding per document, reusing the originals' for copies."""
+        copies = [doc for doc in batch.documents if _duplicate_of(doc)]
+        if not copies:
+            return batch.embeddings
+
+        vectors = {}  # document id -> embedding
+        unique = iter(batch.embeddings if batch.embeddings is not None else [])
+        for doc in batch.documents:
+            if not _duplicate_of(doc):
+                vectors[doc["id"]] = next(unique)
+        # originals from earlier batches are stored by now
+        missing = sorted({_duplicate_of(doc) for doc in copies} - vectors.keys())
+        if missing:
+            vectors.update(self.lookup(missing))
+
+        rows = [vectors.get(_duplicate_of(doc) or doc["id"]) for doc in batch.documents]
+        # an original deleted since it was seen leaves its copies to be embedded
+        orphans = [i for i, row in enumerate(rows) if row is None]
+        if orphans:
+            texts = [batch.documents[i]["text"] for i in orphans]
+            for i, vector in zip(orphans, self.embed(texts)):
+                rows[i] = vector
+            self.documents_embedded += len(orphans)
+        return np.stack([np.asarray(row, dtype=np.float32) for row in rows])
+
+
+def _duplicate_of(doc: dict) -> str | None:
+    """Return the id of the document a document copies, if any."""
+    return (doc.get("metadata") or {}).get("duplicate_of")
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put onto a bounded queue, giving up (False) once stop is set."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Take from a queue, returning the end marker once stop is set."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _drain(q: queue.Queue) -> None:
+    """Discard anything left in a queue."""
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
@@ -0,0 +1,212 @@
+"""
+Per-request timing breakdowns (the Server-Timing header) and an on-demand
+sampling profiler.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable
+
+from retrieval.metrics import request_times
+
+# innermost frames of threads that are waiting, not working (an idle thread
+# pool, the event loop's select); their samples are dropped
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def server_timing(times: dict[str, float], total: float) -> str:
+    """
+    Format stage times as a Server-Timing header value.
+
+    Args:
+        times: Seconds per stage
+        total: Seconds for the whole request
+
+    Returns:
+        e.g. "embed;dur=12.1, collection;dur=0.9, total;dur=14.2" (milliseconds)
+    """
+    metrics = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in times.items()]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header to the responses of some
+    paths: the time each search stage took while serving the request, and
+    the total. A total well above the sum of the stages points at time
+    spent elsewhere, e.g. waiting for a blocked event loop.
+
+    Args:
+        app: The ASGI app to wrap
+        paths: Path prefixes whose responses get the header
+        on_response: Called on the event loop after each of their
+            responses has been sent (e.g. to count profiled requests)
+    """
+
+    def __init__(
+        self,
+        app,
+        paths: tuple[str, ...] = ("/search",),
+        on_response: Callable[[], None] | None = None,
+    ):
+        self.app = app
+        self.paths = paths
+        self.on_response = on_response
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        with request_times() as times:
+
+            async def send_with_timing(message) -> None:
+                if message["type"] == "http.response.start":
+                    value = server_timing(times, time.perf_counter() - start)
+                    headers = [*message.get("headers", []), (b"server-timing", value.encode())]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                if self.on_response is not None:
+                    self.on_response()
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread at a fixed interval, from a
+    background thread, and counts them in the folded format that
+    flamegraph.pl, speedscope and other flame graph tools read: one line
+    per distinct stack, "thread;outer;...;inner count".
+
+    Nothing runs until start(), so a profiler that isn't running costs
+    nothing. While it runs, each sample walks every thread's stack; at the
+    default 5 ms interval that slows the profiled code too little to
+    measure.
+
+    Args:
+        interval: Seconds between samples
+        include_idle: Keep samples of threads waiting in IDLE_FRAMES
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        if interval <= 0:
+            raise ValueError("interval must be > 0")
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples: Counter[str] = Counter()
+        self.ticks = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start sampling in a background thread."""
+        if self._thread is not None:
+            raise RuntimeError("The profiler is already running")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling; the samples so far are kept."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self) -> SamplingProfiler:
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self.samples[";".join([names.get(ident, str(ident)), *stack])] += 1
+            self.ticks += 1
+
+    def _stack(self, frame) -> list[str] | None:
+        """Return a frame's stack, outermost first, or None if the thread is idle."""
+        leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        if not self.include_idle and leaf in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def folded(self) -> str:
+        """Return the samples as folded stacks, the most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class RequestCountdown:
+    """
+    Counts responses down to zero, so a caller can wait for the next N.
+
+    count() is meant for the event loop thread, e.g. as a
+    ServerTimingMiddleware on_response hook.
+
+    Args:
+        requests: Responses to wait for
+    """
+
+    def __init__(self, requests: int):
+        self.requests = requests
+        self.seen = 0
+        self._done = asyncio.Event()
+        if requests <= 0:
+            self._done.set()
+
+    def count(self) -> None:
+        """Count one response."""
+        self.seen += 1
+        if self.seen >= self.requests:
+            self._done.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Wait until the responses have been counted.
+
+        Returns:
+            True if they were, False if the timeout passed first
+        """
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -0,0 +1,193 @@
+"""
+Compact codes for embedding vectors, used for a coarse first search pass.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+QUANTIZATIONS = ("float16", "int8", "binary")
+
+BLOCK_ROWS = 16384  # rows scored per step, bounding temporary memory
+
+
+class Quantizer(ABC):
+    """
+    Encodes unit vectors into compact codes and scores queries against them.
+
+    Scores only need to rank documents roughly; the best candidates are
+    rescored against the full-precision vectors afterwards.
+
+    Args:
+        dim: Embedding dimension
+    """
+
+    name = ""
+    dtype = np.float32
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    @property
+    def width(self) -> int:
+        """Columns in a code matrix."""
+        return self.dim
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Return one code row per vector."""
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Return a (queries, codes) float32 matrix where higher means closer."""
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for lo in range(0, len(codes), BLOCK_ROWS):
+            scores[:, lo : lo + BLOCK_ROWS] = self._score_block(
+                queries, codes[lo : lo + BLOCK_ROWS]
+            )
+        return scores
+
+    @abstractmethod
+    def _score_block(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Score queries against one block of codes."""
+
+    def refit(self, vectors: np.ndarray) -> bool:
+        """
+        Adjust calibration so it covers these vectors.
+
+        Returns:
+            True if codes encoded before this call must be re-encoded
+        """
+        return False
+
+    def state(self) -> dict:
+        """Return the calibration as JSON-friendly data, to save next to the codes."""
+        return {}
+
+    def load_state(self, state: dict) -> None:
+        """Restore calibration saved by state()."""
+
+
+class Float16Quantizer(Quantizer):
+    """Half-precision copy of each vector: 2 bytes per dimension."""
+
+    name = "float16"
+    dtype = np.float16
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16)
+
+    def _score_block(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # numpy has no fast float16 matmul, so widen one block at a time
+        return queries @ codes.astype(np.float32).T
+
+
+class Int8Quantizer(Quantizer):
+    """
+    Per-dimension symmetric scalar quantization: 1 byte per dimension.
+
+    Each dimension d is stored as round(x_d / scale_d * 127). Scales start
+    a little above the largest value seen and only ever widen; when they
+    do, existing codes are re-encoded.
+    """
+
+    name = "int8"
+    dtype = np.int8
+    HEADROOM = 1.25  # extra range left for values not seen yet
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.scale: np.ndarray | None = None
+
+    def refit(self, vectors: np.ndarray) -> bool:
+        if len(vectors) == 0:
+            return False
+        seen = np.abs(vectors).max(axis=0)
+        if self.scale is None:
+            self.scale = np.clip(seen * self.HEADROOM, 1e-6, 1.0).astype(np.float32)
+            return False
+        if np.all(seen <= self.scale):
+            return False
+        self.scale = np.clip(np.maximum(self.scale, seen * self.HEADROOM), 1e-6, 1.0).astype(
+            np.float32
+        )
+        return True
+
+    def state(self) -> dict:
+        return {"scale": self.scale.tolist() if self.scale is not None else None}
+
+    def load_state(self, state: dict) -> None:
+        if state.get("scale") is not None:
+            self.scale = np.array(state["scale"], dtype=np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint(vectors / self.scale * 127)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def _score_block(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # fold the per-dimension scales into the query instead of the codes
+        return (queries * (self.scale / 127)) @ codes.astype(np.float32).T
+
+
+class BinaryQuantizer(Quantizer):
+    """
+    One bit per dimension, packed 8 to a byte. Queries are ranked by
+    Hamming distance between bit patterns.
+
+    A bit records whether a value is above that dimension's mean rather
+    than above zero: embeddings are rarely centered, and uncentered
+    dimensions would set the same bit for nearly every document. The means
+    come from the first vectors seen and then stay fixed.
+    """
+
+    name = "binary"
+    dtype = np.uint8
+    QUERY_BLOCK_BYTES = 1 << 26  # cap on the XOR temporary per step
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.threshold: np.ndarray | None = None
+
+    @property
+    def width(self) -> int:
+        return (self.dim + 7) // 8
+
+    def refit(self, vectors: np.ndarray) -> bool:
+        if self.threshold is None and len(vectors):
+            self.threshold = vectors.mean(axis=0).astype(np.float32)
+        return False
+
+    def state(self) -> dict:
+        return {"threshold": self.threshold.tolist() if self.threshold is not None else None}
+
+    def load_state(self, state: dict) -> None:
+        if state.get("threshold") is not None:
+            self.threshold = np.array(state["threshold"], dtype=np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        threshold = self.threshold if self.threshold is not None else 0.0
+        return np.packbits(vectors > threshold, axis=1)
+
+    def _score_block(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        query_codes = self.encode(queries)
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        step = max(1, self.QUERY_BLOCK_BYTES // max(1, codes.size))
+        for lo in range(0, len(queries), step):
+            diff = query_codes[lo : lo + step, None, :] ^ codes[None, :, :]
+            scores[lo : lo + step] = -np.bitwise_count(diff).sum(axis=2, dtype=np.int32)
+        return scores
+
+
+def make_quantizer(name: str, dim: int) -> Quantizer:
+    """Return the quantizer called name ("float16", "int8" or "binary")."""
+    quantizers = {cls.name: cls for cls in (Float16Quantizer, Int8Quantizer, BinaryQuantizer)}
+    if name not in quantizers:
+        raise ValueError(f"Unknown quantization {name!r}; expected one of {QUANTIZATIONS}")
+    return quantizers[name](dim)
@@ -1,22 +1,239 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so processes can't coordinate syncs
+    fcntl = None
+
+from retrieval.dedup import DuplicateIndex
 from retrieval.embeddings import DocumentEmbedder
 from retrieval.loader import DocumentChunker, DocumentLoader
+from retrieval.manifest import IndexManifest
+from retrieval.metrics import (
+    DUPLICATE_CHUNKS,
+    INGEST_STAGE_SECONDS,
+    INGESTED_BYTES,
+    INGESTED_CHUNKS,
+    INGESTED_FILES,
+    SYNC_SECONDS,
+)
+from retrieval.pipeline import IngestionCancelled, IngestionPipeline
 from retrieval.store import VectorStore
 
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+LOCK_FILENAME = "sync.lock"
+
+
+class SyncProgress:
+    """
+    How far a sync has got. It is updated by the syncing thread and can be
+    read from any other (e.g. by a health check) while the sync runs.
+
+    Args:
+        files: Fingerprints (with 'size') of the files to be indexed, by path
+    """
+
+    def __init__(self, files: dict):
+        self.started = time.monotonic()
+        self.finished: float | None = None
+        self.files_total = len(files)
+        self.bytes_total = sum(fingerprint["size"] for fingerprint in files.values())
+        self.files_done = 0
+        self.bytes_done = 0
+        self.pipeline: IngestionPipeline | None = None
+
+    def file_done(self, size: int) -> None:
+        """Count a file whose chunks are all stored."""
+        self.files_done += 1
+        self.bytes_done += size
+
+    def stats(self) -> dict:
+        """
+        Return the sync's counters.
+
+        Returns:
+            Dict with 'running', 'files_total', 'files_loaded', 'files_done',
+            'chunks_loaded', 'chunks_embedded', 'chunks_stored',
+            'elapsed_seconds' and 'eta_seconds'. The ETA extrapolates from
+            the bytes of the files done so far, so it is None until the
+            first file is done.
+        """
+        pipeline = self.pipeline
+        now = self.finished if self.finished is not None else time.monotonic()
+        elapsed = now - self.started
+        eta = None
+        if self.finished is not None:
+            eta = 0.0
+        elif self.bytes_done:
+            eta = elapsed * (self.bytes_total - self.bytes_done) / self.bytes_done
+        return {
+            "running": self.finished is None,
+            "files_total": self.files_total,
+            "files_loaded": pipeline.groups_loaded if pipeline else 0,
+            "files_done": self.files_done,
+            "chunks_loaded": pipeline.documents_loaded if pipeline else 0,
+            "chunks_embedded": pipeline.documents_embedded if pipeline else 0,
+            "chunks_stored": pipeline.documents_stored if pipeline else 0,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
+
 
 class DocumentRetriever:
     """High-level interface for document retrieval."""
 
-    def __init__(self, chunk_size: int = 300, overlap: int = 30):
-        """Initialize retriever with default components."""
-        chunker = DocumentChunker(chunk_size=chunk_size, overlap=overlap)
-        self.loader = DocumentLoader(chunker=chunker)
-        self.store = VectorStore(DocumentEmbedder())
-        self._indexed = False  # flag to indicate we've done some indexing
+    def __init__(
+        self,
+        chunk_size: int = 300,
+        overlap: int = 30,
+        persist_directory: str | None = None,
+        embedding_cache_dir: str | None = None,
+        load_workers: int | None = 1,
+        batch_size: int = 64,
+        query_cache_size: int = 1024,
+        query_cache_ttl: float | None = None,
+        result_cache_size: int = 1024,
+        backend: str = "chroma",
+        quantization: str | None = None,
+        chunk_unit: str = "words",
+        dedup: bool = True,
+        near_duplicate_threshold: float | None = 0.9,
+        embedding_backend: str = "torch",
+        encode_batch_size: int = 32,
+        max_batch_tokens: int = 8192,
+        encode_workers: int | None = 1,
+        embedder: DocumentEmbedder | None = None,
+    ):
+        """
+        Initialize retriever with default components.
+
+        Args:
+            chunk_size: Words (or tokens) per chunk
+            overlap: Words (or tokens) shared between consecutive chunks
+            persist_directory: Directory for an on-disk index that survives
+                restarts. If None, the index lives in memory only.
+            embedding_cache_dir: Directory for the disk-backed embedding
+                cache. If None, embeddings aren't cached.
+            load_workers: Processes used to load and extract files (None for
+                one per CPU)
+            batch_size: Chunks embedded and stored per batch while indexing;
+                with encode_workers > 1, per worker
+            query_cache_size: Query embeddings kept in an in-memory LRU
+                cache (0 disables it)
+            query_cache_ttl: Seconds before a cached query embedding expires
+                (None for never)
+            result_cache_size: Search results kept in an in-memory LRU
+                cache, invalidated whenever the index changes (0 disables it)
+            backend: Search backend, "chroma" (approximate) or "numpy" (exact)
+            quantization: With the numpy backend, search compact "float16",
+                "int8" or "binary" codes first and rescore the best candidates
+            chunk_unit: "words", or "tokens" to size chunks with the embedding
+                model's tokenizer; token chunks are capped at the model's
+                input limit, so none of a chunk is silently truncated
+            dedup: Embed each distinct chunk once; copies of a chunk already
+                indexed are stored with its embedding and a 'duplicate_of'
+                reference to it
+            near_duplicate_threshold: Estimated Jaccard similarity (MinHash)
+                from which a chunk counts as a copy, or None to treat only
+                exact copies as duplicates
+            embedding_backend: How the embedding model runs: "torch"
+                (fp32), "int8" (dynamically quantized PyTorch), "onnx" or
+                "onnx-int8" (ONNX Runtime)
+            encode_batch_size: Most texts per model batch; texts are
+                bucketed by token length to minimize padding
+            max_batch_tokens: Most token slots per model batch, padding
+                included, so batches of short texts are larger
+            encode_workers: Processes that embed chunks while indexing,
+                each with its own replica of the model (None for one per
+                CPU). 1 embeds in this process; more is meant for bulk
+                (re)indexing, since the replicas load on every sync that
+                has chunks to embed. Queries always embed in this process.
+            embedder: Embedder to use instead of building one from the
+                settings above, e.g. a stub that skips the model in
+                benchmarks; it must offer DocumentEmbedder's interface
+        """
+        if chunk_unit not in ("words", "tokens"):
+            raise ValueError(f"Unknown chunk_unit {chunk_unit!r}; expected 'words' or 'tokens'")
+
+        if embedder is None:
+            embedder = DocumentEmbedder(
+                cache_dir=embedding_cache_dir,
+                query_cache_size=query_cache_size,
+                query_cache_ttl=query_cache_ttl,
+                backend=embedding_backend,
+                batch_size=encode_batch_size,
+                max_batch_tokens=max_batch_tokens,
+            )
+        self.embedder = embedder
+        tokenizer = None
+        if chunk_unit == "tokens":
+            tokenizer = self.embedder.tokenizer
+            chunk_size = min(chunk_size, self.embedder.max_tokens)
+            overlap = min(overlap, chunk_size - 1)
+        chunker = DocumentChunker(chunk_size=chunk_size, overlap=overlap, tokenizer=tokenizer)
+        self.loader = DocumentLoader(chunker=chunker, workers=load_workers)
+        self.store = VectorStore(
+            self.embedder,
+            persist_directory=persist_directory,
+            result_cache_size=result_cache_size,
+            backend=backend,
+            quantization=quantization,
+        )
+
+        self._manifest_path = self._lock_path = None
+        if persist_directory is not None:
+            self._manifest_path = Path(persist_directory) / MANIFEST_FILENAME
+            self._lock_path = Path(persist_directory) / LOCK_FILENAME
+        self._config = {
+            "model_name": self.embedder.model_name,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "chunk_unit": chunk_unit,
+            "backend": backend,
+        }
+        if embedding_backend != "torch":
+            # its vectors differ slightly from fp32 ones; don't mix the two in one index
+            self._config["embedding_backend"] = embedding_backend
+        self.manifest = IndexManifest(self._manifest_path, config=self._config)
+        with _process_lock(self._lock_path):
+            self._check_index()
+
+        # distinct chunks indexed, rebuilt from the store whenever it changed
+        # since the registry was last brought up to date
+        self.duplicates = DuplicateIndex(near_duplicate_threshold) if dedup else None
+        self._duplicates_generation = None
+
+        self._indexed = self.store.count() > 0  # flag to indicate we've done some indexing
+        self._sync_lock = threading.Lock()  # one sync at a time owns the manifest
+        self._closed = threading.Event()  # set by shutdown() to stop syncing
+        self.progress: SyncProgress | None = None  # of the running or last sync
+        self.batch_size = batch_size
+        self.encode_workers = encode_workers or os.cpu_count() or 1
+
+    def _check_index(self) -> None:
+        """Start over if the index and manifest on hand don't agree."""
+        # an index without a matching manifest can't be trusted
+        if self.manifest.stale or (len(self.manifest) == 0 and self.store.count() > 0):
+            self.store.reset()
+            self.manifest.clear()
+        elif self.store.count() == 0:
+            self.manifest.clear()  # the index was lost; re-embed everything
 
     def index_documents(self, directory: str):
         """
         Load and index documents from a directory.
 
+        Only new and changed files are embedded; see sync_documents().
+
         Args:
             directory: Path to the directory containing documents
 
@@ -24,18 +241,323 @@ class DocumentRetriever:
             Number of documents indexed
         """
         before = self.document_count
-        documents = self.loader.load_documents(directory)
-        self.store.add_documents(documents)
-        self._indexed = True
+        self.sync_documents(directory)
         return self.document_count - before
 
-    def search(self, query: str, n_results: int = 5) -> list[dict]:
-        """Search for documents relevant to the query."""
-        if not self._indexed:
+    def sync_documents(self, directory: str) -> dict:
+        """
+        Bring the index in line with the files currently in a directory.
+
+        New files are added, files that changed since they were indexed
+        (by size/mtime, then content hash) have their chunks upserted and any
+        leftover chunks deleted, and files that disappeared have their chunks
+        deleted. Unchanged files are not touched.
+
+        With a persist directory, syncs are serialized across processes by
+        a lock file, and each one starts from whatever the previous one
+        (from any process) left on disk.
+
+        While it runs, ``progress`` reports how far it has got.
+
+        Args:
+            directory: Path to the directory containing documents
+
+        Returns:
+            Dict of filename lists under 'added', 'updated', 'deleted' and
+            'unchanged'
+
+        Raises:
+            IngestionCancelled: If shutdown() was called; files finished
+                before that stay indexed
+        """
+        report = {"added": [], "updated": [], "deleted": [], "unchanged": []}
+
+        with self._sync_lock, _process_lock(self._lock_path), SYNC_SECONDS.time():
+            if self._closed.is_set():
+                raise IngestionCancelled("The retriever is shut down")
+            if self._manifest_path is not None:
+                # other processes serving this directory may have synced since
+                self.manifest = IndexManifest(self._manifest_path, config=self._config)
+                self.store.refresh()
+                self._check_index()
+
+            progress = pool = None
+            try:
+                files = self.loader.list_files(directory)
+                changed = {}
+                for filepath in files:
+                    if self.manifest.is_current(filepath):
+                        report["unchanged"].append(filepath.name)
+                    else:
+                        changed[filepath] = self.manifest.fingerprint(filepath)
+                removed = self._removed_files(directory, files)
+                if changed or removed:
+                    # only a sync with something to embed or delete needs the registry
+                    self._load_duplicates()
+                progress = self.progress = SyncProgress(changed)
+                touched = set()  # chunks rewritten or deleted, whose copies may be stale
+
+                def file_done(filepath: Path, ids: list[str]) -> None:
+                    # every chunk is upserted by now; drop ones the new version lacks
+                    old = self.manifest.get(filepath)
+                    touched.update(ids)
+                    if old is not None:
+                        self._delete(sorted(set(old["ids"]) - set(ids)))
+                        touched.update(old["ids"])
+                    self.manifest.record(filepath, changed[filepath], ids)
+                    report["updated" if old is not None else "added"].append(filepath.name)
+                    progress.file_done(changed[filepath]["size"])
+                    INGESTED_FILES.inc()
+                    INGESTED_CHUNKS.inc(amount=len(ids))
+                    INGESTED_BYTES.inc(amount=changed[filepath]["size"])
+
+                embed = self.embedder.embed_documents
+                batch_size = self.batch_size
+                if self.encode_workers > 1:
+                    # started on the first chunk to embed, stopped with the sync
+                    pool = self.embedder.pool(self.encode_workers)
+                    embed = partial(embed, pool=pool)
+                    # a batch is split across the workers, so give each a full one
+                    batch_size *= self.encode_workers
+                pipeline = IngestionPipeline(
+                    embed=_timed("embed", embed),
+                    write=_timed("store", self.store.upsert_documents),
+                    batch_size=batch_size,
+                    duplicates=self.duplicates,
+                    lookup=self.store.embeddings,
+                )
+                progress.pipeline = pipeline
+                try:
+                    stored = pipeline.run(
+                        _timed_loads(self.loader.load_files(changed)),
+                        on_group_done=file_done,
+                        cancel=self._closed,
+                    )
+                finally:
+                    DUPLICATE_CHUNKS.inc(amount=pipeline.duplicates_found)
+                if changed:
+                    logger.info(
+                        f"Indexed {stored} chunks from {len(changed)} files "
+                        f"({pipeline.duplicates_found} duplicates reused an embedding)"
+                    )
+
+                for filepath in removed:
+                    old = self.manifest.remove(filepath)
+                    self._delete(old["ids"])
+                    touched.update(old["ids"])
+                    report["deleted"].append(filepath.name)
+                if changed or removed:
+                    self._repair_copies(touched)
+                    self._duplicates_generation = self.store.generation
+            finally:
+                # keep whatever made it into the index, even if a file failed;
+                # the index goes to disk first so the manifest never runs ahead
+                self.store.flush()
+                self.manifest.save()
+                if progress is not None:
+                    progress.finished = time.monotonic()
+                if pool is not None:
+                    pool.close()
+
+        if self.embedder.cache is not None:
+            stats = self.embedder.cache.stats()
+            logger.info(
+                f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)"
+            )
+
+        self._indexed = True
+        return report
+
+    def shutdown(self) -> None:
+        """
+        Stop a sync in progress once its current batch is stored, and any
+        sync started later. What was indexed before that is kept.
+        """
+        self._closed.set()
+
+    def _load_duplicates(self) -> None:
+        """
+        Rebuild the duplicate registry if the index changed since it was current.
+
+        This hashes every distinct chunk, so it runs only when a sync has
+        files to embed or delete; a sync that finds everything current
+        (e.g. each worker's startup sync) never builds it.
+        """
+        if self.duplicates is None or self._duplicates_generation == self.store.generation:
+            return
+        self.duplicates.clear()
+        for doc_id, text, metadata in self.store.backend.documents():
+            # copies point at a registered chunk; only distinct ones are registered
+            if not (metadata or {}).get("duplicate_of"):
+                self.duplicates.add(doc_id, text)
+
+    def _repair_copies(self, originals: set[str]) -> None:
+        """
+        Re-check the copies of chunks that were rewritten or deleted.
+
+        A copy still pointing at a changed or deleted original would be
+        collapsed with text it no longer matches. Each one is looked up in
+        the registry again: it is pointed at the chunk it now copies and
+        takes its embedding, or, if it copies nothing, is registered as
+        distinct (so later copies point at it) and embedded.
+        """
+        if self.duplicates is None or not originals:
+            return
+        copy_ids = self.store.backend.matching_ids({"duplicate_of": {"$in": sorted(originals)}})
+        if not copy_ids:
+            return
+
+        copies, vectors, distinct = [], {}, []
+        for doc in self.store.backend.get(copy_ids):
+            metadata = {
+                key: value
+                for key, value in (doc["metadata"] or {}).items()
+                if key not in ("duplicate_of", "duplicate_similarity")
+            }
+            match = self.duplicates.observe(doc["id"], doc["text"])
+            if match is None:
+                distinct.append(doc)
+            else:
+                metadata["duplicate_of"] = match[0]
+                metadata["duplicate_similarity"] = round(match[1], 4)
+            copies.append({"id": doc["id"], "text": doc["text"], "metadata": metadata})
+
+        if distinct:
+            embedded = self.embedder.embed_documents([doc["text"] for doc in distinct])
+            vectors.update(zip([doc["id"] for doc in distinct], embedded))
+        pointed = {doc["metadata"].get("duplicate_of") for doc in copies} - {None}
+        pointed = sorted(pointed - vectors.keys())
+        if pointed:
+            vectors.update(self.store.embeddings(pointed))
+        embeddings = [vectors[doc["metadata"].get("duplicate_of") or doc["id"]] for doc in copies]
+        self.store.upsert_documents(copies, embeddings)
+        logger.info(
+            f"Re-checked {len(copies)} copies of changed chunks ({len(distinct)} now distinct)"
+        )
+
+    def _delete(self, ids: list[str]) -> None:
+        """Delete chunks from the index and the duplicate registry."""
+        self.store.delete_documents(ids)
+        if self.duplicates is not None:
+            self.duplicates.remove(ids)
+
+    def _removed_files(self, directory: str, files: list[Path]) -> list[Path]:
+        """Return indexed files from the directory that are no longer in it."""
+        directory = Path(directory).resolve()
+        present = {self.manifest.key(filepath) for filepath in files}
+        return [
+            Path(key)
+            for key in sorted(self.manifest.files)
+            if key not in present and Path(key).parent == directory
+        ]
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 5,
+        mode: str = "semantic",
+        where: dict | None = None,
+        collapse_duplicates: bool = False,
+    ) -> list[dict]:
+        """
+        Search for documents relevant to the query.
+
+        Args:
+            query: Search query text
+            n_results: Number of results to return
+            mode: "semantic", "lexical" or "hybrid"
+            where: Optional metadata filter (ChromaDB "where" syntax, see
+                filters.where_clause), applied before ranking
+            collapse_duplicates: Return one result per group of duplicate
+                chunks, listing the others' ids under 'duplicates'
+        """
+        self._check_indexed()
+        return self.store.search(query, n_results, where, mode, collapse_duplicates)
+
+    def search_many(
+        self,
+        queries: list[str],
+        n_results: int = 5,
+        mode: str = "semantic",
+        where: dict | None = None,
+        collapse_duplicates: bool = False,
+    ) -> list[list[dict]]:
+        """Search for several queries with one embedding call and one query."""
+        self._check_indexed()
+        return self.store.search_many(queries, n_results, where, mode, collapse_duplicates)
+
+    def _check_indexed(self) -> None:
+        """Refuse to search before anything is indexed; a sync in progress may be searched."""
+        if not self._indexed and self.store.count() == 0:
             raise ValueError("No documents indexed. Call index_documents() first.")
-        return self.store.search(query, n_results)
+
+    def cache_stats(self) -> dict:
+        """
+        Return stats for each enabled cache.
+
+        Returns:
+            Dict with 'results', 'query_embeddings' and 'embeddings' entries,
+            each a cache's stats() or None if that cache is disabled
+        """
+        caches = {
+            "results": self.store.result_cache,
+            "query_embeddings": self.embedder.query_cache,
+            "embeddings": self.embedder.cache,
+        }
+        return {
+            name: cache.stats() if cache is not None else None for name, cache in caches.items()
+        }
+
+    def encode_stats(self) -> dict:
+        """Return the embedding model's throughput (see EncodeStats.stats)."""
+        return self.embedder.encode_stats.stats()
 
     @property
     def document_count(self) -> int:
         """Return the number of indexed documents."""
         return self.store.count()
+
+
+def _timed(stage: str, work: Callable) -> Callable:
+    """Wrap an ingestion stage's callable so each call is timed."""
+
+    def timed(*args, **kwargs):
+        with INGEST_STAGE_SECONDS.time(stage):
+            return work(*args, **kwargs)
+
+    return timed
+
+
+def _timed_loads(groups: Iterable) -> Iterator:
+    """Yield the loader's (filepath, chunks) groups, timing the wait for each."""
+    groups = iter(groups)
+    try:
+        while True:
+            start = time.perf_counter()
+            group = next(groups, None)
+            if group is None:
+                return
+            INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, "load")
+            yield group
+    finally:
+        # closed early by the pipeline: release the loader's process pool now
+        close = getattr(groups, "close", None)
+        if close is not None:
+            close()
+
+
+@contextmanager
+def _process_lock(path: Path | None):
+    """Hold an exclusive lock on a file, so only one process changes an index at a time."""
+    if path is None or fcntl is None:
+        yield
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
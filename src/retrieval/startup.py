@@ -0,0 +1,167 @@
+"""
+Background startup: building the retriever and indexing documents while
+the API already serves requests.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from retrieval.pipeline import IngestionCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundIndexer:
+    """
+    Builds the retriever and indexes a directory on a worker thread, so the
+    event loop keeps answering health checks (and searches) meanwhile.
+
+    ``state`` moves from "loading" (building the retriever, which loads the
+    model) to "indexing" to "ready". An attempt that raises leaves it
+    "failed" until the next one, which starts after ``retry_seconds``,
+    doubling up to ``max_retry_seconds``. A retriever that was built is
+    kept, so a retry only repeats the indexing, and that skips the files
+    already indexed.
+
+    Args:
+        create: Function building the retriever
+        directory: Directory of documents to index
+        on_retriever: Coroutine function called with the retriever as soon
+            as it is built, before indexing starts
+        retry_seconds: Wait before the first retry
+        max_retry_seconds: Longest wait between retries
+    """
+
+    RETRY_AFTER_SECONDS = 5  # suggested to clients while no ETA is known
+    MAX_RETRY_AFTER_SECONDS = 60
+
+    def __init__(
+        self,
+        create: Callable[[], object],
+        directory: str,
+        on_retriever: Callable[[object], Awaitable[None]] | None = None,
+        retry_seconds: float = 5.0,
+        max_retry_seconds: float = 300.0,
+    ):
+        if retry_seconds <= 0 or max_retry_seconds < retry_seconds:
+            raise ValueError("need 0 < retry_seconds <= max_retry_seconds")
+
+        self.create = create
+        self.directory = directory
+        self.on_retriever = on_retriever
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+
+        self.retriever = None
+        self.state = "loading"
+        self.error: str | None = None
+        self.attempts = 0
+        self.documents_indexed: int | None = None  # added by the indexing, once ready
+
+        self._ready: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self) -> None:
+        """Start building and indexing in the background."""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background work, cancelling a sync in progress at its next batch."""
+        if self.retriever is not None:
+            self.retriever.shutdown()
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def wait_ready(self, timeout: float | None = None) -> bool:
+        """Wait until indexing finished; returns False on timeout."""
+        if self._ready is None:
+            return False
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self) -> None:
+        delay = self.retry_seconds
+        while True:
+            self.attempts += 1
+            try:
+                if self.retriever is None:
+                    self.state = "loading"
+                    retriever = await run_in_threadpool(self.create)
+                    self.retriever = retriever
+                    if self.on_retriever is not None:
+                        await self.on_retriever(retriever)
+
+                self.state = "indexing"
+                self.documents_indexed = await run_in_threadpool(
+                    self.retriever.index_documents, self.directory
+                )
+                self.state = "ready"
+                self.error = None
+                self._ready.set()
+                logger.info(f"Indexed {self.documents_indexed} documents; ready to serve")
+                return
+            except IngestionCancelled:
+                return  # stop() was called
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                logger.error(
+                    f"Startup attempt {self.attempts} failed: {e}; retrying in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_seconds)
+
+    def progress(self) -> dict | None:
+        """Return the retriever's sync progress (see SyncProgress.stats), if any."""
+        progress = getattr(self.retriever, "progress", None)
+        return progress.stats() if progress is not None else None
+
+    def retry_after(self) -> int:
+        """Seconds a client should wait before trying again, from the ETA when known."""
+        eta = (self.progress() or {}).get("eta_seconds") if self.state == "indexing" else None
+        if not eta:
+            return self.RETRY_AFTER_SECONDS
+        return max(1, min(math.ceil(eta), self.MAX_RETRY_AFTER_SECONDS))
+
+    def status(self) -> dict:
+        """
+        Return where startup has got.
+
+        Returns:
+            Dict with 'state', 'ready', 'attempts', 'error' (of the last
+            failed attempt, None once ready) and 'progress'
+        """
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "error": self.error,
+            "progress": self.progress(),
+        }
@@ -1,5 +1,5 @@
 """
-Vector store for semantic search using ChromaDB.
+Vector store for semantic search.
 
 @author:  Aarti Dashore, Alok Katiyar
 Seattle University, ARIN 5360
@@ -8,24 +8,37 @@ Seattle University, ARIN 5360
 @version: 1.0.0+w26
 """
 
-import chromadb
-from chromadb import Settings
-from chromadb.api.types import EmbeddingFunction
+import json
+import threading
 
+from retrieval.backends import ChromaBackend, NumpyBackend, SearchBackend
+from retrieval.cache import QueryCache, normalize_query
+from retrieval.dedup import collapse_duplicates
+from retrieval.lexical import LexicalIndex, reciprocal_rank_fusion
+from retrieval.metrics import SEARCH_SECONDS, SEARCH_STAGE_SECONDS
 
-class EmbedderAdaptor(EmbeddingFunction):
+# "semantic" ranks by embedding distance, "lexical" by BM25 keyword score,
+# and "hybrid" fuses the two rankings
+SEARCH_MODES = ("semantic", "lexical", "hybrid")
+
+# candidates taken from each ranking before hybrid fusion, and the RRF constant
+FUSION_DEPTH = 50
+RRF_K = 60
+
+# hits fetched per requested result when copies are collapsed, so the top-k
+# still fills up after they are dropped
+COLLAPSE_FACTOR = 4
+
+
+class EmbedderAdaptor:
     """
     Adapts our style of embedder to ChromaDB's which wants a callable
-    interface.
+    interface (ChromaBackend wraps it in ChromaDB's own class).
     """
 
     def __init__(self, embedder):
         self.embedder = embedder
 
-    def is_legacy(self) -> bool:
-        """Return True since we don't support build from config, etc."""
-        return True
-
     #  implement the callable interface by calling the adaptor's embedder
     def __call__(self, input) -> list[list[float]]:
         """
@@ -34,81 +47,397 @@ class EmbedderAdaptor(EmbeddingFunction):
         """
         return self.embedder.embed_documents(input).tolist()
 
+    def embed_documents(self, texts: list[str]):
+        """Embed documents as the embedder's numpy array, without converting."""
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, queries: list[str]):
+        """Embed search queries with our embedder's query path."""
+        return self.embedder.embed_query(queries)
+
 
 class VectorStore:
-    """Manages document storage and retrieval using ChromaDB."""
+    """
+    Manages document storage and retrieval on top of a search backend:
+    ChromaDB (approximate, HNSW) or NumPy (exact, brute force).
+
+    Every write (add, upsert, delete, reset) bumps ``generation``. Search
+    results are cached under the generation they were computed at, and the
+    cache is cleared on each bump, so a cached answer never outlives the
+    index it came from.
 
-    def __init__(self, embedder, collection_name: str = "documents"):
+    Writes are mirrored into an in-memory BM25 index (``lexical``) for
+    keyword and hybrid search. When documents were indexed before this
+    store existed, or by another process, it is rebuilt from the backend
+    on the next keyword search.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        collection_name: str = "documents",
+        persist_directory: str | None = None,
+        result_cache_size: int = 0,
+        backend: str | SearchBackend = "chroma",
+        quantization: str | None = None,
+    ):
         """
         Initialize vector store with an embedder.
 
         Args:
             embedder: DocumentEmbedder instance for generating vectors
             collection_name: Name for the ChromaDB collection
+            persist_directory: Directory to keep the index in between
+                runs. If None, an in-memory index is used.
+            result_cache_size: Search results kept in an in-memory LRU cache
+                (0 disables it)
+            backend: "chroma", "numpy", or a SearchBackend instance
+            quantization: Compact codes for the numpy backend's first pass,
+                "float16", "int8" or "binary" (None keeps float32 only)
         """
         self.embedder = EmbedderAdaptor(embedder)
-        #  use ChromaDB client
-        self.client = chromadb.Client(Settings(anonymized_telemetry=False))
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self.result_cache = QueryCache(maxsize=result_cache_size) if result_cache_size > 0 else None
+        self.lexical = LexicalIndex()
+        self._lexical_lock = threading.Lock()
+
+        if quantization is not None and backend != "numpy":
+            raise ValueError("Quantization is only supported by the numpy backend")
+
+        if isinstance(backend, SearchBackend):
+            self.backend = backend
+        elif backend == "chroma":
+            self.backend = ChromaBackend(self.embedder, collection_name, persist_directory)
+        elif backend == "numpy":
+            self.backend = NumpyBackend(persist_directory, quantization=quantization)
+        else:
+            raise ValueError(f"Unknown backend {backend!r}; expected 'chroma' or 'numpy'")
+
+        # documents already in the backend are indexed lazily, on first use
+        self._lexical_stale = self.backend.count() > 0
+
+    def reset(self):
+        """Drop every document."""
+        self._write(self.backend.reset, lambda: self.lexical.clear(), rebuilds=True)
+
+    def flush(self):
+        """Make writes durable, for backends that persist in batches."""
+        self.backend.flush()
+
+    def refresh(self) -> bool:
+        """Pick up changes another process made to a shared index, if any."""
+        if not self.backend.refresh():
+            return False
+        self._lexical_stale = True
+        self._bump_generation()
+        return True
 
-        # Delete any existing collection if present
+    def _write(self, write, mirror, rebuilds: bool = False) -> None:
+        """
+        Apply a write to the backend, then mirror it in the lexical index.
+
+        Args:
+            write: Callable making the change in the backend
+            mirror: Callable making the same change in the lexical index
+            rebuilds: True if mirror leaves the index complete even when it
+                was stale (e.g. a reset)
+        """
         try:
-            self.client.delete_collection(collection_name)
+            write()
+            with self._lexical_lock:
+                if rebuilds or not self._lexical_stale:
+                    mirror()
+                    self._lexical_stale = False
         except Exception:
-            pass
+            # the backend may be partly written; rebuild from it when next needed
+            self._lexical_stale = True
+            raise
+        finally:
+            self._bump_generation()
 
-        self.collection = self.client.create_collection(
-            name=collection_name,
-            embedding_function=self.embedder,  # Should use self.embedder
-        )
+    def _lexical(self) -> LexicalIndex:
+        """Return the lexical index, rebuilding it from the backend if stale."""
+        with self._lexical_lock:
+            if self._lexical_stale:
+                index = LexicalIndex()
+                documents = self.backend.documents()
+                index.add([doc[0] for doc in documents], [doc[1] for doc in documents])
+                self.lexical = index
+                self._lexical_stale = False
+            return self.lexical
 
-    def add_documents(self, documents):
+    def _bump_generation(self) -> None:
+        """Mark the index as changed, invalidating every cached result."""
+        with self._generation_lock:
+            self.generation += 1
+            if self.result_cache is not None:
+                self.result_cache.clear()
+
+    def add_documents(self, documents, embeddings=None):
         """
         Add documents to the vector store.
 
         Args:
             documents: List of dicts with 'id', 'text', and 'metadata'
+            embeddings: Optional precomputed embeddings, one row per
+                document. If None, our embedder is called.
+        """
+        if not documents:
+            return
+
+        #  add them to the backend
+        columns = self._columns(documents, embeddings)
+        self._write(
+            lambda: self.backend.add(*columns), lambda: self.lexical.add(columns[0], columns[1])
+        )
+
+    def upsert_documents(self, documents, embeddings=None):
+        """
+        Add documents to the vector store, replacing any with the same id.
+
+        Args:
+            documents: List of dicts with 'id', 'text', and 'metadata'
+            embeddings: Optional precomputed embeddings, one row per document
         """
         if not documents:
             return
 
-        #  pull out fields into separate lists like ChromaDB expects
-        ids = [doc["id"] for doc in documents]
+        columns = self._columns(documents, embeddings)
+        self._write(
+            lambda: self.backend.upsert(*columns),
+            lambda: self.lexical.upsert(columns[0], columns[1]),
+        )
+
+    def _columns(self, documents, embeddings=None) -> tuple:
+        """Pull out fields into (ids, texts, metadatas, embeddings) lists."""
         texts = [doc["text"] for doc in documents]
-        metadatas = [doc["metadata"] for doc in documents]
+        if embeddings is None:
+            embeddings = self.embedder.embed_documents(texts)
+        return (
+            [doc["id"] for doc in documents],
+            texts,
+            [doc["metadata"] for doc in documents],
+            embeddings,
+        )
+
+    def delete_documents(self, ids):
+        """
+        Remove documents from the vector store.
+
+        Args:
+            ids: List of document ids to delete
+        """
+        if not ids:
+            return
 
-        #  add them to ChromaDB's collection
-        self.collection.add(ids=ids, documents=texts, metadatas=metadatas)
+        ids = list(ids)
+        self._write(lambda: self.backend.delete(ids), lambda: self.lexical.delete(ids))
 
-    def search(self, query: str, n_results: int = 5) -> list[dict]:
+    def search(
+        self,
+        query: str,
+        n_results: int = 5,
+        where: dict | None = None,
+        mode: str = "semantic",
+        collapse: bool = False,
+    ) -> list[dict]:
         """
         Search for documents similar to the query.
 
         Args:
             query: Search query text
             n_results: Number of results to return
+            where: Optional metadata filter (ChromaDB "where" syntax)
+            mode: "semantic", "lexical" or "hybrid" (see SEARCH_MODES)
+            collapse: Return one hit per group of duplicate chunks (see
+                dedup.collapse_duplicates)
 
         Returns:
-            List of result dicts with 'id', 'text', 'distance', and 'metadata'
-        """
-        #  use ChromaDB's query interface
-        results = self.collection.query(query_texts=[query], n_results=n_results)
-
-        formatted = []
-        #  Format results
-        if len(results["ids"]) > 0:
-            for i in range(len(results["ids"][0])):
-                formatted.append(
-                    {
-                        "id": results["ids"][0][i],
-                        "text": results["documents"][0][i],
-                        "distance": results["distances"][0][i],
-                        "metadata": results["metadatas"][0][i],
-                    }
-                )
+            List of result dicts with 'id', 'text', 'distance', and 'metadata'.
+            Lexical and hybrid results also have a 'score' (higher is
+            better); their 'distance' is None for documents the embedding
+            search didn't return. Collapsed results also list the ids of
+            the copies they stand for under 'duplicates'.
+        """
+        return self.search_many([query], n_results, where, mode, collapse)[0]
+
+    def search_many(
+        self,
+        queries: list[str],
+        n_results: int = 5,
+        where: dict | None = None,
+        mode: str = "semantic",
+        collapse: bool = False,
+    ) -> list[list[dict]]:
+        """
+        Search for several queries at once.
+
+        Queries with a cached answer for the current index generation are
+        served from the result cache. The rest are embedded in a single
+        encode call and sent to the backend as one multi-query request.
+
+        Args:
+            queries: Search query texts
+            n_results: Number of results to return per query
+            where: Optional metadata filter (ChromaDB "where" syntax) applied to every query
+            mode: "semantic", "lexical" or "hybrid" (see SEARCH_MODES)
+            collapse: Return one hit per group of duplicate chunks
+
+        Returns:
+            One list of result dicts per query, in the same order
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+        if not queries:
+            return []
+
+        with SEARCH_SECONDS.time(mode):
+            return self._search_many(queries, n_results, where, mode, collapse)
+
+    def _search_many(
+        self, queries: list[str], n_results: int, where: dict | None, mode: str, collapse: bool
+    ) -> list[list[dict]]:
+        """Answer search_many() from the result cache where possible."""
+        self.refresh()
+        if self.result_cache is None:
+            return self._query(list(queries), n_results, where, mode, collapse)
+
+        with SEARCH_STAGE_SECONDS.time("cache"):
+            generation = self.generation
+            filters = json.dumps(where, sort_keys=True) if where is not None else None
+            keys = [
+                (generation, normalize_query(q), n_results, filters, mode, collapse)
+                for q in queries
+            ]
+
+            formatted: list[list[dict] | None] = []
+            misses: dict = {}  # key -> query, each distinct miss searched once
+            for key, query in zip(keys, queries):
+                hits = self.result_cache.get(key)
+                formatted.append(_copy_hits(hits) if hits is not None else None)
+                if hits is None:
+                    misses.setdefault(key, query)
+
+        if misses:
+            found = dict(
+                zip(misses, self._query(list(misses.values()), n_results, where, mode, collapse))
+            )
+            for i, key in enumerate(keys):
+                if formatted[i] is None:
+                    formatted[i] = _copy_hits(found[key])
+            with self._generation_lock:
+                # a write during the query may have changed the answer; don't keep it
+                if self.generation == generation:
+                    for key, hits in found.items():
+                        self.result_cache.put(key, hits)
 
         return formatted
 
+    def _query(
+        self,
+        queries: list[str],
+        n_results: int,
+        where: dict | None,
+        mode: str,
+        collapse: bool = False,
+    ) -> list[list[dict]]:
+        """Run queries in the given mode, bypassing the result cache."""
+        if collapse:
+            results = self._query(queries, n_results * COLLAPSE_FACTOR, where, mode)
+            return [collapse_duplicates(hits, n_results) for hits in results]
+        if mode == "semantic":
+            return self._semantic(queries, n_results, where)
+
+        if mode == "lexical":
+            with SEARCH_STAGE_SECONDS.time("lexical"):
+                lexical, only = self._lexical(), self._matching(where)
+                rankings = [lexical.search(q, n_results, only) for q in queries]
+                return self._ranked_hits(rankings, [{} for _ in rankings])
+
+        # hybrid: fuse the two rankings, reusing the embedding hits we already have
+        depth = max(n_results, FUSION_DEPTH)
+        semantic = self._semantic(queries, depth, where)
+        with SEARCH_STAGE_SECONDS.time("lexical"):
+            lexical, only = self._lexical(), self._matching(where)
+            known, rankings = [], []
+            for query, vector_hits in zip(queries, semantic):
+                # per query: the same document has a different distance to each
+                known.append({hit["id"]: hit for hit in vector_hits})
+                keyword = [doc_id for doc_id, _score in lexical.search(query, depth, only)]
+                fused = reciprocal_rank_fusion([[hit["id"] for hit in vector_hits], keyword], RRF_K)
+                rankings.append(fused[:n_results])
+            return self._ranked_hits(rankings, known)
+
+    def _matching(self, where: dict | None) -> set[str] | None:
+        """Return the ids a where clause lets through, or None without one."""
+        return set(self.backend.matching_ids(where)) if where is not None else None
+
+    def _semantic(self, queries: list[str], n_results: int, where: dict | None) -> list[list[dict]]:
+        """Embed queries and look them all up in one backend call."""
+        with SEARCH_STAGE_SECONDS.time("embed"):
+            embeddings = self.embedder.embed_query(queries)
+        return self.backend.query(embeddings, n_results, where)
+
+    def _ranked_hits(
+        self, rankings: list[list[tuple[str, float]]], known: list[dict[str, dict]]
+    ) -> list[list[dict]]:
+        """
+        Turn (id, score) rankings into result dicts.
+
+        Documents missing from a query's known hits are fetched from the
+        backend in one call; any deleted since they were ranked are dropped.
+
+        Args:
+            rankings: One (id, score) ranking per query
+            known: One dict per query of the hits already fetched for it, by
+                id; their distances are to that query
+        """
+        missing = list(
+            {
+                doc_id
+                for ranking, hits in zip(rankings, known)
+                for doc_id, _ in ranking
+                if doc_id not in hits
+            }
+        )
+        found = {hit["id"]: hit for hit in self.backend.get(missing)} if missing else {}
+
+        results = []
+        for ranking, known_hits in zip(rankings, known):
+            hits = []
+            for doc_id, score in ranking:
+                hit = known_hits.get(doc_id) or found.get(doc_id)
+                if hit is not None:
+                    hits.append(
+                        {
+                            "id": doc_id,
+                            "text": hit["text"],
+                            "distance": hit.get("distance"),
+                            "metadata": hit["metadata"],
+                            "score": score,
+                        }
+                    )
+            results.append(hits)
+        return results
+
+    def embeddings(self, ids: list[str]) -> dict:
+        """Return the stored embedding of each known id, keyed by id."""
+        return self.backend.embeddings(ids)
+
     def count(self) -> int:
         """Return the number of documents in the store."""
-        #  ask the collection for its size
-        return self.collection.count()
+        return self.backend.count()
+
+
+def _copy_hits(hits: list[dict]) -> list[dict]:
+    """Copy result dicts so callers can't modify what the cache holds."""
+    copies = []
+    for hit in hits:
+        copy = {**hit, "metadata": dict(hit["metadata"]) if hit["metadata"] is not None else None}
+        if "duplicates" in hit:
+            copy["duplicates"] = list(hit["duplicates"])
+        copies.append(copy)
+    return copies
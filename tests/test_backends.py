@@ -0,0 +1,282 @@
+"""
+Unit tests for the search backends.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from retrieval.backends import ChromaBackend, IndexFiles, NumpyBackend
+
+
+def _random_vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    """Helper to make n random unit vectors."""
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _fill(backend, vectors: np.ndarray) -> list[str]:
+    """Helper to add one document per vector, returning the ids."""
+    ids = [f"d{i}" for i in range(len(vectors))]
+    metadatas = [{"parity": i % 2} for i in range(len(vectors))]
+    backend.add(ids, [f"text {i}" for i in ids], metadatas, vectors)
+    return ids
+
+
+def test_numpy_query_is_exact_top_k() -> None:
+    backend = NumpyBackend()
+    vectors = _random_vectors(500)
+    _fill(backend, vectors)
+    queries = _random_vectors(7, seed=1)
+
+    results = backend.query(queries, n_results=5)
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    assert [[hit["id"] for hit in hits] for hits in results] == [
+        [f"d{i}" for i in row] for row in expected
+    ]
+    distances = [hit["distance"] for hit in results[0]]
+    assert distances == sorted(distances)
+
+
+def test_numpy_distances_match_chroma() -> None:
+    vectors = _random_vectors(20)
+    numpy_backend, chroma_backend = NumpyBackend(), ChromaBackend()
+    _fill(numpy_backend, vectors)
+    _fill(chroma_backend, vectors)
+
+    numpy_hits = numpy_backend.query(vectors[:1], n_results=3)[0]
+    chroma_hits = chroma_backend.query(vectors[:1], n_results=3)[0]
+
+    assert [hit["id"] for hit in numpy_hits] == [hit["id"] for hit in chroma_hits]
+    for ours, theirs in zip(numpy_hits, chroma_hits):
+        assert ours["distance"] == pytest.approx(theirs["distance"], abs=1e-4)
+
+
+def test_numpy_add_keeps_and_upsert_replaces() -> None:
+    backend = NumpyBackend()
+    vectors = _random_vectors(3)
+    _fill(backend, vectors)
+
+    backend.add(["d0"], ["changed"], [{}], vectors[2:])
+    assert backend.query(vectors[:1], n_results=1)[0][0]["text"] == "text d0"
+
+    backend.upsert(["d0", "d9"], ["changed", "new"], [{}, {}], vectors[1:3])
+    assert backend.count() == 4
+    top = backend.query(vectors[1:2], n_results=2)[0]
+    assert {hit["id"] for hit in top} == {"d0", "d1"}
+
+
+def test_numpy_delete_keeps_rows_packed() -> None:
+    backend = NumpyBackend()
+    vectors = _random_vectors(300)
+    ids = _fill(backend, vectors)
+
+    backend.delete(ids[:150:2] + ["missing"])
+
+    assert backend.count() == 225
+    hits = backend.query(vectors, n_results=1)
+    for i, hits_for_query in enumerate(hits):
+        if i < 150 and i % 2 == 0:
+            assert hits_for_query[0]["id"] != f"d{i}"
+        else:
+            assert hits_for_query[0]["id"] == f"d{i}"
+
+
+def test_numpy_where_filter_and_small_index() -> None:
+    backend = NumpyBackend()
+    assert backend.query(_random_vectors(2), n_results=3) == [[], []]
+
+    vectors = _random_vectors(10)
+    _fill(backend, vectors)
+
+    hits = backend.query(vectors[:1], n_results=20, where={"parity": 1})[0]
+    assert len(hits) == 5
+    assert all(hit["metadata"]["parity"] == 1 for hit in hits)
+
+    hits = backend.query(vectors[:1], n_results=20, where={"parity": {"$gt": 0}})[0]
+    assert len(hits) == 5
+
+    with pytest.raises(ValueError):
+        backend.query(vectors[:1], n_results=1, where={"parity": {"$regex": "1"}})
+
+
+def test_numpy_rejects_wrong_dimension() -> None:
+    backend = NumpyBackend()
+    _fill(backend, _random_vectors(2, dim=8))
+    with pytest.raises(ValueError):
+        backend.add(["x"], ["x"], [{}], _random_vectors(1, dim=4))
+
+
+def test_numpy_flush_and_reload(tmp_path: Path) -> None:
+    vectors = _random_vectors(50)
+    backend = NumpyBackend(tmp_path)
+    _fill(backend, vectors)
+    backend.flush()
+
+    reopened = NumpyBackend(tmp_path)
+
+    assert reopened.count() == 50
+    assert reopened.query(vectors[7:8], n_results=1)[0][0]["id"] == "d7"
+
+
+def test_numpy_ignores_mismatched_files(tmp_path: Path) -> None:
+    backend = NumpyBackend(tmp_path)
+    _fill(backend, _random_vectors(5))
+    backend.flush()
+    np.save(tmp_path / backend.version / "vectors.npy", _random_vectors(4))
+
+    assert NumpyBackend(tmp_path).count() == 0
+
+
+def test_flushed_index_is_served_from_memory_maps(tmp_path: Path) -> None:
+    vectors = _random_vectors(40)
+    backend = NumpyBackend(tmp_path)
+    _fill(backend, vectors)
+    backend.flush()
+
+    files = IndexFiles(tmp_path / backend.version)
+    assert isinstance(files.vectors, np.memmap)
+    assert files.record(3) == ("d3", "text d3", {"parity": 1})
+    assert backend.stats()["vectors_in_memory"] is False
+    assert backend.query(vectors[3:4], n_results=1)[0][0]["id"] == "d3"
+
+
+def test_flushed_ids_and_filters_never_decode_texts(tmp_path: Path) -> None:
+    vectors = _random_vectors(40)
+    writer = NumpyBackend(tmp_path)
+    _fill(writer, vectors)
+    writer.flush()
+    reader = NumpyBackend(tmp_path)
+    reader._files.texts = None  # any read of a text would now fail
+
+    assert reader._files.row("d17") == 17
+    assert reader._files.row("missing") is None
+    assert sorted(reader.embeddings(["d3", "missing"])) == ["d3"]
+    assert len(reader.matching_ids({"parity": 1})) == 20
+
+
+def test_readers_pick_up_new_versions(tmp_path: Path) -> None:
+    vectors = _random_vectors(30)
+    writer = NumpyBackend(tmp_path)
+    _fill(writer, vectors[:10])
+    writer.flush()
+    reader = NumpyBackend(tmp_path)
+    assert reader.count() == 10
+
+    writer.add(["late"], ["late"], [{}], vectors[20:21])
+    assert reader.refresh() is False  # nothing flushed yet
+    writer.flush()
+
+    assert reader.refresh() is True
+    assert reader.count() == 11
+    assert reader.query(vectors[20:21], n_results=1)[0][0]["id"] == "late"
+
+
+def test_refresh_reads_the_pointer_only_when_it_changed(tmp_path: Path, monkeypatch) -> None:
+    writer = NumpyBackend(tmp_path)
+    _fill(writer, _random_vectors(3))
+    writer.flush()
+    reader = NumpyBackend(tmp_path)
+    reads = []
+    read_text = Path.read_text
+    monkeypatch.setattr(Path, "read_text", lambda path: reads.append(path) or read_text(path))
+
+    assert [reader.refresh() for _ in range(5)] == [False] * 5
+    assert reads == []
+
+    writer.add(["late"], ["late"], [{}], _random_vectors(1, seed=3))
+    writer.flush()
+    assert reader.refresh() is True
+    assert len(reads) == 1 and reader.version == writer.version
+
+
+def test_old_versions_are_pruned(tmp_path: Path) -> None:
+    backend = NumpyBackend(tmp_path)
+    for i in range(4):
+        backend.add([f"d{i}"], ["x"], [{}], _random_vectors(1, seed=i))
+        backend.flush()
+
+    versions = sorted(p.name for p in tmp_path.glob("index-*"))
+    assert len(versions) == NumpyBackend.KEEP_VERSIONS
+    assert versions[-1] == backend.version
+    assert (tmp_path / "CURRENT").read_text() == backend.version
+
+
+@pytest.mark.parametrize("make", [NumpyBackend, ChromaBackend])
+def test_upsert_replaces_metadata(make) -> None:
+    """Keys the new metadata lacks are dropped, not kept from the old one."""
+    backend = make()
+    vectors = _random_vectors(1)
+    backend.add(["d0"], ["text"], [{"filename": "a.txt", "duplicate_of": "x"}], vectors)
+
+    backend.upsert(["d0"], ["text"], [{"filename": "a.txt"}], vectors)
+
+    assert backend.get(["d0"])[0]["metadata"] == {"filename": "a.txt"}
+
+
+@pytest.mark.parametrize("make", [NumpyBackend, ChromaBackend])
+def test_get_and_documents(make) -> None:
+    backend = make()
+    _fill(backend, _random_vectors(4))
+
+    assert backend.get(["d2", "missing", "d0"]) == [
+        {"id": "d2", "text": "text d2", "metadata": {"parity": 0}},
+        {"id": "d0", "text": "text d0", "metadata": {"parity": 0}},
+    ]
+    assert sorted(backend.documents()) == [
+        (f"d{i}", f"text d{i}", {"parity": i % 2}) for i in range(4)
+    ]
+
+
+@pytest.mark.parametrize("make", [NumpyBackend, ChromaBackend])
+def test_embeddings_by_id(make) -> None:
+    backend = make()
+    vectors = _random_vectors(4)
+    _fill(backend, vectors)
+
+    found = backend.embeddings(["d3", "missing", "d1"])
+
+    assert sorted(found) == ["d1", "d3"]
+    np.testing.assert_allclose(found["d3"], vectors[3], atol=1e-6)
+
+
+def test_get_from_memory_maps(tmp_path: Path) -> None:
+    backend = NumpyBackend(tmp_path)
+    _fill(backend, _random_vectors(5))
+    backend.flush()
+
+    reopened = NumpyBackend(tmp_path)
+
+    assert reopened.get(["d4"]) == [{"id": "d4", "text": "text d4", "metadata": {"parity": 0}}]
+    assert len(reopened.documents()) == 5
+    assert list(reopened.embeddings(["d4"])) == ["d4"]
+
+
+@pytest.mark.parametrize("make", [NumpyBackend, ChromaBackend])
+def test_filters_match_between_backends(make) -> None:
+    backend = make()
+    vectors = _random_vectors(12)
+    ids = [f"d{i}" for i in range(12)]
+    metadatas = [
+        {"type": "pdf" if i % 3 == 0 else "txt", "num_pages": i, "doc_id": f"doc{i % 4}"}
+        for i in range(12)
+    ]
+    backend.add(ids, ids, metadatas, vectors)
+    where = {"$and": [{"type": "pdf"}, {"num_pages": {"$gte": 3}}, {"num_pages": {"$lte": 9}}]}
+
+    hits = backend.query(vectors[:1], n_results=12, where=where)[0]
+
+    assert sorted(hit["id"] for hit in hits) == ["d3", "d6", "d9"]
+    assert sorted(backend.matching_ids({"doc_id": {"$in": ["doc1", "doc2"]}})) == sorted(
+        f"d{i}" for i in range(12) if i % 4 in (1, 2)
+    )
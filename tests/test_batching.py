@@ -0,0 +1,193 @@
+"""
+Unit tests for QueryBatcher.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from retrieval.batching import QueryBatcher
+from retrieval.metrics import SEARCH_STAGE_SECONDS, request_times
+
+
+class FakeSearch:
+    """search_many stand-in that records each call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, queries, n_results):
+        self.calls.append((list(queries), n_results))
+        return [[{"id": f"{q}_{i}"} for i in range(n_results)] for q in queries]
+
+
+@pytest.mark.anyio
+async def test_concurrent_queries_share_one_call():
+    search_many = FakeSearch()
+    batcher = QueryBatcher(search_many, max_batch_size=8, max_wait_ms=50)
+    await batcher.start()
+    try:
+        results = await asyncio.gather(*(batcher.search(f"q{i}", 2) for i in range(5)))
+    finally:
+        await batcher.stop()
+
+    assert len(search_many.calls) == 1
+    assert search_many.calls[0][0] == ["q0", "q1", "q2", "q3", "q4"]
+    assert [r[0]["id"] for r in results] == ["q0_0", "q1_0", "q2_0", "q3_0", "q4_0"]
+    assert batcher.stats()["mean_batch_size"] == 5
+
+
+@pytest.mark.anyio
+async def test_batches_are_capped_at_max_size():
+    search_many = FakeSearch()
+    batcher = QueryBatcher(search_many, max_batch_size=2, max_wait_ms=50)
+    await batcher.start()
+    try:
+        await asyncio.gather(*(batcher.search(f"q{i}", 1) for i in range(5)))
+    finally:
+        await batcher.stop()
+
+    assert [len(queries) for queries, _n in search_many.calls] == [2, 2, 1]
+
+
+@pytest.mark.anyio
+async def test_mixed_n_results_get_their_own_prefix():
+    search_many = FakeSearch()
+    batcher = QueryBatcher(search_many, max_wait_ms=50)
+    await batcher.start()
+    try:
+        small, big = await asyncio.gather(batcher.search("a", 1), batcher.search("b", 4))
+    finally:
+        await batcher.stop()
+
+    assert search_many.calls[0][1] == 4
+    assert len(small) == 1
+    assert len(big) == 4
+
+
+@pytest.mark.anyio
+async def test_search_runs_off_the_event_loop():
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def search_many(queries, n_results):
+        threads.append(threading.get_ident())
+        return [[] for _ in queries]
+
+    batcher = QueryBatcher(search_many, max_wait_ms=0)
+    await batcher.start()
+    try:
+        await batcher.search("x")
+    finally:
+        await batcher.stop()
+
+    assert threads and threads[0] != loop_thread
+
+
+@pytest.mark.anyio
+async def test_callers_get_their_batch_stage_times():
+    def search_many(queries, n_results):
+        with SEARCH_STAGE_SECONDS.time("embed"):
+            pass
+        return [[] for _ in queries]
+
+    async def timed_search(query):
+        with request_times() as times:
+            await batcher.search(query)
+        return times
+
+    batcher = QueryBatcher(search_many, max_wait_ms=20)
+    await batcher.start()
+    try:
+        first, second = await asyncio.gather(timed_search("a"), timed_search("b"))
+    finally:
+        await batcher.stop()
+
+    for times in (first, second):
+        assert set(times) == {"wait", "embed"}
+        assert times["wait"] > 0
+
+
+@pytest.mark.anyio
+async def test_errors_reach_every_caller_in_the_batch():
+    def search_many(queries, n_results):
+        raise RuntimeError("boom")
+
+    batcher = QueryBatcher(search_many, max_wait_ms=50)
+    await batcher.start()
+    try:
+        results = await asyncio.gather(
+            batcher.search("a"), batcher.search("b"), return_exceptions=True
+        )
+    finally:
+        await batcher.stop()
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.anyio
+async def test_different_options_get_separate_calls():
+    calls = []
+
+    def search_many(queries, n_results, mode="semantic"):
+        calls.append((list(queries), mode))
+        return [[{"id": f"{q}_{mode}"}] for q in queries]
+
+    batcher = QueryBatcher(search_many, max_batch_size=8, max_wait_ms=50)
+    await batcher.start()
+    try:
+        results = await asyncio.gather(
+            batcher.search("a", 1, mode="lexical"),
+            batcher.search("b", 1),
+            batcher.search("c", 1, mode="lexical"),
+        )
+    finally:
+        await batcher.stop()
+
+    assert sorted(calls) == [(["a", "c"], "lexical"), (["b"], "semantic")]
+    assert [r[0]["id"] for r in results] == ["a_lexical", "b_semantic", "c_lexical"]
+    assert batcher.stats()["batches"] == 1
+
+
+@pytest.mark.anyio
+async def test_search_requires_start():
+    batcher = QueryBatcher(FakeSearch())
+
+    with pytest.raises(RuntimeError):
+        await batcher.search("x")
+
+
+@pytest.mark.anyio
+async def test_stop_fails_waiting_requests():
+    release = threading.Event()
+
+    def search_many(queries, n_results):
+        release.wait(5)
+        return [[] for _ in queries]
+
+    batcher = QueryBatcher(search_many, max_batch_size=1, max_wait_ms=0)
+    await batcher.start()
+    first = asyncio.create_task(batcher.search("running"))
+    second = asyncio.create_task(batcher.search("queued"))
+    await asyncio.sleep(0.05)
+
+    await batcher.stop()
+    release.set()
+
+    for task in (first, second):
+        with pytest.raises(RuntimeError, match="stopped"):
+            await task
+
+
+def test_bad_settings_raise():
+    with pytest.raises(ValueError):
+        QueryBatcher(FakeSearch(), max_batch_size=0)
+    with pytest.raises(ValueError):
+        QueryBatcher(FakeSearch(), max_wait_ms=-1)
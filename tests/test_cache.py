@@ -0,0 +1,191 @@
+"""
+Unit tests for the embedding caches.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from retrieval.cache import EmbeddingCache, QueryCache, approx_sizeof, normalize_query
+
+
+def _vectors(n: int, dim: int = 4) -> np.ndarray:
+    """Helper to make n distinct float32 vectors."""
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_empty_cache_misses_everything(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path, "model")
+
+    embeddings, missing = cache.get_many(["a", "b"])
+
+    assert embeddings is None
+    assert missing == [0, 1]
+    assert cache.stats()["misses"] == 2
+
+
+def test_put_then_get_returns_cached_rows(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path, "model")
+    vectors = _vectors(2)
+    cache.put_many(["a", "b"], vectors)
+
+    embeddings, missing = cache.get_many(["b", "c", "a"])
+
+    assert missing == [1]
+    np.testing.assert_array_equal(embeddings[0], vectors[1])
+    np.testing.assert_array_equal(embeddings[2], vectors[0])
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_duplicate_texts_are_stored_once(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path, "model")
+    cache.put_many(["a", "a"], _vectors(2))
+    cache.put_many(["a"], _vectors(1))
+
+    assert len(cache) == 1
+    assert (tmp_path / "model.f32").stat().st_size == 4 * 4
+
+
+def test_cache_persists_across_instances(tmp_path: Path) -> None:
+    vectors = _vectors(3)
+    EmbeddingCache(tmp_path, "model").put_many(["a", "b", "c"], vectors)
+
+    reopened = EmbeddingCache(tmp_path, "model")
+    embeddings, missing = reopened.get_many(["c", "a"])
+
+    assert missing == []
+    np.testing.assert_array_equal(embeddings, vectors[[2, 0]])
+
+
+def test_keys_depend_on_model(tmp_path: Path) -> None:
+    """The same text under another model is a miss."""
+    EmbeddingCache(tmp_path, "model-a").put_many(["a"], _vectors(1))
+
+    _, missing = EmbeddingCache(tmp_path, "model-b").get_many(["a"])
+
+    assert missing == [0]
+
+
+def test_torn_append_is_trimmed(tmp_path: Path) -> None:
+    """Vector rows written without their keys are dropped on reopen."""
+    EmbeddingCache(tmp_path, "model").put_many(["a", "b"], _vectors(2))
+    with open(tmp_path / "model.f32", "ab") as f:
+        f.write(b"\0" * 10)
+
+    reopened = EmbeddingCache(tmp_path, "model")
+
+    assert len(reopened) == 2
+    assert (tmp_path / "model.f32").stat().st_size == 2 * 4 * 4
+    reopened.put_many(["c"], _vectors(1) + 100)
+    embeddings, missing = EmbeddingCache(tmp_path, "model").get_many(["c"])
+    assert missing == []
+    assert embeddings[0][0] == 100
+
+
+def test_instances_sharing_a_directory_see_each_others_rows(tmp_path: Path) -> None:
+    """Two workers' caches over one directory: appends go after the other's rows."""
+    first = EmbeddingCache(tmp_path, "model")
+    second = EmbeddingCache(tmp_path, "model")
+    vectors = _vectors(3)
+
+    first.put_many(["a"], vectors[[0]])
+    second.put_many(["b"], vectors[[1]])  # second never read "a"'s row
+    first.put_many(["c", "b"], vectors[[2, 1]])
+
+    for cache in (first, second, EmbeddingCache(tmp_path, "model")):
+        embeddings, missing = cache.get_many(["a", "b", "c"])
+        assert missing == []
+        np.testing.assert_array_equal(embeddings, vectors)
+    assert (tmp_path / "model.f32").stat().st_size == 3 * 4 * 4
+
+
+def test_wrong_dimension_raises(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path, "model")
+    cache.put_many(["a"], _vectors(1, dim=4))
+
+    with pytest.raises(ValueError):
+        cache.put_many(["b"], _vectors(1, dim=3))
+
+
+def test_normalize_query_collapses_whitespace_and_case() -> None:
+    assert normalize_query("  VPN \t setup\n") == "vpn setup"
+    assert normalize_query("Password Reset") == normalize_query("password   reset")
+
+
+def test_query_cache_hit_and_miss() -> None:
+    cache = QueryCache(maxsize=4)
+
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_query_cache_evicts_least_recently_used() -> None:
+    cache = QueryCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_query_cache_entries_expire() -> None:
+    now = [100.0]
+    cache = QueryCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put("a", 1)
+
+    now[0] = 109.0
+    assert cache.get("a") == 1
+    now[0] = 111.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_query_cache_clear_and_bad_settings() -> None:
+    cache = QueryCache()
+    cache.put("a", 1)
+    cache.clear()
+    assert len(cache) == 0
+
+    with pytest.raises(ValueError):
+        QueryCache(maxsize=0)
+    with pytest.raises(ValueError):
+        QueryCache(ttl=0)
+
+
+def test_query_cache_tracks_bytes() -> None:
+    cache = QueryCache(maxsize=2, sizeof=len)
+    cache.put("a", "xx")
+    cache.put("b", "yyy")
+    assert cache.stats()["bytes"] == 5
+
+    cache.put("a", "z")  # replacing an entry swaps its size
+    cache.put("c", "wwww")  # evicts b
+    assert cache.stats()["bytes"] == 5
+
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_approx_sizeof_follows_containers() -> None:
+    hits = [{"id": "1", "text": "x" * 1000, "metadata": {"page": 1}}]
+    assert approx_sizeof(hits) > 1000
+    assert approx_sizeof(np.zeros(256, dtype=np.float32)) >= 1024
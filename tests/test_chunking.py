@@ -95,3 +95,74 @@ def test_sample():
     assert chunks[500]["text"][:24] == "thin mist began to creep"
     assert chunks[500]["id"] == "dracula_by_bram_stoker_500"
     assert chunks[500]["metadata"] == {"chunk": 500, "doc_id": "dracula_by_bram_stoker"}
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    """The embedding model's tokenizer, for token-sized chunks."""
+    from retrieval.embeddings import DocumentEmbedder
+
+    return DocumentEmbedder().tokenizer
+
+
+def _dracula() -> str:
+    sample_file = Path(__file__).parent / "data" / "dracula_by_bram_stoker.txt"
+    return sample_file.read_text(encoding="utf-8")
+
+
+def test_token_chunks_fit_the_model(tokenizer):
+    """Token chunks hold at most chunk_size tokens and are slices of the text."""
+    chunker = DocumentChunker(chunk_size=128, overlap=16, tokenizer=tokenizer)
+    text = _dracula()[:50000]
+
+    chunks = chunker.chunk_text(text, "dracula")
+
+    assert len(chunks) > 10
+    for i, chunk in enumerate(chunks):
+        meta = chunk["metadata"]
+        assert chunk["id"] == f"dracula_{i}"
+        assert meta["chunk"] == i and meta["doc_id"] == "dracula"
+        assert chunk["text"] == text[meta["start"] : meta["end"]]
+        ids = tokenizer(chunk["text"], add_special_tokens=False, verbose=False)["input_ids"]
+        assert len(ids) <= 128
+    # consecutive chunks overlap, and together they cover the text
+    for before, after in zip(chunks, chunks[1:]):
+        assert after["metadata"]["start"] < before["metadata"]["end"]
+    assert chunks[-1]["metadata"]["end"] == len(text.rstrip())
+
+
+def test_token_chunks_end_between_words(tokenizer):
+    chunker = DocumentChunker(chunk_size=32, overlap=4, tokenizer=tokenizer)
+    text = "internationalization " * 200
+
+    for chunk in chunker.chunk_text(text, "doc")[:-1]:
+        end = chunk["metadata"]["end"]
+        assert not (text[end - 1].isalnum() and text[end].isalnum())
+
+
+def test_token_chunks_stream_through_windows(tokenizer):
+    """Tokenizing in small windows gives the same chunks as one big window."""
+    text = _dracula()[:20000]
+    whole = DocumentChunker(chunk_size=64, overlap=8, tokenizer=tokenizer)
+    windowed = DocumentChunker(chunk_size=64, overlap=8, tokenizer=tokenizer)
+    windowed.WINDOW_CHARS = 500
+
+    assert windowed.chunk_text(text, "d") == whole.chunk_text(text, "d")
+
+
+def test_token_chunker_small_and_empty_text(tokenizer):
+    chunker = DocumentChunker(chunk_size=50, overlap=5, tokenizer=tokenizer)
+
+    chunks = chunker.chunk_text("  Short document  ", "doc1")
+
+    assert [c["text"] for c in chunks] == ["Short document"]
+    assert chunks[0]["metadata"] == {"chunk": 0, "doc_id": "doc1", "start": 2, "end": 16}
+    assert chunker.chunk_text("", "empty") == []
+
+
+def test_token_chunker_needs_a_fast_tokenizer():
+    class SlowTokenizer:
+        is_fast = False
+
+    with pytest.raises(ValueError, match="fast tokenizer"):
+        DocumentChunker(tokenizer=SlowTokenizer())
@@ -0,0 +1,114 @@
+"""
+Unit tests for duplicate detection.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from retrieval.dedup import DuplicateIndex, MinHasher, collapse_duplicates, content_hash
+
+
+def _words(n: int, seed: int = 0) -> list[str]:
+    """Helper making n random words."""
+    rng = np.random.default_rng(seed)
+    return ["".join(rng.choice(list("abcdefghij"), size=6)) for _ in range(n)]
+
+
+def _edited(words: list[str], every: int) -> str:
+    """Helper replacing every n-th word of a text."""
+    return " ".join("CHANGED" if i % every == 0 else w for i, w in enumerate(words))
+
+
+def test_content_hash_ignores_whitespace():
+    assert content_hash("a  b\nc ") == content_hash("a b c")
+    assert content_hash("a b c") != content_hash("a b d")
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher(num_perm=256)
+    words = _words(300)
+    text = " ".join(words)
+
+    same = np.mean(hasher.signature(text) == hasher.signature(text.upper()))
+    close = np.mean(hasher.signature(text) == hasher.signature(_edited(words, 100)))
+    far = np.mean(hasher.signature(text) == hasher.signature(" ".join(_words(300, seed=1))))
+
+    assert same == 1.0
+    assert 0.8 < close < 1.0
+    assert far < 0.1
+    assert hasher.signature(" \n ") is None
+
+
+def test_observe_finds_exact_and_near_copies():
+    index = DuplicateIndex(threshold=0.8)
+    words = _words(300)
+
+    assert index.observe("a", " ".join(words)) is None
+    assert index.observe("b", " ".join(words)) == ("a", 1.0)
+    original, similarity = index.observe("c", _edited(words, 150))
+    assert original == "a" and 0.8 <= similarity < 1.0
+    assert index.observe("d", " ".join(_words(300, seed=1))) is None
+
+    # only the distinct chunks are registered
+    assert len(index) == 2 and "a" in index and "b" not in index
+
+
+def test_exact_only_without_threshold():
+    index = DuplicateIndex(threshold=None)
+    words = _words(300)
+    index.observe("a", " ".join(words))
+
+    assert index.observe("b", " ".join(words)) == ("a", 1.0)
+    assert index.observe("c", _edited(words, 150)) is None
+
+
+def test_changed_chunk_replaces_its_old_self():
+    index = DuplicateIndex()
+    words = _words(300)
+    index.observe("a", " ".join(words))
+
+    # the same id with slightly different text is not a copy of itself
+    assert index.observe("a", _edited(words, 150)) is None
+    assert len(index) == 1
+    assert index.find(" ".join(words)) is not None
+
+
+def test_remove_forgets_chunks():
+    index = DuplicateIndex()
+    text = " ".join(_words(100))
+    index.add("a", text)
+    index.remove(["a", "missing"])
+
+    assert index.find(text) is None
+    assert index.observe("b", text) is None
+
+
+def test_bad_settings_raise():
+    with pytest.raises(ValueError):
+        DuplicateIndex(threshold=1.5)
+    with pytest.raises(ValueError):
+        DuplicateIndex(num_perm=128, bands=7)
+
+
+def test_collapse_keeps_best_hit_per_group():
+    hits = [
+        {"id": "b", "metadata": {"duplicate_of": "a"}},
+        {"id": "x", "metadata": {}},
+        {"id": "a", "metadata": {}},
+        {"id": "c", "metadata": {"duplicate_of": "a"}},
+        {"id": "y", "metadata": None},
+    ]
+
+    collapsed = collapse_duplicates(hits, n_results=2)
+
+    assert [hit["id"] for hit in collapsed] == ["b", "x"]
+    assert collapsed[0]["duplicates"] == ["a", "c"]
+    assert collapsed[1]["duplicates"] == []
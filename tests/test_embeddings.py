@@ -10,10 +10,12 @@ Seattle University, ARIN 5360
 
 from __future__ import annotations
 
+import multiprocessing
+
 import numpy as np
 import pytest
 
-from src.retrieval.embeddings import DocumentEmbedder
+from src.retrieval.embeddings import DocumentEmbedder, length_buckets
 
 EMBED_DIM = 384  # all-MiniLM-L6-v2 embedding size
 
@@ -87,3 +89,159 @@ def test_custom_model_name():
     embedder = DocumentEmbedder(model_name="all-MiniLM-L6-v2")
 
     assert embedder.model_name == "all-MiniLM-L6-v2"
+
+
+def test_embedding_cache_skips_repeat_texts(tmp_path):
+    """Cached texts come back identical without being encoded again."""
+    embedder = DocumentEmbedder(model_name="all-MiniLM-L6-v2", cache_dir=str(tmp_path))
+    texts = ["Python programming", "Machine learning", "Python programming"]
+
+    first = embedder.embed_documents(texts)
+    assert first.shape == (3, EMBED_DIM)
+    assert len(embedder.cache) == 2
+
+    second = embedder.embed_documents(texts[:2])
+
+    np.testing.assert_allclose(second, first[:2])
+    assert embedder.cache.stats()["hits"] == 2
+
+
+def test_embedding_cache_matches_uncached(embedder, tmp_path):
+    """A cached embedder returns the same vectors as an uncached one."""
+    cached = DocumentEmbedder(model_name="all-MiniLM-L6-v2", cache_dir=str(tmp_path))
+    texts = ["Hello world", "Test document"]
+
+    cached.embed_documents(texts)
+    np.testing.assert_allclose(
+        cached.embed_documents(texts), embedder.embed_documents(texts), atol=1e-6
+    )
+
+
+def test_query_cache_reuses_normalized_queries():
+    """Repeat queries (modulo whitespace/case) are served from the query cache."""
+    embedder = DocumentEmbedder(model_name="all-MiniLM-L6-v2", query_cache_size=8)
+
+    first = embedder.embed_query("VPN setup")
+    again = embedder.embed_query("  vpn   SETUP ")
+    batch = embedder.embed_query(["vpn setup", "password reset", "password reset"])
+
+    np.testing.assert_allclose(first, again)
+    np.testing.assert_allclose(batch[0], first)
+    np.testing.assert_allclose(batch[1], batch[2])
+    stats = embedder.query_cache.stats()
+    assert stats["entries"] == 2
+    assert stats["hits"] == 2
+
+
+def test_query_cache_disabled():
+    embedder = DocumentEmbedder(model_name="all-MiniLM-L6-v2", query_cache_size=0)
+
+    assert embedder.query_cache is None
+    assert embedder.embed_query("test query").shape == (EMBED_DIM,)
+
+
+def test_query_cache_encodes_the_query_as_given(embedder, monkeypatch):
+    """The normalized query is only the cache key; the text encoded is the query itself."""
+    cached = DocumentEmbedder(model_name="all-MiniLM-L6-v2", query_cache_size=8)
+    encoded = []
+    encode = cached._encode
+    monkeypatch.setattr(cached, "_encode", lambda texts: encoded.extend(texts) or encode(texts))
+
+    vectors = cached.embed_query(["  VPN   Setup ", "vpn setup", "Password Reset"])
+
+    assert encoded == ["  VPN   Setup ", "Password Reset"]
+    np.testing.assert_allclose(vectors[0], embedder.model.encode("  VPN   Setup "), atol=1e-6)
+
+
+def test_int8_backend_agrees_with_fp32(embedder, tmp_path):
+    """The dynamically quantized model stays close to fp32 and caches apart from it."""
+    quantized = DocumentEmbedder(
+        model_name="all-MiniLM-L6-v2", backend="int8", cache_dir=str(tmp_path)
+    )
+    texts = ["Python programming", "Machine learning", "Vectors are vicious"]
+
+    assert quantized.embed_documents(texts).shape == (3, EMBED_DIM)
+    assert quantized.cache.model_name == "all-MiniLM-L6-v2-int8"
+
+    report = quantized.agreement(texts, reference=embedder)
+    assert report["backend"] == "int8" and report["samples"] == 3
+    assert report["min_cosine"] > 0.95
+    assert report["mean_cosine"] >= report["min_cosine"]
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        DocumentEmbedder(backend="tpu")
+
+
+def test_length_buckets_group_similar_lengths():
+    lengths = [10, 200, 12, 190, 11, 500]
+
+    batches = length_buckets(lengths, batch_size=3, max_batch_tokens=400)
+
+    # longest first; 2 x 200 fits the budget but a third text doesn't
+    assert batches == [[5], [1, 3], [2, 4, 0]]
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+
+
+def test_bucketed_encoding_matches_the_model(embedder):
+    """Batching by length changes neither the vectors nor their order."""
+    texts = ["short", "a much longer text " * 40, "medium sized text " * 5, "tiny"]
+    bucketed = DocumentEmbedder(
+        model_name="all-MiniLM-L6-v2", query_cache_size=0, batch_size=2, max_batch_tokens=64
+    )
+
+    np.testing.assert_allclose(
+        bucketed.embed_documents(texts), embedder.model.encode(texts), atol=1e-5
+    )
+    stats = bucketed.encode_stats.stats()
+    assert stats["texts"] == 4 and stats["batches"] == 3
+    assert stats["tokens"] > 0 and stats["tokens_per_second"] > 0
+    assert 0 <= stats["padding"] < 1
+
+
+def test_bucketed_encoding_applies_the_default_prompt():
+    """A model's default prompt is prepended as encode() does, on any sentence-transformers."""
+    prompted = DocumentEmbedder(model_name="all-MiniLM-L6-v2", query_cache_size=0, batch_size=2)
+    prompted.model.prompts = {"query": "query: "}
+    prompted.model.default_prompt_name = "query"
+    texts = ["short", "a much longer text " * 10, "tiny"]
+
+    np.testing.assert_allclose(
+        prompted.embed_documents(texts), prompted.model.encode(texts), atol=1e-5
+    )
+    assert not np.allclose(
+        prompted.embed_documents(["short"]), prompted.model.encode(["short"], prompt=""), atol=1e-3
+    )
+
+
+def test_each_bucket_is_one_public_encode_call(monkeypatch):
+    """Buckets go through model.encode() whole, never the model's private API."""
+    bucketed = DocumentEmbedder(
+        model_name="all-MiniLM-L6-v2", query_cache_size=0, batch_size=2, max_batch_tokens=64
+    )
+    calls = []
+    encode = bucketed.model.encode
+
+    def spy(sentences, **kwargs):
+        calls.append((len(sentences), kwargs["batch_size"]))
+        return encode(sentences, **kwargs)
+
+    monkeypatch.setattr(bucketed.model, "encode", spy)
+    bucketed.embed_documents(["short", "a much longer text " * 40, "medium text " * 5, "tiny"])
+
+    assert sorted(calls) == [(1, 1), (1, 1), (2, 2)]  # one call per bucket, each one batch
+
+
+def test_pool_matches_in_process_encoding(embedder):
+    """Texts split across worker replicas come back in order, with the same vectors."""
+    texts = [f"document number {i} about topic {i % 3}" for i in range(20)]
+    cached = DocumentEmbedder(model_name="all-MiniLM-L6-v2", query_cache_size=0)
+
+    with embedder.pool(workers=2) as pool:
+        pooled = cached.embed_documents(texts, pool=pool)
+        assert len(multiprocessing.active_children()) == 2
+
+    np.testing.assert_allclose(pooled, embedder.embed_documents(texts), atol=1e-5)
+    assert cached.encode_stats.stats()["texts"] == 20
+    assert not multiprocessing.active_children()
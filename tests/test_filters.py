@@ -0,0 +1,83 @@
+"""
+Unit tests for where clauses and the metadata index.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from retrieval.filters import MetadataIndex, where_clause
+
+
+@pytest.fixture
+def index() -> MetadataIndex:
+    return MetadataIndex(
+        [
+            {"type": "txt", "filename": "a.txt", "chunk": 0},
+            {"type": "pdf", "filename": "b.pdf", "num_pages": 3, "chunk": 0},
+            {"type": "pdf", "filename": "b.pdf", "num_pages": 3, "chunk": 1},
+            {"type": "pdf", "filename": "c.pdf", "num_pages": 40, "chunk": 0},
+            None,
+            {"type": "txt", "flag": True, "tags": ["x"]},
+        ]
+    )
+
+
+def test_where_clause() -> None:
+    assert where_clause() is None
+    assert where_clause(type="pdf") == {"type": "pdf"}
+    assert where_clause(filename=["a.txt", "b.txt"], min_pages=2, max_pages=9) == {
+        "$and": [
+            {"filename": {"$in": ["a.txt", "b.txt"]}},
+            {"num_pages": {"$gte": 2}},
+            {"num_pages": {"$lte": 9}},
+        ]
+    }
+
+
+def test_equality_and_sets(index: MetadataIndex) -> None:
+    assert index.select({"type": "pdf"}).tolist() == [1, 2, 3]
+    assert index.select({"filename": {"$in": ["a.txt", "c.pdf"]}}).tolist() == [0, 3]
+    assert index.select({"type": {"$ne": "pdf"}}).tolist() == [0, 5]
+    assert index.select({"filename": {"$nin": ["b.pdf"]}}).tolist() == [0, 3]
+    assert index.select({"type": "docx"}).tolist() == []
+    assert index.select({"flag": True}).tolist() == [5]
+    assert index.select({"chunk": True}).tolist() == []  # True is not 1
+
+
+def test_ranges(index: MetadataIndex) -> None:
+    assert index.select({"num_pages": {"$gte": 3}}).tolist() == [1, 2, 3]
+    assert index.select({"num_pages": {"$gt": 3}}).tolist() == [3]
+    assert index.select({"num_pages": {"$lt": 40}}).tolist() == [1, 2]
+    assert index.select({"num_pages": {"$gte": 2, "$lte": 10}}).tolist() == [1, 2]
+    assert index.select({"missing": {"$gt": 0}}).tolist() == []
+
+
+def test_and_or(index: MetadataIndex) -> None:
+    where = {"$and": [{"type": "pdf"}, {"chunk": 0}]}
+    assert index.select(where).tolist() == [1, 3]
+    assert index.select({"$or": [{"filename": "a.txt"}, {"num_pages": 40}]}).tolist() == [0, 3]
+    assert index.select({"type": "pdf", "chunk": 1}).tolist() == [2]
+    assert index.select({}).tolist() == [0, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize(
+    "where",
+    [
+        {"$not": {"type": "pdf"}},
+        {"type": {"$regex": "p"}},
+        {"$and": []},
+        {"type": {"$in": "pdf"}},
+        {"num_pages": {"$gt": "3"}},
+        {"tags": ["x"]},
+    ],
+)
+def test_unsupported_filters_raise(index: MetadataIndex, where: dict) -> None:
+    with pytest.raises(ValueError):
+        index.select(where)
@@ -7,6 +7,8 @@ Seattle University, ARIN 5360
 @version: 2.0.0+w26
 """
 
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -15,8 +17,12 @@ from retrieval.main import app
 
 @pytest.fixture
 def client():
-    """Provide test client with lifespan events."""
+    """Provide test client with lifespan events, once indexing finished."""
     with TestClient(app, raise_server_exceptions=False) as client:
+        deadline = time.monotonic() + 600
+        while client.get("/health/ready").status_code != 200:
+            assert time.monotonic() < deadline, "indexing did not finish"
+            time.sleep(0.2)
         yield client
 
 
@@ -101,3 +107,17 @@ def test_search_invalid_n_results(client):
     """Test search with invalid n_results returns 400."""
     response = client.post("/search", json={"query": "test", "n_results": 100})
     assert response.status_code == 400
+
+
+def test_search_batch_endpoint(client):
+    """Batch search answers each query like /search would."""
+    queries = ["test", "vectors are vicious"]
+    response = client.post("/search/batch", json={"queries": queries, "n_results": 3})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+    for query, result in zip(queries, data["results"]):
+        single = client.post("/search", json={"query": query, "n_results": 3}).json()
+        assert result["query"] == query
+        assert [r["id"] for r in result["results"]] == [r["id"] for r in single["results"]]
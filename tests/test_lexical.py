@@ -0,0 +1,121 @@
+"""
+Unit tests for the BM25 index and rank fusion.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import math
+
+import pytest
+
+from retrieval.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def index() -> LexicalIndex:
+    index = LexicalIndex()
+    index.add(
+        ["a", "b", "c"],
+        [
+            "The API returns ERR_429 when the rate limit is exceeded.",
+            "Rate limits reset every minute; see the rate-limit docs.",
+            "Vampires fear garlic and sunlight.",
+        ],
+    )
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_their_parts() -> None:
+    assert tokenize("Call api.v2 for ERR_429!") == [
+        "call",
+        "api.v2",
+        "api",
+        "v2",
+        "for",
+        "err_429",
+        "err",
+        "429",
+    ]
+
+
+def test_exact_identifier_ranks_first(index: LexicalIndex) -> None:
+    hits = index.search("ERR_429", n_results=5)
+
+    assert [doc_id for doc_id, _ in hits] == ["a"]
+    assert hits[0][1] > 0
+
+
+def test_scores_follow_bm25() -> None:
+    index = LexicalIndex(k1=1.5, b=0.75)
+    index.add(["x", "y"], ["apple apple pie", "banana bread"])
+
+    ((doc_id, score),) = index.search("apple", n_results=1)
+
+    # one of two documents has the term; x has tf=2 and length 3 (average length 2.5)
+    idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+    norm = 1.5 * (1 - 0.75 + 0.75 * 3 / 2.5)
+    assert doc_id == "x"
+    assert score == pytest.approx(idf * 2 * 2.5 / (2 + norm), rel=1e-5)
+
+
+def test_more_matching_terms_rank_higher(index: LexicalIndex) -> None:
+    ranked = [doc_id for doc_id, _ in index.search("rate limit exceeded", n_results=3)]
+
+    assert ranked[0] == "a"
+    assert set(ranked) == {"a", "b"}
+
+
+def test_unknown_terms_and_empty_index() -> None:
+    assert LexicalIndex().search("anything") == []
+    index = LexicalIndex()
+    index.add(["a"], ["hello world"])
+    assert index.search("goodbye") == []
+    assert index.search("hello", n_results=0) == []
+
+
+def test_add_skips_and_upsert_replaces(index: LexicalIndex) -> None:
+    index.add(["c"], ["ERR_429 everywhere"])
+    assert [doc_id for doc_id, _ in index.search("ERR_429")] == ["a"]
+
+    index.upsert(["c"], ["ERR_429 everywhere"])
+    assert {doc_id for doc_id, _ in index.search("ERR_429")} == {"a", "c"}
+    assert index.search("garlic") == []
+    assert len(index) == 3
+
+
+def test_delete_and_compaction() -> None:
+    index = LexicalIndex()
+    index.COMPACT_MIN_DEAD = 4
+    ids = [f"d{i}" for i in range(10)]
+    index.add(ids, [f"common term{i}" for i in range(10)])
+
+    index.delete(ids[:6] + ["missing"])
+
+    assert len(index) == 4
+    assert "d0" not in index and "d9" in index
+    assert len(index._ids) == 4  # tombstones were compacted away
+    assert {doc_id for doc_id, _ in index.search("common", n_results=10)} == set(ids[6:])
+    assert [doc_id for doc_id, _ in index.search("term7")] == ["d7"]
+
+    index.add(["new"], ["common again"])
+    assert "new" in {doc_id for doc_id, _ in index.search("common", n_results=10)}
+
+
+def test_clear(index: LexicalIndex) -> None:
+    index.clear()
+    assert len(index) == 0
+    assert index.search("garlic") == []
+
+
+def test_reciprocal_rank_fusion() -> None:
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    assert reciprocal_rank_fusion([]) == []
@@ -22,7 +22,7 @@ from pathlib import Path
 
 import pytest
 
-from retrieval.loader import DocumentLoader
+from retrieval.loader import DocumentChunker, DocumentLoader
 
 
 @pytest.fixture
@@ -61,7 +61,7 @@ def test_loads_single_text_file(tmp_path: Path, loader: DocumentLoader) -> None:
 
     assert len(docs) == 1
     doc = docs[0]
-    assert doc["id"] == "a"
+    assert doc["id"] == "a.txt"
     assert doc["text"] == "hello world"
     assert doc["metadata"]["filename"] == "a.txt"
     assert doc["metadata"]["type"] == "txt"
@@ -76,7 +76,7 @@ def test_ignores_non_txt_files(tmp_path: Path, loader: DocumentLoader) -> None:
     docs = loader.load_documents(str(tmp_path))
 
     assert len(docs) == 1
-    assert docs[0]["id"] == "a"
+    assert docs[0]["id"] == "a.txt"
 
 
 def test_skips_empty_files(tmp_path: Path, loader: DocumentLoader) -> None:
@@ -88,7 +88,7 @@ def test_skips_empty_files(tmp_path: Path, loader: DocumentLoader) -> None:
     docs = loader.load_documents(str(tmp_path))
 
     assert len(docs) == 1
-    assert docs[0]["id"] == "valid"
+    assert docs[0]["id"] == "valid.txt"
     assert docs[0]["text"] == "content"
 
 
@@ -100,11 +100,11 @@ def test_loads_multiple_text_files(tmp_path: Path, loader: DocumentLoader) -> No
 
     docs = loader.load_documents(str(tmp_path))
     ids = {d["id"] for d in docs}
-    assert ids == {"one", "two", "three"}
+    assert ids == {"one.txt", "two.txt", "three.txt"}
 
     for d in docs:
         assert set(d.keys()) == {"id", "text", "metadata"}
-        assert d["metadata"]["filename"] == f"{d['id']}.txt"
+        assert d["metadata"]["filename"] == d["id"]
         assert d["metadata"]["type"] == "txt"
         assert isinstance(d["text"], str) and d["text"].strip() != ""
 
@@ -165,3 +165,94 @@ def test_load_pdf_file_logs_warning_on_exception(
 
     assert docs == []
     assert "Failed to load" in caplog.text
+
+
+def test_list_files_orders_text_then_pdf(tmp_path: Path, loader: DocumentLoader) -> None:
+    """list_files returns text files then PDFs, each sorted by name."""
+    _write_file(tmp_path / "b.txt", "b")
+    _write_file(tmp_path / "a.txt", "a")
+    (tmp_path / "c.pdf").write_bytes(b"%PDF-1.4")
+    _write_file(tmp_path / "d.md", "ignored")
+
+    names = [p.name for p in loader.list_files(str(tmp_path))]
+
+    assert names == ["a.txt", "b.txt", "c.pdf"]
+
+
+def test_load_file_dispatches_on_suffix(tmp_path: Path, loader: DocumentLoader) -> None:
+    """load_file loads a single file on its own."""
+    _write_file(tmp_path / "a.txt", "hello world")
+
+    docs = loader.load_file(tmp_path / "a.txt")
+
+    assert len(docs) == 1
+    assert docs[0]["id"] == "a.txt"
+
+
+def test_parallel_load_matches_serial(tmp_path: Path) -> None:
+    """Loading with a process pool gives the same documents in the same order."""
+    for i in range(6):
+        _write_file(tmp_path / f"doc{i}.txt", f"document number {i} " * 50)
+
+    chunker = DocumentChunker(chunk_size=20, overlap=5)
+    serial = DocumentLoader(chunker=chunker).load_documents(str(tmp_path))
+    parallel = DocumentLoader(chunker=chunker, workers=2).load_documents(str(tmp_path))
+
+    assert parallel == serial
+
+
+def test_parallel_pdf_page_split_matches_serial() -> None:
+    """A PDF extracted in page ranges across workers matches a serial load."""
+    pdf = Path(__file__).parent / "data" / "MSAI-courses.pdf"
+    chunker = DocumentChunker()
+
+    serial = DocumentLoader(chunker=chunker).load_file(pdf)
+    split = DocumentLoader(chunker=chunker, workers=2, pdf_pages_per_task=4)
+    [(filepath, parallel)] = list(split.load_files([pdf]))
+
+    assert filepath == pdf
+    assert parallel == serial
+    assert parallel[0]["metadata"]["num_pages"] == 31
+
+
+def test_parallel_token_chunks_match_serial() -> None:
+    """Workers rebuild a token chunker from its tokenizer's name."""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+    chunker = DocumentChunker(chunk_size=64, overlap=8, tokenizer=tokenizer)
+    pdf = Path(__file__).parent / "data" / "MSAI-courses.pdf"
+
+    serial = DocumentLoader(chunker=chunker).load_file(pdf)
+    split = DocumentLoader(chunker=chunker, workers=2, pdf_pages_per_task=8)
+    [(_filepath, parallel)] = list(split.load_files([pdf]))
+
+    assert parallel == serial
+
+
+def test_parallel_load_skips_broken_pdf(tmp_path: Path) -> None:
+    """A broken PDF in a parallel load is skipped like in a serial one."""
+    _write_file(tmp_path / "a.txt", "hello")
+    (tmp_path / "bad.pdf").write_bytes(b"%PDF-1.4 broken")
+
+    docs = DocumentLoader(workers=2).load_documents(str(tmp_path))
+
+    assert [d["id"] for d in docs] == ["a.txt"]
+
+
+def test_bad_worker_settings_raise() -> None:
+    with pytest.raises(ValueError):
+        DocumentLoader(workers=0)
+    with pytest.raises(ValueError):
+        DocumentLoader(pdf_pages_per_task=0)
+
+
+def test_iter_documents_is_lazy(tmp_path: Path, loader: DocumentLoader) -> None:
+    """iter_documents yields the same documents as load_documents, lazily."""
+    _write_file(tmp_path / "a.txt", "first")
+    _write_file(tmp_path / "b.txt", "second")
+
+    docs = loader.iter_documents(str(tmp_path))
+
+    assert next(docs)["id"] == "a.txt"
+    assert [d["id"] for d in docs] == ["b.txt"]
@@ -11,7 +11,13 @@ Covers:
 These tests call the endpoint coroutines directly to keep them fast and deterministic.
 """
 
+import asyncio
 import runpy
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
 
 import pytest
 from fastapi import FastAPI
@@ -19,43 +25,73 @@ from fastapi import FastAPI
 import retrieval.main as m
 
 
-@pytest.mark.anyio
-async def test_lifespan_success_sets_retriever(monkeypatch):
-    """Cover normal lifespan path where DocumentRetriever() succeeds."""
+class GoodRetriever:
+    """Fake retriever that builds and indexes instantly."""
 
-    class GoodRetriever:
-        def __init__(self):
-            pass
+    progress = None
 
-        @property
-        def document_count(self):
-            return 0
+    def __init__(self, **kwargs):
+        self.closed = False
+
+    @property
+    def document_count(self):
+        return 0
+
+    def index_documents(self, directory):
+        return 3
+
+    def cache_stats(self):
+        return {"results": {"entries": 2, "hits": 3, "misses": 1}, "embeddings": None}
+
+    def encode_stats(self):
+        return {"texts": 10, "tokens": 200, "seconds": 0.5}
+
+    def search_many(self, queries, n_results=5, **options):
+        return [[] for _ in queries]
+
+    def shutdown(self):
+        self.closed = True
 
+
+@pytest.mark.anyio
+async def test_lifespan_success_sets_retriever(monkeypatch):
+    """Cover normal lifespan path where DocumentRetriever() succeeds."""
     monkeypatch.setattr(m, "DocumentRetriever", GoodRetriever)
 
     # Ensure starting state
     m.retriever = None
 
     async with m.lifespan(FastAPI()):
-        # retriever should be created inside lifespan
+        # the retriever is built and indexed in the background
+        assert await m.indexer.wait_ready(timeout=5)
         assert m.retriever is not None
+        assert m.indexer.documents_indexed == 3
+        assert m.batcher is not None
+
+    assert m.retriever.closed
+    assert m.indexer is None
 
 
 @pytest.mark.anyio
 async def test_lifespan_exception_is_handled(monkeypatch):
-    """Cover lifespan() exception handler lines (your missing 65-67)."""
+    """A failing startup doesn't crash the server, and is retried."""
 
     class BadRetriever:
-        def __init__(self):
+        def __init__(self, **kwargs):
             raise RuntimeError("boom")
 
     monkeypatch.setattr(m, "DocumentRetriever", BadRetriever)
+    monkeypatch.setattr(m, "STARTUP_RETRY_SECONDS", 0.01)
     m.retriever = None
 
     # Should not raise; lifespan should catch and continue
     async with m.lifespan(FastAPI()):
-        pass
+        while m.indexer.attempts < 2:
+            await asyncio.sleep(0.01)
+        status = m.indexer.status()
 
+    assert status["state"] == "failed"
+    assert status["error"] == "boom"
     # retriever remains None if init failed
     assert m.retriever is None
 
@@ -78,17 +114,139 @@ async def test_health_healthy_with_retriever():
         def document_count(self):
             return 42
 
+        def cache_stats(self):
+            return {"results": {"entries": 3, "bytes": 1024, "hit_rate": 0.5}}
+
+        def encode_stats(self):
+            return {"texts": 10, "texts_per_second": 100.0}
+
     m.retriever = FakeRetriever()
     resp = await m.health_check()
 
     assert resp.status == "healthy"
     assert resp.documents_indexed == 42
+    assert resp.cache["results"]["hit_rate"] == 0.5
+    assert resp.encode["texts_per_second"] == 100.0
+    assert resp.ready is True
+
+
+@pytest.mark.anyio
+async def test_metrics_report_the_retriever(monkeypatch):
+    """/metrics is Prometheus text, with the retriever's state while the app runs."""
+    monkeypatch.setattr(m, "DocumentRetriever", GoodRetriever)
+    m.retriever = None
+
+    async with m.lifespan(FastAPI()):
+        assert await m.indexer.wait_ready(timeout=5)
+        resp = await m.metrics()
+
+    body = resp.body.decode()
+    assert resp.media_type.startswith("text/plain; version=0.0.4")
+    assert "# TYPE retrieval_search_stage_seconds histogram" in body
+    assert "retrieval_ready 1" in body
+    assert 'retrieval_cache_hits_total{cache="results"} 3' in body
+    assert "retrieval_encoded_texts_total 10" in body
+    # the collector goes away with the app
+    assert "retrieval_ready" not in (await m.metrics()).body.decode()
+
+
+class IndexingRetriever:
+    """Fake retriever whose startup indexing blocks until released."""
+
+    def __init__(self, documents=0):
+        self.documents = documents
+        self.release = threading.Event()
+        self.progress = None
+
+    @property
+    def document_count(self):
+        return self.documents
+
+    def cache_stats(self):
+        return {}
+
+    def encode_stats(self):
+        return {}
+
+    def index_documents(self, directory):
+        self.release.wait(5)
+        return self.documents
+
+    def search(self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False):
+        return [{"id": "x_0", "text": query, "metadata": {}, "distance": 0.1}]
+
+    def shutdown(self):
+        self.release.set()
+
+
+async def _start_indexing(monkeypatch, fake):
+    """Helper running a BackgroundIndexer on a fake until it is indexing."""
+
+    async def use(retriever):
+        m.retriever = retriever
+
+    indexer = m.BackgroundIndexer(lambda: fake, "docs", on_retriever=use)
+    monkeypatch.setattr(m, "indexer", indexer)
+    monkeypatch.setattr(m, "batcher", None)
+    indexer.start()
+    while indexer.state != "indexing":
+        await asyncio.sleep(0.01)
+    return indexer
+
+
+@pytest.mark.anyio
+async def test_readiness_while_indexing(monkeypatch):
+    """Liveness passes at once; readiness waits for indexing and says when to retry."""
+    fake = IndexingRetriever()
+    indexer = await _start_indexing(monkeypatch, fake)
+    try:
+        assert (await m.liveness())["status"] == "alive"
+
+        resp = await m.readiness()
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "5"
+        health = await m.health_check()
+        assert health.ready is False
+        assert health.startup["state"] == "indexing"
+
+        fake.release.set()
+        assert await indexer.wait_ready(timeout=5)
+        assert (await m.readiness())["ready"] is True
+        assert (await m.health_check()).ready is True
+    finally:
+        await indexer.stop()
+
+
+@pytest.mark.anyio
+async def test_search_while_indexing_is_partial_or_503(monkeypatch):
+    fake = IndexingRetriever()
+    indexer = await _start_indexing(monkeypatch, fake)
+    try:
+        # nothing indexed yet: come back later
+        with pytest.raises(m.HTTPException) as exc:
+            await m.search(m.SearchRequest(query="garlic"))
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"] == "5"
+
+        # some chunks stored: serve them, flagged as partial
+        fake.documents = 10
+        resp = await m.search(m.SearchRequest(query="garlic"))
+        assert resp.partial is True and resp.count == 1
+
+        fake.release.set()
+        await indexer.wait_ready(timeout=5)
+        resp = await m.search(m.SearchRequest(query="garlic"))
+        assert resp.partial is False
+    finally:
+        await indexer.stop()
 
 
 @pytest.mark.anyio
 async def test_search_success_returns_results():
     class OkRetriever:
-        def search(self, query, n_results=5):
+        def search(
+            self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
             return [
                 {
                     "id": "x_0",
@@ -126,7 +284,9 @@ async def test_search_400_empty_query():
     """Cover search() empty query validation branch."""
 
     class FakeRetriever:
-        def search(self, query, n_results=5):
+        def search(
+            self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
             return []
 
     m.retriever = FakeRetriever()
@@ -143,7 +303,9 @@ async def test_search_400_bad_n_results_low_high():
     """Cover search() n_results bounds checks."""
 
     class FakeRetriever:
-        def search(self, query, n_results=5):
+        def search(
+            self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
             return []
 
     m.retriever = FakeRetriever()
@@ -157,12 +319,32 @@ async def test_search_400_bad_n_results_low_high():
     assert exc2.value.status_code == 400
 
 
+@pytest.mark.anyio
+async def test_search_passes_mode_and_rejects_unknown_modes():
+    class ModeRetriever:
+        def search(
+            self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
+            return [{"id": mode, "text": query, "metadata": {}, "distance": None, "score": 1.0}]
+
+    m.retriever = ModeRetriever()
+
+    resp = await m.search(m.SearchRequest(query="ERR_429", mode="lexical"))
+    assert resp.results[0]["id"] == "lexical"
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.search(m.SearchRequest(query="x", mode="fuzzy"))
+    assert exc.value.status_code == 400
+
+
 @pytest.mark.anyio
 async def test_search_500_when_retriever_throws():
     """Cover search() exception handler (your missing 118-120)."""
 
     class BoomRetriever:
-        def search(self, query, n_results=5):
+        def search(
+            self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
             raise RuntimeError("boom")
 
     m.retriever = BoomRetriever()
@@ -193,3 +375,319 @@ def test_dunder_main_prints_uvicorn_command(capsys):
     runpy.run_module("retrieval.main", run_name="__main__")
     out = capsys.readouterr().out.lower()
     assert "uvicorn" in out
+
+
+def test_import_leaves_heavy_dependencies_unloaded():
+    """Importing the app must not load the model, ChromaDB or pypdf (see bench_import.py)."""
+    heavy = ("chromadb", "sentence_transformers", "torch", "pypdf")
+    code = f"import sys, src.retrieval.main; print([m for m in {heavy!r} if m in sys.modules])"
+    root = Path(__file__).resolve().parents[1]
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True
+    ).stdout
+    assert out.strip() == "[]"
+
+
+class SyncingRetriever:
+    """Fake retriever whose sync reports one change of each kind."""
+
+    def sync_documents(self, directory):
+        return {
+            "added": ["new.txt"],
+            "updated": ["edited.txt"],
+            "deleted": ["gone.txt"],
+            "unchanged": [],
+        }
+
+    @property
+    def document_count(self):
+        return 7
+
+
+@pytest.mark.anyio
+async def test_admin_sync_disabled_without_token(monkeypatch):
+    """Admin endpoints are off unless an admin token is configured."""
+    monkeypatch.setattr(m, "ADMIN_TOKEN", None)
+    m.retriever = SyncingRetriever()
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.sync_documents(x_admin_token="anything")
+
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_admin_sync_rejects_bad_token(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    m.retriever = SyncingRetriever()
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.sync_documents(x_admin_token="wrong")
+    assert exc.value.status_code == 401
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.sync_documents(x_admin_token=None)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_admin_sync_success(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    m.retriever = SyncingRetriever()
+
+    resp = await m.sync_documents(x_admin_token="s3cret")
+
+    assert resp.added == ["new.txt"]
+    assert resp.updated == ["edited.txt"]
+    assert resp.deleted == ["gone.txt"]
+    assert resp.documents_indexed == 7
+
+
+@pytest.mark.anyio
+async def test_admin_sync_503_when_no_retriever(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    m.retriever = None
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.sync_documents(x_admin_token="s3cret")
+
+    assert exc.value.status_code == 503
+
+
+@pytest.mark.anyio
+async def test_admin_sync_500_when_sync_throws(monkeypatch):
+    class BoomRetriever:
+        def sync_documents(self, directory):
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    m.retriever = BoomRetriever()
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.sync_documents(x_admin_token="s3cret")
+
+    assert exc.value.status_code == 500
+
+
+@pytest.mark.anyio
+async def test_search_goes_through_batcher(monkeypatch):
+    """With a batcher running, /search is answered by a batched search_many."""
+
+    class ManyRetriever:
+        def search_many(
+            self, queries, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
+            return [[{"id": f"{q}_0", "text": q, "metadata": {}, "distance": 0.0}] for q in queries]
+
+    m.retriever = ManyRetriever()
+    batcher = m.QueryBatcher(m.retriever.search_many, max_wait_ms=0)
+    await batcher.start()
+    monkeypatch.setattr(m, "batcher", batcher)
+    try:
+        resp = await m.search(m.SearchRequest(query="garlic", n_results=1))
+    finally:
+        await batcher.stop()
+
+    assert resp.results[0]["id"] == "garlic_0"
+    assert batcher.stats()["batches"] == 1
+
+
+class BatchRetriever:
+    """Fake retriever answering search_many with one hit per query."""
+
+    def __init__(self):
+        self.calls = []
+        self.modes = []
+        self.wheres = []
+        self.collapses = []
+
+    def search_many(
+        self, queries, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+    ):
+        self.calls.append(list(queries))
+        self.modes.append(mode)
+        self.wheres.append(where)
+        self.collapses.append(collapse_duplicates)
+        return [[{"id": f"{q}_0", "text": q, "metadata": {}, "distance": 0.0}] for q in queries]
+
+
+@pytest.mark.anyio
+async def test_search_batch_returns_results_in_order():
+    m.retriever = BatchRetriever()
+
+    resp = await m.search_batch(m.BatchSearchRequest(queries=["a", "b", "c"], n_results=1))
+
+    assert m.retriever.calls == [["a", "b", "c"]]
+    assert resp.count == 3
+    assert [r.query for r in resp.results] == ["a", "b", "c"]
+    assert resp.results[1].results[0]["id"] == "b_0"
+
+
+@pytest.mark.anyio
+async def test_search_pushes_filters_down():
+    class FilterRetriever:
+        def search(
+            self, query, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
+            self.where = where
+            self.collapse = collapse_duplicates
+            return []
+
+    m.retriever = FilterRetriever()
+
+    await m.search(m.SearchRequest(query="x", filters={"type": "pdf", "min_pages": 2}))
+    assert m.retriever.where == {"$and": [{"type": "pdf"}, {"num_pages": {"$gte": 2}}]}
+
+    await m.search(m.SearchRequest(query="x", filters={}, collapse_duplicates=True))
+    assert m.retriever.where is None
+    assert m.retriever.collapse is True
+
+    for filters in ({"type": []}, {"min_pages": -1}, {"min_pages": 5, "max_pages": 2}):
+        with pytest.raises(m.HTTPException) as exc:
+            await m.search(m.SearchRequest(query="x", filters=filters))
+        assert exc.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_search_batch_passes_mode():
+    m.retriever = BatchRetriever()
+
+    await m.search_batch(
+        m.BatchSearchRequest(
+            queries=["a"], mode="hybrid", filters={"doc_id": ["a", "b"]}, collapse_duplicates=True
+        )
+    )
+
+    assert m.retriever.modes == ["hybrid"]
+    assert m.retriever.wheres == [{"doc_id": {"$in": ["a", "b"]}}]
+    assert m.retriever.collapses == [True]
+
+
+@pytest.mark.anyio
+async def test_search_batch_validation(monkeypatch):
+    m.retriever = BatchRetriever()
+    monkeypatch.setattr(m, "MAX_BATCH_QUERIES", 2)
+
+    for request in (
+        m.BatchSearchRequest(queries=[]),
+        m.BatchSearchRequest(queries=["a", "b", "c"]),
+        m.BatchSearchRequest(queries=["a", "  "]),
+        m.BatchSearchRequest(queries=["a"], n_results=0),
+        m.BatchSearchRequest(queries=["a"], n_results=21),
+        m.BatchSearchRequest(queries=["a"], mode="fuzzy"),
+    ):
+        with pytest.raises(m.HTTPException) as exc:
+            await m.search_batch(request)
+        assert exc.value.status_code == 400
+
+    assert m.retriever.calls == []
+
+
+@pytest.mark.anyio
+async def test_search_batch_503_and_500():
+    m.retriever = None
+    with pytest.raises(m.HTTPException) as exc:
+        await m.search_batch(m.BatchSearchRequest(queries=["a"]))
+    assert exc.value.status_code == 503
+
+    class BoomRetriever:
+        def search_many(
+            self, queries, n_results=5, mode="semantic", where=None, collapse_duplicates=False
+        ):
+            raise RuntimeError("boom")
+
+    m.retriever = BoomRetriever()
+    with pytest.raises(m.HTTPException) as exc:
+        await m.search_batch(m.BatchSearchRequest(queries=["a"]))
+    assert exc.value.status_code == 500
+
+
+class ProfiledRetriever:
+    """Fake retriever whose sync keeps a thread busy for a while."""
+
+    def sync_documents(self, directory):
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            sum(range(1000))
+        return {}
+
+
+@pytest.mark.anyio
+async def test_profiling_is_off_by_default(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(m, "PROFILING", False)
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.profile(sync=True, x_admin_token="s3cret")
+
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_profile_needs_requests_or_a_sync(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(m, "PROFILING", True)
+
+    for options in ({}, {"requests": 2, "sync": True}, {"requests": 2, "timeout": 0}):
+        with pytest.raises(m.HTTPException) as exc:
+            await m.profile(x_admin_token="s3cret", **options)
+        assert exc.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_profile_a_sync_returns_folded_stacks(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(m, "PROFILING", True)
+    monkeypatch.setattr(m, "PROFILE_INTERVAL_MS", 1)
+    m.retriever = ProfiledRetriever()
+
+    resp = await m.profile(sync=True, x_admin_token="s3cret")
+
+    assert "profile.folded" in resp.headers["Content-Disposition"]
+    assert int(resp.headers["X-Profile-Samples"]) > 0
+    assert "ProfiledRetriever.sync_documents (test_main.py:" in resp.body.decode()
+    assert m.profiler is None
+
+
+@pytest.mark.anyio
+async def test_profile_the_next_requests(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(m, "PROFILING", True)
+
+    task = asyncio.create_task(m.profile(requests=2, timeout=5, x_admin_token="s3cret"))
+    while m.profile_countdown is None:
+        await asyncio.sleep(0.01)
+
+    # one profile at a time
+    with pytest.raises(m.HTTPException) as exc:
+        await m.profile(requests=1, x_admin_token="s3cret")
+    assert exc.value.status_code == 409
+
+    m.count_profiled_request()
+    m.count_profiled_request()
+    resp = await task
+
+    assert resp.headers["X-Profiled-Requests"] == "2"
+    assert m.profile_countdown is None
+
+    # too few requests: the profile so far comes back at the timeout
+    resp = await m.profile(requests=3, timeout=0.05, x_admin_token="s3cret")
+    assert resp.headers["X-Profiled-Requests"] == "0"
+
+
+@pytest.mark.anyio
+async def test_profile_errors_name_the_profile_not_a_sync(monkeypatch):
+    monkeypatch.setattr(m, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(m, "PROFILING", True)
+
+    async def broken_wait(self, timeout):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(m.RequestCountdown, "wait", broken_wait)
+
+    with pytest.raises(m.HTTPException) as exc:
+        await m.profile(requests=1, x_admin_token="s3cret")
+
+    assert exc.value.status_code == 500
+    assert exc.value.detail == "Profiling failed"
+    assert m.profiler is None
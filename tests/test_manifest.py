@@ -0,0 +1,139 @@
+"""
+Unit tests for IndexManifest.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from retrieval.manifest import IndexManifest, file_sha256
+
+
+def _indexed(manifest: IndexManifest, filepath: Path, ids=("a_0",)) -> None:
+    """Helper to record a file as indexed."""
+    manifest.record(filepath, manifest.fingerprint(filepath), list(ids))
+
+
+def test_new_file_is_not_current(tmp_path: Path) -> None:
+    """A file the manifest has never seen needs indexing."""
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+
+    assert not IndexManifest().is_current(f)
+
+
+def test_recorded_file_is_current(tmp_path: Path) -> None:
+    """A recorded, untouched file is current and keeps its ids."""
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+    manifest = IndexManifest()
+    _indexed(manifest, f, ids=["a_0", "a_1"])
+
+    assert manifest.is_current(f)
+    assert f in manifest
+    assert manifest.get(f)["ids"] == ["a_0", "a_1"]
+    assert manifest.get(f)["sha256"] == file_sha256(f)
+
+
+def test_touched_but_unchanged_file_is_current(tmp_path: Path) -> None:
+    """A new mtime with the same contents doesn't need re-embedding."""
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+    manifest = IndexManifest()
+    _indexed(manifest, f)
+
+    stat = f.stat()
+    os.utime(f, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+    assert manifest.is_current(f)
+    assert manifest.get(f)["mtime_ns"] == f.stat().st_mtime_ns
+
+
+def test_edited_file_is_not_current(tmp_path: Path) -> None:
+    """Same size but different contents is caught by the hash."""
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+    manifest = IndexManifest()
+    _indexed(manifest, f)
+
+    f.write_text("jello", encoding="utf-8")
+    stat = f.stat()
+    os.utime(f, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+    assert not manifest.is_current(f)
+
+
+def test_save_and_reload(tmp_path: Path) -> None:
+    """A saved manifest reloads with the same entries."""
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+    path = tmp_path / "index" / "manifest.json"
+    config = {"model_name": "m", "chunk_size": 300}
+
+    manifest = IndexManifest(path, config=config)
+    _indexed(manifest, f)
+    manifest.save()
+
+    reloaded = IndexManifest(path, config=config)
+    assert not reloaded.stale
+    assert len(reloaded) == 1
+    assert reloaded.is_current(f)
+
+
+def test_config_change_marks_stale(tmp_path: Path) -> None:
+    """Changing the model or chunking discards the persisted entries."""
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+    path = tmp_path / "manifest.json"
+
+    manifest = IndexManifest(path, config={"chunk_size": 300})
+    _indexed(manifest, f)
+    manifest.save()
+
+    reloaded = IndexManifest(path, config={"chunk_size": 100})
+    assert reloaded.stale
+    assert len(reloaded) == 0
+
+
+def test_unreadable_manifest_marks_stale(tmp_path: Path) -> None:
+    """A corrupt manifest file is ignored rather than crashing startup."""
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json", encoding="utf-8")
+
+    manifest = IndexManifest(path)
+
+    assert manifest.stale
+    assert len(manifest) == 0
+
+
+def test_remove_and_clear(tmp_path: Path) -> None:
+    """Entries can be removed one at a time or all at once."""
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    a.write_text("a", encoding="utf-8")
+    b.write_text("b", encoding="utf-8")
+    manifest = IndexManifest()
+    _indexed(manifest, a, ids=["a_0"])
+    _indexed(manifest, b, ids=["b_0"])
+
+    assert manifest.remove(a)["ids"] == ["a_0"]
+    assert a not in manifest
+    assert manifest.remove(a) is None
+
+    manifest.clear()
+    assert len(manifest) == 0
+
+
+def test_in_memory_save_is_noop(tmp_path: Path) -> None:
+    """Saving a manifest without a path writes nothing."""
+    manifest = IndexManifest()
+    manifest.save()
+
+    assert list(tmp_path.iterdir()) == []
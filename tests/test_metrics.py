@@ -0,0 +1,108 @@
+"""
+Unit tests for the metrics registry and its Prometheus text output.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from retrieval.metrics import Registry
+
+
+def test_counter_renders_help_type_and_labelled_samples() -> None:
+    registry = Registry()
+    counter = registry.counter("hits_total", "Cache hits.", ("cache",))
+
+    counter.inc("results")
+    counter.inc("results", amount=2)
+
+    assert counter.value("results") == 3
+    assert registry.render().splitlines() == [
+        "# HELP hits_total Cache hits.",
+        "# TYPE hits_total counter",
+        'hits_total{cache="results"} 3',
+    ]
+
+
+def test_counter_without_labels_starts_at_zero() -> None:
+    registry = Registry()
+    registry.counter("files_total", "Files.")
+
+    assert "files_total 0" in registry.render()
+
+
+def test_counter_only_goes_up() -> None:
+    counter = Registry().counter("files_total", "Files.")
+
+    with pytest.raises(ValueError):
+        counter.inc(amount=-1)
+
+
+def test_labels_must_match_the_declared_names() -> None:
+    gauge = Registry().gauge("load_seconds", "Load time.", ("model", "backend"))
+
+    with pytest.raises(ValueError):
+        gauge.set(1.0, "model-only")
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    registry = Registry()
+    histogram = registry.histogram("stage_seconds", "Stage time.", ("stage",))
+
+    for seconds in (0.0002, 0.003, 0.003, 400.0):
+        histogram.observe(seconds, "embed")
+
+    lines = registry.render().splitlines()
+    assert 'stage_seconds_bucket{stage="embed",le="0.0005"} 1' in lines
+    assert 'stage_seconds_bucket{stage="embed",le="0.005"} 3' in lines
+    assert 'stage_seconds_bucket{stage="embed",le="300.0"} 3' in lines
+    assert 'stage_seconds_bucket{stage="embed",le="+Inf"} 4' in lines
+    assert 'stage_seconds_count{stage="embed"} 4' in lines
+    assert any(line.startswith('stage_seconds_sum{stage="embed"} 400.006') for line in lines)
+    assert histogram.value("embed") == 4
+
+
+def test_histogram_times_a_block() -> None:
+    histogram = Registry().histogram("sync_seconds", "Sync time.")
+
+    with histogram.time():
+        pass
+
+    assert histogram.value() == 1
+
+
+def test_label_values_are_escaped() -> None:
+    registry = Registry()
+    registry.gauge("info", "Info.", ("name",)).set(1, 'a "quoted"\\path\n')
+
+    assert 'info{name="a \\"quoted\\"\\\\path\\n"} 1' in registry.render()
+
+
+def test_metric_names_are_unique() -> None:
+    registry = Registry()
+    registry.counter("files_total", "Files.")
+
+    with pytest.raises(ValueError):
+        registry.gauge("files_total", "Files again.")
+
+
+def test_collectors_are_read_on_render_until_unregistered() -> None:
+    registry = Registry()
+    calls = []
+
+    def collect():
+        calls.append(1)
+        return [("documents", "gauge", "Documents indexed.", [({}, 42)])]
+
+    registry.register(collect)
+    assert "# TYPE documents gauge\ndocuments 42\n" in registry.render()
+
+    registry.unregister(collect)
+    assert "documents" not in registry.render()
+    assert len(calls) == 1
@@ -0,0 +1,193 @@
+"""
+Unit tests for IngestionPipeline.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from retrieval.dedup import DuplicateIndex
+from retrieval.pipeline import IngestionCancelled, IngestionPipeline
+
+
+def _groups(sizes):
+    """Helper yielding (key, documents) groups with the given sizes."""
+    for g, size in enumerate(sizes):
+        yield f"file{g}", [{"id": f"file{g}_{i}", "text": f"text {g} {i}"} for i in range(size)]
+
+
+class Recorder:
+    """Fake embedder + store that records what passes through."""
+
+    def __init__(self):
+        self.batches = []
+        self.stored = []
+
+    def embed(self, texts):
+        return [len(text) for text in texts]
+
+    def write(self, documents, embeddings):
+        assert len(documents) == len(embeddings)
+        self.batches.append(len(documents))
+        self.stored.extend(doc["id"] for doc in documents)
+
+
+def test_all_documents_stored_in_order():
+    rec = Recorder()
+    pipeline = IngestionPipeline(rec.embed, rec.write, batch_size=4)
+
+    count = pipeline.run(_groups([3, 5, 0, 2]))
+
+    assert count == 10
+    assert rec.stored == [f"file{g}_{i}" for g, n in enumerate([3, 5, 0, 2]) for i in range(n)]
+    assert rec.batches == [4, 4, 2]
+    assert pipeline.documents_embedded == 10
+    assert pipeline.groups_done == 4
+
+
+def test_group_done_called_after_its_documents_are_stored():
+    rec = Recorder()
+    done = []
+
+    def on_done(key, ids):
+        assert set(ids) <= set(rec.stored)
+        done.append((key, ids))
+
+    IngestionPipeline(rec.embed, rec.write, batch_size=3).run(_groups([2, 4, 0]), on_done)
+
+    assert [key for key, _ in done] == ["file0", "file1", "file2"]
+    assert done[1][1] == ["file1_0", "file1_1", "file1_2", "file1_3"]
+    assert done[2][1] == []
+
+
+def test_stages_overlap_with_bounded_queues():
+    """Loading runs ahead of storing, but only by a bounded number of batches."""
+    rec = Recorder()
+    pipeline = IngestionPipeline(rec.embed, lambda d, e: None, batch_size=1, queue_size=1)
+    release = threading.Event()
+    seen_ahead = []
+
+    def slow_write(documents, embeddings):
+        if not release.is_set():
+            release.wait(0.5)
+            seen_ahead.append(pipeline.documents_loaded)
+            release.set()
+
+    pipeline.write = slow_write
+    pipeline.run(_groups([20]))
+
+    # while the first batch was being written the loader had moved on,
+    # but no further than the queues and stages allow
+    assert 1 < seen_ahead[0] <= 5
+
+
+@pytest.mark.parametrize("stage", ["load", "embed", "write"])
+def test_errors_propagate_from_any_stage(stage):
+    rec = Recorder()
+
+    def groups():
+        yield from _groups([5])
+        if stage == "load":
+            raise RuntimeError("load boom")
+        yield from _groups([5])
+
+    def embed(texts):
+        if stage == "embed":
+            raise RuntimeError("embed boom")
+        return rec.embed(texts)
+
+    def write(documents, embeddings):
+        if stage == "write":
+            raise RuntimeError("write boom")
+        rec.write(documents, embeddings)
+
+    with pytest.raises(RuntimeError, match=f"{stage} boom"):
+        IngestionPipeline(embed, write, batch_size=2).run(groups())
+
+
+def test_cancel_stops_before_the_next_batch():
+    rec = Recorder()
+    cancel = threading.Event()
+    done = []
+
+    def write(documents, embeddings):
+        rec.write(documents, embeddings)
+        cancel.set()
+
+    pipeline = IngestionPipeline(rec.embed, write, batch_size=2)
+    with pytest.raises(IngestionCancelled):
+        pipeline.run(_groups([1, 4]), lambda key, ids: done.append(key), cancel=cancel)
+
+    # the stored batch and the file it finished are kept; nothing after it
+    assert rec.stored == ["file0_0", "file1_0"]
+    assert done == ["file0"]
+
+
+class VectorRecorder:
+    """Fake embedder + store giving every embedded text its own vector."""
+
+    def __init__(self):
+        self.embedded = []
+        self.vectors = {}
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        start = len(self.embedded) - len(texts)
+        return [[float(start + i)] for i in range(len(texts))]
+
+    def write(self, documents, embeddings):
+        assert len(documents) == len(embeddings)
+        self.vectors.update((doc["id"], list(vector)) for doc, vector in zip(documents, embeddings))
+
+    def lookup(self, ids):
+        return {doc_id: self.vectors[doc_id] for doc_id in ids if doc_id in self.vectors}
+
+
+def test_duplicates_reuse_the_original_embedding():
+    rec = VectorRecorder()
+    copy = " ".join(f"word{i}" for i in range(40))
+    groups = [
+        ("file0", [{"id": "a", "text": copy, "metadata": {}}, {"id": "b", "text": "other"}]),
+        # "c" copies "a" from an earlier batch, "d" copies it within this one
+        ("file1", [{"id": "c", "text": copy, "metadata": {"f": 1}}, {"id": "d", "text": copy}]),
+    ]
+    pipeline = IngestionPipeline(
+        rec.embed, rec.write, batch_size=2, duplicates=DuplicateIndex(), lookup=rec.lookup
+    )
+
+    assert pipeline.run(groups) == 4
+
+    assert rec.embedded == [copy, "other"]
+    assert rec.vectors["c"] == rec.vectors["d"] == rec.vectors["a"]
+    assert groups[1][1][0]["metadata"] == {"f": 1, "duplicate_of": "a", "duplicate_similarity": 1.0}
+    assert pipeline.duplicates_found == 2
+    assert pipeline.documents_embedded == 2
+
+
+def test_copy_of_a_deleted_original_is_embedded():
+    rec = VectorRecorder()
+    duplicates = DuplicateIndex()
+    duplicates.add("gone", "some text")  # registered, but no longer stored
+    pipeline = IngestionPipeline(rec.embed, rec.write, duplicates=duplicates, lookup=rec.lookup)
+
+    pipeline.run([("file0", [{"id": "a", "text": "some text"}])])
+
+    assert rec.embedded == ["some text"]
+    assert "a" in rec.vectors
+
+
+def test_bad_settings_raise():
+    with pytest.raises(ValueError):
+        IngestionPipeline(len, print, batch_size=0)
+    with pytest.raises(ValueError):
+        IngestionPipeline(len, print, queue_size=0)
+    with pytest.raises(ValueError):
+        IngestionPipeline(len, print, duplicates=DuplicateIndex())
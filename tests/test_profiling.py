@@ -0,0 +1,112 @@
+"""
+Unit tests for the Server-Timing middleware and the sampling profiler.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from retrieval.metrics import SEARCH_STAGE_SECONDS
+from retrieval.profiling import (
+    RequestCountdown,
+    SamplingProfiler,
+    ServerTimingMiddleware,
+    server_timing,
+)
+
+
+async def _searching_app(scope, receive, send) -> None:
+    """ASGI app that runs one timed search stage, then responds."""
+    with SEARCH_STAGE_SECONDS.time("embed"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _call(app, path: str) -> list[dict]:
+    """Send one GET through an ASGI app; return the messages it sent."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "path": path, "method": "GET", "headers": []}, receive, send)
+    return sent
+
+
+def test_server_timing_lists_stages_then_total_in_ms() -> None:
+    value = server_timing({"embed": 0.0121, "collection": 0.0009}, 0.0142)
+
+    assert value == "embed;dur=12.10, collection;dur=0.90, total;dur=14.20"
+
+
+@pytest.mark.anyio
+async def test_middleware_times_matching_paths_and_counts_their_responses() -> None:
+    responses = []
+    app = ServerTimingMiddleware(_searching_app, on_response=lambda: responses.append(1))
+
+    timed = await _call(app, "/search")
+    untimed = await _call(app, "/health")
+
+    headers = dict(timed[0]["headers"])
+    assert headers[b"server-timing"].startswith(b"embed;dur=")
+    assert b", total;dur=" in headers[b"server-timing"]
+    assert untimed[0]["headers"] == []
+    assert len(responses) == 1
+
+
+def test_profiler_samples_busy_threads_and_drops_idle_ones() -> None:
+    stop = threading.Event()
+
+    def spin() -> None:
+        while not stop.is_set():
+            sum(range(1000))
+
+    busy = threading.Thread(target=spin, name="busy")
+    idle = threading.Thread(target=stop.wait, name="idle")
+    busy.start()
+    idle.start()
+    with SamplingProfiler(interval=0.001) as profiler:
+        while profiler.ticks < 20:
+            time.sleep(0.005)
+    stop.set()
+    busy.join()
+    idle.join()
+
+    lines = profiler.folded().splitlines()
+    assert any(line.startswith("busy;") and "spin (test_profiling.py:" in line for line in lines)
+    assert not any(line.startswith("idle;") for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profiler_does_not_run_until_started() -> None:
+    profiler = SamplingProfiler()
+    time.sleep(0.02)
+
+    assert profiler.ticks == 0
+    assert not any(t.name == "sampling-profiler" for t in threading.enumerate())
+    with pytest.raises(ValueError):
+        SamplingProfiler(interval=0)
+
+
+@pytest.mark.anyio
+async def test_countdown_waits_for_the_responses_or_times_out() -> None:
+    countdown = RequestCountdown(2)
+    countdown.count()
+    assert not await countdown.wait(0.01)
+
+    countdown.count()
+    assert await countdown.wait(0.01)
+    assert countdown.seen == 2
@@ -0,0 +1,145 @@
+"""
+Unit tests for quantized vector codes.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from retrieval.backends import NumpyBackend
+from retrieval.quantization import QUANTIZATIONS, make_quantizer
+
+
+def _clustered_vectors(n: int, dim: int = 64, seed: int = 0) -> np.ndarray:
+    """Helper to make n unit vectors around a few centers, so neighbors are meaningful."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(8, dim))
+    vectors = centers[rng.integers(8, size=n)] + 0.7 * rng.normal(size=(n, dim))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _fill(backend, vectors: np.ndarray) -> None:
+    ids = [f"d{i}" for i in range(len(vectors))]
+    backend.add(ids, ids, [{} for _ in ids], vectors)
+
+
+@pytest.mark.parametrize("name", QUANTIZATIONS)
+def test_coarse_scores_rank_like_exact(name: str) -> None:
+    vectors = _clustered_vectors(200)
+    quantizer = make_quantizer(name, vectors.shape[1])
+    quantizer.refit(vectors)
+
+    coarse = quantizer.scores(vectors[:5], quantizer.encode(vectors))
+
+    # every vector is (one of) its own closest matches under each code
+    assert np.all(coarse.argmax(axis=1) == np.arange(5))
+
+
+def test_code_sizes() -> None:
+    assert make_quantizer("float16", 384).encode(np.ones((1, 384), np.float32)).nbytes == 768
+    assert make_quantizer("binary", 384).encode(np.ones((1, 384), np.float32)).nbytes == 48
+    int8 = make_quantizer("int8", 384)
+    int8.refit(np.ones((1, 384), np.float32))
+    assert int8.encode(np.ones((1, 384), np.float32)).nbytes == 384
+
+
+def test_int8_refit_widens_scale() -> None:
+    quantizer = make_quantizer("int8", 2)
+    assert quantizer.refit(np.array([[0.1, 0.1]], np.float32)) is False
+    assert quantizer.refit(np.array([[0.1, 0.1]], np.float32)) is False
+    assert quantizer.refit(np.array([[0.9, 0.0]], np.float32)) is True
+    assert quantizer.encode(np.array([[0.9, 0.0]], np.float32))[0, 0] < 127
+
+
+def test_unknown_quantization_raises() -> None:
+    with pytest.raises(ValueError):
+        make_quantizer("int4", 8)
+    with pytest.raises(ValueError):
+        NumpyBackend(quantization="int4")
+
+
+@pytest.mark.parametrize("name", ["float16", "int8"])
+def test_rescored_results_match_exact(name: str) -> None:
+    vectors = _clustered_vectors(2000)
+    queries = _clustered_vectors(20, seed=1)
+    exact, quantized = NumpyBackend(), NumpyBackend(quantization=name, rescore_factor=20)
+    _fill(exact, vectors)
+    _fill(quantized, vectors)
+
+    expected = exact.query(queries, n_results=5)
+    got = quantized.query(queries, n_results=5)
+
+    recall = np.mean(
+        [len({h["id"] for h in e} & {h["id"] for h in g}) / 5 for e, g in zip(expected, got)]
+    )
+    assert recall >= 0.9
+    # rescoring uses the full vectors, so distances are exact
+    assert got[0][0]["distance"] == pytest.approx(expected[0][0]["distance"], abs=1e-5)
+
+
+def test_binary_finds_near_duplicates() -> None:
+    vectors = _clustered_vectors(2000)
+    noise = np.random.default_rng(2).normal(scale=0.05, size=(50, vectors.shape[1]))
+    queries = (vectors[:50] + noise).astype(np.float32)
+    backend = NumpyBackend(quantization="binary", rescore_factor=10)
+    _fill(backend, vectors)
+
+    hits = backend.query(queries, n_results=1)
+
+    assert [h[0]["id"] for h in hits] == [f"d{i}" for i in range(50)]
+
+
+def test_quantized_delete_and_upsert_keep_codes_in_step() -> None:
+    vectors = _clustered_vectors(500)
+    backend = NumpyBackend(quantization="int8", rescore_factor=2)
+    _fill(backend, vectors)
+
+    backend.delete([f"d{i}" for i in range(0, 250)])
+    backend.upsert(["d499"], ["moved"], [{}], vectors[:1])
+
+    hits = backend.query(vectors[:1], n_results=1)[0]
+    assert hits[0]["id"] == "d499"
+    assert backend.query(vectors[300:301], n_results=1)[0][0]["id"] == "d300"
+
+
+def test_flushed_vectors_are_memory_mapped(tmp_path: Path) -> None:
+    vectors = _clustered_vectors(300)
+    backend = NumpyBackend(tmp_path, quantization="binary")
+    _fill(backend, vectors)
+    assert backend.stats()["vectors_in_memory"] is True
+
+    backend.flush()
+    reopened = NumpyBackend(tmp_path, quantization="binary")
+
+    for b in (backend, reopened):
+        stats = b.stats()
+        assert stats["vectors_in_memory"] is False
+        assert stats["code_bytes"] * 32 == stats["vector_bytes"]
+        assert b.query(vectors[42:43], n_results=1)[0][0]["id"] == "d42"
+
+    # writes after a flush still work on the mapped copy
+    backend.upsert(["new"], ["new"], [{}], vectors[:1])
+    assert backend.count() == 301
+
+
+def test_memory_only_vectors_are_spilled_to_disk() -> None:
+    vectors = _clustered_vectors(300)
+    backend = NumpyBackend(quantization="int8")
+    _fill(backend, vectors)
+
+    assert backend.stats()["vectors_in_memory"] is False
+    assert backend.query(vectors[42:43], n_results=1)[0][0]["id"] == "d42"
+
+    backend.delete(["d42"])
+    assert backend.query(vectors[42:43], n_results=1)[0][0]["id"] != "d42"
+    assert NumpyBackend().stats()["vectors_in_memory"] is True
@@ -8,10 +8,14 @@ Seattle University, ARIN 5360
 @version: 1.0.0+w26
 """
 
+import multiprocessing
+import shutil
 from pathlib import Path
 
 import pytest
 
+from retrieval import metrics
+from retrieval.pipeline import IngestionCancelled
 from retrieval.retriever import DocumentRetriever
 
 
@@ -159,3 +163,418 @@ def test_with_chunks(retriever):
 
     assert len(results) > 0
     assert "5 credits" in results[0]["text"]
+
+
+def test_persistent_index_survives_restart(sample_directory, tmp_path):
+    """A second retriever on the same directory reuses the saved index."""
+    persist_dir = str(tmp_path / "index")
+
+    first = DocumentRetriever(persist_directory=persist_dir)
+    assert first.index_documents(sample_directory) == 3
+
+    second = DocumentRetriever(persist_directory=persist_dir)
+    assert second.document_count == 3
+    assert second._indexed is True
+    assert second.index_documents(sample_directory) == 0
+    assert second.document_count == 3
+
+    results = second.search("How about Python?", n_results=1)
+    assert results[0]["metadata"]["filename"] == "doc1.txt"
+
+
+def test_changed_file_is_reembedded(sample_directory, tmp_path):
+    """Only edited files are re-indexed, and their old chunks are replaced."""
+    persist_dir = str(tmp_path / "index")
+    DocumentRetriever(persist_directory=persist_dir).index_documents(sample_directory)
+
+    (Path(sample_directory) / "doc1.txt").write_text("Garlic keeps vampires away")
+
+    restarted = DocumentRetriever(persist_directory=persist_dir)
+    restarted.index_documents(sample_directory)
+
+    assert restarted.document_count == 3
+    results = restarted.search("garlic and vampires", n_results=1)
+    assert results[0]["metadata"]["filename"] == "doc1.txt"
+    assert "Garlic" in results[0]["text"]
+
+
+def test_reindex_same_directory_is_noop(retriever, sample_directory):
+    """Indexing an unchanged directory twice doesn't add anything."""
+    retriever.index_documents(sample_directory)
+
+    assert retriever.index_documents(sample_directory) == 0
+    assert retriever.document_count == 3
+
+
+def test_sync_reports_added_updated_deleted(retriever, sample_directory):
+    """sync_documents only touches files that were added, edited or removed."""
+    report = retriever.sync_documents(sample_directory)
+    assert sorted(report["added"]) == ["doc1.txt", "doc2.txt", "doc3.txt"]
+
+    directory = Path(sample_directory)
+    (directory / "doc1.txt").write_text("Python is a snake as well as a language")
+    (directory / "doc2.txt").unlink()
+    (directory / "doc4.txt").write_text("Garlic keeps vampires away")
+
+    report = retriever.sync_documents(sample_directory)
+
+    assert report["added"] == ["doc4.txt"]
+    assert report["updated"] == ["doc1.txt"]
+    assert report["deleted"] == ["doc2.txt"]
+    assert report["unchanged"] == ["doc3.txt"]
+    assert retriever.document_count == 3
+
+    filenames = {r["metadata"]["filename"] for r in retriever.search("anything", n_results=5)}
+    assert filenames == {"doc1.txt", "doc3.txt", "doc4.txt"}
+
+
+def test_sync_drops_chunks_when_file_shrinks(tmp_path):
+    """Chunks past the end of a shortened file are deleted."""
+    retriever = DocumentRetriever(chunk_size=10, overlap=2)
+    doc = tmp_path / "long.txt"
+    doc.write_text("word " * 50)
+    retriever.sync_documents(str(tmp_path))
+    assert retriever.document_count == 7
+
+    doc.write_text("just a few words now")
+    report = retriever.sync_documents(str(tmp_path))
+
+    assert report["updated"] == ["long.txt"]
+    assert retriever.document_count == 1
+
+
+def test_sync_keeps_files_sharing_a_stem_apart(tmp_path):
+    """Shrinking or deleting a.txt leaves the chunks of a.pdf alone."""
+    retriever = DocumentRetriever(chunk_size=10, overlap=2)
+    shutil.copy(Path(__file__).parent / "data" / "MSAI-courses.pdf", tmp_path / "a.pdf")
+    (tmp_path / "a.txt").write_text("word " * 50)
+    retriever.sync_documents(str(tmp_path))
+    pdf_ids = retriever.manifest.get(tmp_path / "a.pdf")["ids"]
+    assert retriever.document_count == len(pdf_ids) + 7
+
+    (tmp_path / "a.txt").write_text("just a few words now")
+    retriever.sync_documents(str(tmp_path))
+    assert retriever.document_count == len(pdf_ids) + 1
+
+    (tmp_path / "a.txt").unlink()
+    report = retriever.sync_documents(str(tmp_path))
+
+    assert report["deleted"] == ["a.txt"]
+    assert len(retriever.store.backend.get(pdf_ids)) == len(pdf_ids) == retriever.document_count
+
+
+def test_sync_leaves_other_directories_alone(retriever, sample_directory, tmp_path):
+    """Syncing one directory doesn't delete files indexed from another."""
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "extra.txt").write_text("Kubernetes scales pods horizontally")
+    retriever.sync_documents(str(other))
+
+    report = retriever.sync_documents(sample_directory)
+
+    assert report["deleted"] == []
+    assert retriever.document_count == 4
+
+
+def test_embedding_cache_shared_between_retrievers(sample_directory, tmp_path):
+    """A fresh in-memory index re-uses embeddings cached by an earlier one."""
+    cache_dir = str(tmp_path / "cache")
+    DocumentRetriever(embedding_cache_dir=cache_dir).index_documents(sample_directory)
+
+    second = DocumentRetriever(embedding_cache_dir=cache_dir)
+    second.index_documents(sample_directory)
+
+    stats = second.embedder.cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 0
+
+
+def test_index_in_small_batches(tmp_path):
+    """Chunks spanning many small batches all end up indexed."""
+    retriever = DocumentRetriever(chunk_size=10, overlap=2, batch_size=3)
+    (tmp_path / "a.txt").write_text("alpha " * 50)
+    (tmp_path / "b.txt").write_text("beta " * 30)
+
+    assert retriever.index_documents(str(tmp_path)) == 7 + 4
+    assert retriever.manifest.get(tmp_path / "b.txt")["ids"] == [f"b.txt_{i}" for i in range(4)]
+
+
+def test_search_many(retriever, sample_directory):
+    """search_many answers each query in order."""
+    retriever.index_documents(sample_directory)
+
+    results = retriever.search_many(["Python", "neural networks"], n_results=1)
+
+    assert [r[0]["metadata"]["filename"] for r in results] == ["doc1.txt", "doc2.txt"]
+
+
+def test_lexical_and_hybrid_modes(retriever, sample_directory):
+    """Keyword searches reach the same chunks through the retriever."""
+    retriever.index_documents(sample_directory)
+
+    lexical = retriever.search("embeddings", n_results=3, mode="lexical")
+    hybrid = retriever.search_many(["neural"], n_results=3, mode="hybrid")[0]
+
+    assert [r["metadata"]["filename"] for r in lexical] == ["doc3.txt"]
+    assert hybrid[0]["metadata"]["filename"] == "doc2.txt"
+
+
+def test_search_with_filters(retriever, sample_directory):
+    """Only chunks whose metadata match the filter are ranked."""
+    retriever.index_documents(sample_directory)
+
+    results = retriever.search("Python", n_results=3, where={"doc_id": "doc3"})
+    batched = retriever.search_many(["Python"], n_results=3, where={"filename": "doc2.txt"})
+
+    assert [r["metadata"]["filename"] for r in results] == ["doc3.txt"]
+    assert [r["metadata"]["filename"] for r in batched[0]] == ["doc2.txt"]
+
+
+def test_search_many_before_indexing_raises_error(retriever):
+    with pytest.raises(ValueError, match="No documents indexed"):
+        retriever.search_many(["test query"])
+
+
+def test_cache_stats(retriever, sample_directory):
+    retriever.index_documents(sample_directory)
+    retriever.search("Python")
+    retriever.search("Python")
+
+    stats = retriever.cache_stats()
+
+    assert stats["results"]["hits"] == 1
+    assert stats["results"]["bytes"] > 0
+    assert stats["query_embeddings"]["entries"] == 1
+    assert stats["embeddings"] is None
+
+
+def test_index_with_an_encoding_pool(sample_directory, tmp_path):
+    """Chunks embedded by worker replicas index like in-process ones, and the pool stops."""
+    pooled = DocumentRetriever(encode_workers=2, batch_size=2)
+
+    assert pooled.index_documents(sample_directory) == 3
+    assert pooled.progress.pipeline.batch_size == 4  # a full batch for each worker
+    assert pooled.encode_stats()["texts"] == 3
+    assert not multiprocessing.active_children()
+    assert pooled.search("Python", n_results=1)[0]["metadata"]["filename"]
+
+
+def test_retriever_uses_a_given_embedder(retriever, sample_directory):
+    """An embedder passed in is used as is, settings for building one notwithstanding."""
+    shared = DocumentRetriever(embedder=retriever.embedder, embedding_cache_dir="unused")
+
+    assert shared.embedder is retriever.embedder
+    assert shared.index_documents(sample_directory) == 3
+    assert retriever.encode_stats()["texts"] == 3
+
+
+def test_indexing_and_search_record_metrics(retriever, sample_directory):
+    """Syncs count what they ingest and time their stages; searches time theirs."""
+    chunks, files = metrics.INGESTED_CHUNKS.value(), metrics.INGESTED_FILES.value()
+    loads = metrics.INGEST_STAGE_SECONDS.value("load")
+    stages = {s: metrics.SEARCH_STAGE_SECONDS.value(s) for s in ("embed", "collection", "format")}
+    searches = metrics.SEARCH_SECONDS.value("semantic")
+
+    retriever.index_documents(sample_directory)
+    retriever.search("Python", n_results=1)
+
+    assert metrics.INGESTED_CHUNKS.value() == chunks + 3
+    assert metrics.INGESTED_FILES.value() == files + 3
+    assert metrics.INGEST_STAGE_SECONDS.value("load") == loads + 3
+    assert metrics.SEARCH_SECONDS.value("semantic") == searches + 1
+    for stage, before in stages.items():
+        assert metrics.SEARCH_STAGE_SECONDS.value(stage) == before + 1
+
+
+def test_encode_stats_count_indexed_chunks(retriever, sample_directory):
+    indexed = retriever.index_documents(sample_directory)
+
+    stats = retriever.encode_stats()
+
+    assert stats["texts"] == indexed
+    assert stats["tokens_per_second"] > 0
+
+
+def test_numpy_backend_survives_restart(sample_directory, tmp_path):
+    persist_dir = str(tmp_path / "index")
+    first = DocumentRetriever(persist_directory=persist_dir, backend="numpy")
+    assert first.index_documents(sample_directory) == 3
+
+    second = DocumentRetriever(persist_directory=persist_dir, backend="numpy")
+    assert second.document_count == 3
+    assert second.index_documents(sample_directory) == 0
+    assert second.search("Python", n_results=1)[0]["metadata"]["filename"] == "doc1.txt"
+
+
+def test_switching_backend_rebuilds_index(sample_directory, tmp_path):
+    persist_dir = str(tmp_path / "index")
+    DocumentRetriever(persist_directory=persist_dir).index_documents(sample_directory)
+
+    switched = DocumentRetriever(persist_directory=persist_dir, backend="numpy")
+
+    assert len(switched.manifest) == 0
+    assert switched.index_documents(sample_directory) == 3
+
+
+def test_switching_embedding_backend_rebuilds_index(sample_directory, tmp_path):
+    persist_dir = str(tmp_path / "index")
+    DocumentRetriever(persist_directory=persist_dir).index_documents(sample_directory)
+
+    switched = DocumentRetriever(persist_directory=persist_dir, embedding_backend="int8")
+
+    assert switched.embedder.backend == "int8"
+    assert len(switched.manifest) == 0
+    assert switched.index_documents(sample_directory) == 3
+
+
+def test_workers_share_a_numpy_index(sample_directory, tmp_path):
+    """Retrievers on one persist directory (e.g. uvicorn workers) see each other's syncs."""
+    persist_dir = str(tmp_path / "index")
+    first = DocumentRetriever(persist_directory=persist_dir, backend="numpy")
+    second = DocumentRetriever(persist_directory=persist_dir, backend="numpy")
+    first.index_documents(sample_directory)
+    assert second.index_documents(sample_directory) == 3  # picked up, not re-embedded
+    assert second.sync_documents(sample_directory)["added"] == []
+
+    (Path(sample_directory) / "doc4.txt").write_text("Garlic keeps vampires away")
+    assert first.sync_documents(sample_directory)["added"] == ["doc4.txt"]
+
+    results = second.search("garlic and vampires", n_results=1)
+    assert results[0]["metadata"]["filename"] == "doc4.txt"
+    assert second.store.backend.stats()["vectors_in_memory"] is False
+
+
+def test_token_chunks_are_capped_at_the_model_limit(tmp_path):
+    """In token mode, chunk_size can't exceed what the model reads."""
+    retriever = DocumentRetriever(chunk_size=10_000, overlap=50, chunk_unit="tokens")
+    chunker = retriever.loader.chunker
+
+    assert chunker.tokenizer is not None
+    assert chunker.chunk_size == retriever.embedder.max_tokens < 10_000
+    assert retriever.embedder.max_tokens == retriever.embedder.model.max_seq_length - 2
+
+    (tmp_path / "doc.txt").write_text("garlic " * 1000)
+    retriever.index_documents(str(tmp_path))
+    assert retriever.document_count > 1
+
+    with pytest.raises(ValueError, match="chunk_unit"):
+        DocumentRetriever(chunk_unit="sentences")
+
+
+def test_copies_are_embedded_once_and_collapsed(tmp_path):
+    """A file's copy reuses its embeddings and points back at the original."""
+    retriever = DocumentRetriever(chunk_size=10, overlap=2)
+    embedded = []
+    embed = retriever.embedder.embed_documents
+    retriever.embedder.embed_documents = lambda texts: embedded.extend(texts) or embed(texts)
+    text = " ".join(f"garlic{i}" for i in range(30))
+    (tmp_path / "a.txt").write_text(text)
+    (tmp_path / "b.txt").write_text(text)
+    (tmp_path / "c.txt").write_text("Vector databases store embeddings")
+
+    retriever.index_documents(str(tmp_path))
+
+    assert retriever.document_count == 4 + 4 + 1
+    assert len(embedded) == 4 + 1
+    copy = retriever.store.backend.get(["b.txt_2"])[0]
+    assert copy["metadata"]["duplicate_of"] == "a.txt_2"
+
+    hits = retriever.search("garlic7", n_results=3, collapse_duplicates=True)
+    groups = [hit["metadata"].get("duplicate_of") or hit["id"] for hit in hits]
+    assert len(groups) == len(set(groups)) == 3
+    assert all(len(hit["duplicates"]) == 1 for hit in hits if hit["id"] != "c.txt_0")
+
+
+def test_duplicates_are_found_after_restart(tmp_path):
+    """The registry of distinct chunks is rebuilt from a persisted index."""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("Garlic keeps vampires away from the castle at night")
+    persist_dir = str(tmp_path / "index")
+    DocumentRetriever(persist_directory=persist_dir, backend="numpy").index_documents(str(docs))
+
+    # a sync with nothing to do (like a worker's startup sync) never builds the registry
+    retriever = DocumentRetriever(persist_directory=persist_dir, backend="numpy")
+    retriever.sync_documents(str(docs))
+    assert len(retriever.duplicates) == 0
+
+    (docs / "b.txt").write_text("Garlic keeps vampires away from the castle at night")
+    retriever.index_documents(str(docs))
+
+    assert retriever.store.backend.get(["b.txt_0"])[0]["metadata"]["duplicate_of"] == "a.txt_0"
+
+    # deleting the original leaves the copy, with its own embedding
+    (docs / "a.txt").unlink()
+    retriever.sync_documents(str(docs))
+    assert retriever.search("vampires", n_results=1)[0]["id"] == "b.txt_0"
+    assert "a.txt_0" not in retriever.duplicates
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_copies_follow_their_original_when_it_changes(tmp_path, backend):
+    """Editing or deleting an original re-points or promotes its copies."""
+    retriever = DocumentRetriever(backend=backend, result_cache_size=0)
+    text = "Garlic keeps vampires away from the castle at night"
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(text)
+    retriever.index_documents(str(tmp_path))
+
+    def duplicate_of(doc_id):
+        return retriever.store.backend.get([doc_id])[0]["metadata"].get("duplicate_of")
+
+    assert [duplicate_of(i) for i in ("b.txt_0", "c.txt_0")] == ["a.txt_0", "a.txt_0"]
+
+    # the edited original no longer groups with its old copies, which now group together
+    (tmp_path / "a.txt").write_text("Vector databases store embeddings for search")
+    retriever.sync_documents(str(tmp_path))
+    assert duplicate_of("a.txt_0") is None
+    assert {duplicate_of("b.txt_0"), duplicate_of("c.txt_0")} == {None, "b.txt_0"}
+    hits = retriever.search("vampires", n_results=2, collapse_duplicates=True)
+    assert len(hits) == 2
+    assert {hits[0]["id"], *hits[0]["duplicates"]} == {"b.txt_0", "c.txt_0"}
+
+    # deleting the promoted copy promotes the last one, with its own embedding
+    (tmp_path / "b.txt").unlink()
+    retriever.sync_documents(str(tmp_path))
+    assert duplicate_of("c.txt_0") is None
+    assert "c.txt_0" in retriever.duplicates
+    assert retriever.search("vampires", n_results=1)[0]["id"] == "c.txt_0"
+
+
+def test_dedup_can_be_turned_off(tmp_path):
+    retriever = DocumentRetriever(dedup=False)
+    (tmp_path / "a.txt").write_text("Garlic keeps vampires away")
+    (tmp_path / "b.txt").write_text("Garlic keeps vampires away")
+
+    retriever.index_documents(str(tmp_path))
+
+    assert retriever.duplicates is None
+    assert all("duplicate_of" not in doc[2] for doc in retriever.store.backend.documents())
+
+
+def test_sync_reports_progress(retriever, sample_directory):
+    assert retriever.progress is None
+
+    retriever.sync_documents(sample_directory)
+
+    stats = retriever.progress.stats()
+    assert stats["running"] is False
+    assert stats["files_total"] == stats["files_loaded"] == stats["files_done"] == 3
+    assert stats["chunks_loaded"] == stats["chunks_embedded"] == stats["chunks_stored"] == 3
+    assert stats["eta_seconds"] == 0.0
+
+
+def test_shutdown_stops_syncing(retriever, sample_directory):
+    retriever.shutdown()
+
+    with pytest.raises(IngestionCancelled):
+        retriever.sync_documents(sample_directory)
+    assert retriever.document_count == 0
+
+
+def test_partly_indexed_retriever_can_be_searched(tmp_path):
+    """Chunks stored by a sync still running are searchable."""
+    retriever = DocumentRetriever()
+    retriever.store.add_documents([{"id": "a", "text": "garlic", "metadata": {"n": 0}}])
+
+    assert retriever.search("garlic", n_results=1)[0]["id"] == "a"
@@ -0,0 +1,111 @@
+"""
+Unit tests for BackgroundIndexer.
+
+@author: Aarti Dashore, Alok Katiyar
+Seattle University, ARIN 5360
+@see: https://catalog.seattleu.edu/preview_course_nopop.php?catoid=55&coid
+=190380
+@version: 1.0.0+w26
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from retrieval.startup import BackgroundIndexer
+
+
+class FlakyRetriever:
+    """Fake retriever whose first indexing attempts fail."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+        self.progress = None
+        self.closed = False
+
+    def index_documents(self, directory):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("disk on fire")
+        return 5
+
+    def shutdown(self):
+        self.closed = True
+
+
+@pytest.mark.anyio
+async def test_failed_indexing_is_retried_with_the_same_retriever():
+    retriever = FlakyRetriever(failures=2)
+    built = []
+    handed_over = []
+
+    def create():
+        built.append(retriever)
+        return retriever
+
+    async def on_retriever(r):
+        handed_over.append(r)
+
+    indexer = BackgroundIndexer(create, "docs", on_retriever, retry_seconds=0.01)
+    indexer.start()
+
+    assert await indexer.wait_ready(timeout=5)
+    assert indexer.status() == {
+        "state": "ready",
+        "ready": True,
+        "attempts": 3,
+        "error": None,
+        "progress": None,
+    }
+    assert indexer.documents_indexed == 5
+    assert len(built) == len(handed_over) == 1
+
+    await indexer.stop()
+    assert retriever.closed
+
+
+@pytest.mark.anyio
+async def test_failed_build_keeps_retrying_until_stopped():
+    def create():
+        raise RuntimeError("no model")
+
+    indexer = BackgroundIndexer(create, "docs", retry_seconds=0.01, max_retry_seconds=0.02)
+    indexer.start()
+
+    assert not await indexer.wait_ready(timeout=0.2)
+
+    # a retry in flight reports "loading"; between attempts it's "failed"
+    async def failed_again():
+        while not (indexer.state == "failed" and indexer.attempts > 2):
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(failed_again(), timeout=1)
+    assert indexer.error == "no model"
+    await indexer.stop()
+
+
+def test_retry_after_follows_the_eta():
+    class Progress:
+        eta = None
+
+        def stats(self):
+            return {"eta_seconds": self.eta}
+
+    retriever = FlakyRetriever(0)
+    retriever.progress = Progress()
+    indexer = BackgroundIndexer(lambda: retriever, "docs")
+    indexer.retriever, indexer.state = retriever, "indexing"
+
+    assert indexer.retry_after() == BackgroundIndexer.RETRY_AFTER_SECONDS
+    retriever.progress.eta = 12.2
+    assert indexer.retry_after() == 13
+    retriever.progress.eta = 3600
+    assert indexer.retry_after() == BackgroundIndexer.MAX_RETRY_AFTER_SECONDS
+
+
+def test_bad_settings_raise():
+    with pytest.raises(ValueError):
+        BackgroundIndexer(lambda: None, "docs", retry_seconds=0)
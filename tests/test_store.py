@@ -92,3 +92,220 @@ def test_search_with_n_results(vector_store, sample_docs):
     results = vector_store.search("some query", n_results=2)
     #  make an assertion!
     assert len(results) == 2
+
+
+def test_search_many_matches_search(vector_store, sample_docs):
+    """search_many returns one result list per query, same as search."""
+    vector_store.add_documents(sample_docs)
+    queries = ["Python", "vectors", "semantic"]
+
+    batched = vector_store.search_many(queries, n_results=2)
+
+    assert len(batched) == 3
+    for query, results in zip(queries, batched):
+        single = vector_store.search(query, n_results=2)
+        assert [r["id"] for r in results] == [r["id"] for r in single]
+
+
+def test_search_many_empty(vector_store):
+    assert vector_store.search_many([]) == []
+    assert vector_store.search_many(["nothing indexed"]) == [[]]
+
+
+def test_result_cache_serves_repeat_queries(document_embedder, sample_docs):
+    store = VectorStore(document_embedder, result_cache_size=8)
+    store.add_documents(sample_docs)
+
+    first = store.search("Python", n_results=2)
+    first[0]["metadata"]["filename"] = "mutated"  # callers get their own copy
+    second = store.search("  python ", n_results=2)
+
+    assert [r["id"] for r in second] == [r["id"] for r in first]
+    assert second[0]["metadata"]["filename"] != "mutated"
+    assert store.result_cache.stats()["hits"] == 1
+
+
+def test_result_cache_key_includes_n_results(document_embedder, sample_docs):
+    store = VectorStore(document_embedder, result_cache_size=8)
+    store.add_documents(sample_docs)
+
+    assert len(store.search("Python", n_results=1)) == 1
+    assert len(store.search("Python", n_results=3)) == 3
+    assert store.result_cache.stats()["hits"] == 0
+
+
+def test_writes_bump_generation_and_invalidate(document_embedder, sample_docs):
+    store = VectorStore(document_embedder, result_cache_size=8)
+    store.add_documents(sample_docs[:1])
+    assert len(store.search("anything", n_results=3)) == 1
+
+    generation = store.generation
+    store.add_documents(sample_docs[1:])
+    assert store.generation > generation
+    assert len(store.result_cache) == 0
+    assert len(store.search("anything", n_results=3)) == 3
+
+    store.delete_documents(["1", "2"])
+    assert [r["id"] for r in store.search("anything", n_results=3)] == ["3"]
+
+
+def test_search_many_caches_duplicates_once(document_embedder, sample_docs):
+    store = VectorStore(document_embedder, result_cache_size=8)
+    store.add_documents(sample_docs)
+
+    results = store.search_many(["Python", "python", "vectors"], n_results=1)
+
+    assert results[0] == results[1]
+    assert len(store.result_cache) == 2
+
+
+def test_numpy_backend_store(document_embedder, sample_docs):
+    store = VectorStore(document_embedder, backend="numpy")
+    store.add_documents(sample_docs)
+
+    assert store.count() == 3
+    results = store.search_many(["Python programming", "Semantic search"], n_results=1)
+    assert [r[0]["id"] for r in results] == ["1", "3"]
+
+    store.delete_documents(["1"])
+    assert store.count() == 2
+
+
+def test_unknown_backend_raises(document_embedder):
+    with pytest.raises(ValueError, match="Unknown backend"):
+        VectorStore(document_embedder, backend="faiss")
+
+
+def test_quantization_needs_numpy_backend(document_embedder):
+    with pytest.raises(ValueError, match="numpy backend"):
+        VectorStore(document_embedder, quantization="int8")
+
+
+@pytest.fixture
+def keyword_docs():
+    """Documents where an exact identifier matters more than meaning."""
+    return [
+        {"id": "a", "text": "The API returns ERR_429 when throttled", "metadata": {"n": 0}},
+        {"id": "b", "text": "Requests are throttled after a burst", "metadata": {"n": 1}},
+        {"id": "c", "text": "Garlic keeps vampires away", "metadata": {"n": 2}},
+    ]
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_lexical_search_finds_exact_terms(document_embedder, keyword_docs, backend):
+    store = VectorStore(document_embedder, backend=backend)
+    store.add_documents(keyword_docs)
+
+    hits = store.search("ERR_429", n_results=3, mode="lexical")
+
+    assert [hit["id"] for hit in hits] == ["a"]
+    assert hits[0]["text"] == keyword_docs[0]["text"]
+    assert hits[0]["metadata"] == {"n": 0}
+    assert hits[0]["distance"] is None and hits[0]["score"] > 0
+
+
+def test_lexical_index_follows_writes(document_embedder, keyword_docs):
+    store = VectorStore(document_embedder, backend="numpy", result_cache_size=8)
+    store.add_documents(keyword_docs)
+    assert [hit["id"] for hit in store.search("garlic", mode="lexical")] == ["c"]
+
+    store.upsert_documents([{"id": "c", "text": "Onions, not garlic", "metadata": {}}])
+    assert store.search("vampires", mode="lexical") == []
+    assert [hit["id"] for hit in store.search("onions", mode="lexical")] == ["c"]
+
+    store.delete_documents(["c"])
+    assert store.search("garlic", mode="lexical") == []
+
+    store.reset()
+    assert store.search("throttled", mode="lexical") == []
+
+
+def test_hybrid_search_fuses_both_rankings(document_embedder, keyword_docs):
+    store = VectorStore(document_embedder, backend="numpy")
+    store.add_documents(keyword_docs)
+
+    hits = store.search("ERR_429", n_results=3, mode="hybrid")
+
+    # "a" is ranked by both searches, so it comes first with a known distance
+    assert [hit["id"] for hit in hits][0] == "a"
+    assert len(hits) == 3
+    assert hits[0]["distance"] is not None
+    scores = [hit["score"] for hit in hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_hybrid_search_many_keeps_each_querys_distances(document_embedder, keyword_docs):
+    """A hit shared by two queries reports its distance to each, as search() does."""
+    store = VectorStore(document_embedder, backend="numpy", result_cache_size=0)
+    store.add_documents(keyword_docs)
+    queries = ["ERR_429 throttled", "garlic vampires"]
+
+    batch = store.search_many(queries, n_results=3, mode="hybrid")
+
+    for query, hits in zip(queries, batch):
+        single = store.search(query, n_results=3, mode="hybrid")
+        assert [hit["id"] for hit in hits] == [hit["id"] for hit in single]
+        assert [hit["distance"] for hit in hits] == pytest.approx(
+            [hit["distance"] for hit in single], abs=1e-5
+        )
+    assert {hit["id"] for hit in batch[0]} & {hit["id"] for hit in batch[1]}
+
+
+def test_lexical_index_is_rebuilt_from_a_persisted_index(document_embedder, keyword_docs, tmp_path):
+    store = VectorStore(document_embedder, persist_directory=str(tmp_path), backend="numpy")
+    store.add_documents(keyword_docs)
+    store.flush()
+
+    reopened = VectorStore(document_embedder, persist_directory=str(tmp_path), backend="numpy")
+
+    assert [hit["id"] for hit in reopened.search("vampires", mode="lexical")] == ["c"]
+
+
+def test_search_modes_are_cached_separately(document_embedder, keyword_docs):
+    store = VectorStore(document_embedder, result_cache_size=8)
+    store.add_documents(keyword_docs)
+
+    store.search("garlic", n_results=1)
+    lexical = store.search("garlic", n_results=1, mode="lexical")
+
+    assert "score" in lexical[0]
+    assert len(store.result_cache) == 2
+
+
+def test_bad_mode_raises(document_embedder, keyword_docs):
+    store = VectorStore(document_embedder)
+    store.add_documents(keyword_docs)
+
+    with pytest.raises(ValueError, match="Unknown search mode"):
+        store.search("garlic", mode="fuzzy")
+
+
+@pytest.mark.parametrize("mode", ["semantic", "lexical", "hybrid"])
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_filters_apply_in_every_mode(document_embedder, keyword_docs, backend, mode):
+    store = VectorStore(document_embedder, backend=backend)
+    store.add_documents(keyword_docs)
+
+    hits = store.search("throttled ERR_429", n_results=3, where={"n": {"$gte": 1}}, mode=mode)
+
+    assert hits and {hit["id"] for hit in hits} <= {"b", "c"}
+    assert store.search("throttled", where={"n": 2}, mode="lexical") == []
+
+
+def test_collapse_returns_one_hit_per_copy_group(document_embedder):
+    store = VectorStore(document_embedder, backend="numpy", result_cache_size=8)
+    text = "Garlic keeps vampires away."
+    store.add_documents(
+        [
+            {"id": "a", "text": text, "metadata": {"filename": "a.txt"}},
+            {"id": "b", "text": text, "metadata": {"filename": "b.txt", "duplicate_of": "a"}},
+            {"id": "c", "text": "Vector databases", "metadata": {"filename": "c.txt"}},
+        ]
+    )
+
+    hits = store.search("vampires", n_results=2, collapse=True)
+
+    assert [hit["id"] for hit in hits][1] == "c"
+    assert {hits[0]["id"], *hits[0]["duplicates"]} == {"a", "b"}
+    assert len(store.search("vampires", n_results=2)) == 2
+    assert len(store.result_cache) == 2  # collapsed and plain results cached apart